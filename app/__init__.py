@@ -31,15 +31,28 @@ from flask.app import Flask
 from flask.ext.cache import Cache
 from flask.ext.track_usage import TrackUsage
 from flask.ext.track_usage.storage.sql import SQLStorage
-from flask_sqlalchemy import SQLAlchemy
+from app.utils import PoolMonitor, MonitoredSQLAlchemy
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql+mysqlconnector://'
 app.config['TRACK_USAGE_USE_FREEGEOIP'] = False
 app.config['TRACK_USAGE_INCLUDE_OR_EXCLUDE_VIEWS'] = 'exclude'
+app.config['RESPONSE_CACHE_MAX_SIZE'] = 1024 * 1024  # memcached default item size
+app.config['DATES_AS_ISO'] = False  # dates are serialized as seconds since epoch unless True
+app.config['DATES_UTC_OFFSET'] = None  # seconds west of UTC of the stored dates, the server one if None
+app.config['DIMENSION_REGISTRY_TIMEOUT'] = 300  # seconds countries, indicators... are kept in memory
+app.config['SQLALCHEMY_REPLICA_URIS'] = []  # read-only copies of the database, requests that only read use them
+app.config['READ_YOUR_WRITES_SECONDS'] = 0  # seconds a client reads from the primary database after writing
+app.config['SQLALCHEMY_POOL_SIZE'] = 10  # connections kept open by every server process
+app.config['SQLALCHEMY_MAX_OVERFLOW'] = 10  # connections opened beyond the pool size under peak load
+app.config['SQLALCHEMY_POOL_TIMEOUT'] = 10  # seconds a request waits for a connection before failing
+app.config['SQLALCHEMY_POOL_RECYCLE'] = 3600  # seconds before a connection is replaced, below mysql wait_timeout
+app.config['SQLALCHEMY_POOL_PRE_PING'] = False  # True to check every connection is alive before it is used
+app.config['SQLALCHEMY_POOL_SLOW_CHECKOUT'] = 0.1  # seconds of a checkout logged as a wait for a busy pool
 cache = Cache(app, config={'CACHE_TYPE': 'memcached', 'CACHE_MEMCACHED_SERVERS': ['localhost:11211']})
 app.config['DEBUG'] = True
-db = SQLAlchemy(app)
+pool_monitor = PoolMonitor(app.logger, app.config['SQLALCHEMY_POOL_SLOW_CHECKOUT'])
+db = MonitoredSQLAlchemy(app, pool_monitor)
 sql_database_storage = SQLStorage(app.config['SQLALCHEMY_DATABASE_URI'], table_name='api_usage')
 t = TrackUsage(app, sql_database_storage)
 
@@ -29,18 +29,29 @@ This file includes all the daos that support the access to the data
 """
 
 from model.models import Country, RegionTranslation, IndicatorTranslation, TopicTranslation, Region, Auth, Observation, \
-    Value, Indicator, Dataset
-from sqlalchemy import desc, func
+    Value, Indicator, Dataset, Interval
+from itertools import chain
+from sqlalchemy import func, and_, or_, select, bindparam
+from sqlalchemy.orm import class_mapper, load_only, joinedload, with_polymorphic, aliased, Query
+from sqlalchemy.orm.interfaces import ONETOMANY, MANYTOMANY
+from app.models import ObservationPeriod, RegionClosure, NumericValue, GLOBAL_REGION_ID, BULK_BATCH_SIZE, \
+    period_rows, store_periods, number_rows, store_numbers, rebuild_region_closure
 
 
-global_expression = ((Region.is_part_of_id == '2') | (Region.is_part_of_id == '3') | (Region.is_part_of_id == '4')
-                | (Region.is_part_of_id == '5') | (Region.is_part_of_id == '6'))
+LAZY_BATCH_SIZE = 1000  # rows loaded at once by the queries that are iterated lazily
+OBSERVATION_LOADING_PROFILES = {  # relationship paths loaded along with the observations, by profile name
+    'detail': (('ref_time',), ('value',), ('indicator', 'measurement_unit'), ('region',)),
+    'visualization': (('ref_time',), ('value',), ('dataset', 'datasource', 'organization'))
+}
+COMPILED_LOOKUPS = {}  # statements of the lookups by code, by class and names of the attributes compared
 
 
 class DAO(object):
     """
     Generic DAO for all classes, only the class is needed
     """
+    CODES = ('id',)  # names of the attributes that identify the elements given to update_many
+
     def __init__(self, cls):
         """
         Constructor for DAO
@@ -57,13 +68,23 @@ class DAO(object):
         """
         self.session = session
         
-    def get_all(self):
+    def get_all(self, fields=None):
         """
         Method that returns all countries in the database
 
+        :param fields: names of the fields that will be used, all columns are loaded if None
         :return: a collection of all elements
         """
-        return self.session.query(self.cls).all()
+        return self.session.query(self.cls).options(*load_only_options(self.cls, fields)).all()
+
+    def iterate_all(self, fields=None):
+        """
+        Method that returns all elements, loaded in batches while they are iterated
+
+        :param fields: names of the fields that will be used, all columns are loaded if None
+        :return: query of all elements
+        """
+        return self.session.query(self.cls).options(*load_only_options(self.cls, fields)).yield_per(LAZY_BATCH_SIZE)
 
     def get_by_code(self, code):
         """
@@ -72,7 +93,7 @@ class DAO(object):
         :param code: id of the element requested
         :return: element with the given id
         """
-        return self.session.query(self.cls).filter_by(id=code).first()
+        return first_by(self.session, self.cls, id=code)
     
     def insert(self, object):
         """
@@ -100,6 +121,203 @@ class DAO(object):
         persisted_object = self.get_by_code(object.id)
         update_object_attributes(persisted_object, object)
 
+    def insert_many(self, objects):
+        """
+        Method that inserts many new elements. Elements of one table, with their primary key and without
+        related objects, are inserted with a single executemany statement, the rest through the session
+
+        :param objects: elements to be inserted
+        """
+        mapper = class_mapper(self.cls)
+        table = mapper.local_table
+        if len(mapper.tables) > 1 or not all(is_insertable_row(mapper, object) for object in objects):
+            self.session.add_all(objects)
+            return
+        groups = {}
+        for object in objects:
+            row = column_values(mapper, table, object)
+            groups.setdefault(tuple(sorted(row.keys())), []).append(row)
+        for rows in groups.values():
+            self.session.execute(table.insert(), rows)
+        if issubclass(self.cls, Observation):
+            store_periods(self.session, dict((object.id, object.ref_time_id) for object in objects))
+        if issubclass(self.cls, Value):
+            store_numbers(self.session, dict((object.id, object.value) for object in objects))
+
+    def update_many(self, objects):
+        """
+        Method to update many existing elements with one executemany statement per table and set of
+        attributes, their codes will not be changed. Only the given attributes are updated, None clears
+        them, and codes without element are skipped
+
+        :param objects: objects with the codes of the elements, named by *CODES*, and the attributes to update
+        """
+        mapper = class_mapper(self.cls)
+        ids = self.get_ids(objects)
+        updated = set()
+        for table in mapper.tables:
+            groups = {}
+            for object in objects:
+                id = ids.get(self.code_of(object))
+                row = column_values(mapper, table, object, False, True)
+                if id is None or len(row) == 0:
+                    continue
+                updated.update(row.keys())
+                for column, value in zip(table.primary_key.columns, id):
+                    row['_' + column.key] = value
+                groups.setdefault(tuple(sorted(row.keys())), []).append(row)
+            condition = and_(*[column == bindparam('_' + column.key) for column in table.primary_key.columns])
+            for rows in groups.values():
+                self.session.execute(table.update().where(condition), rows)
+        if issubclass(self.cls, Observation) and 'ref_time_id' in updated:
+            store_periods(self.session, dict((ids[self.code_of(object)][0], object.ref_time_id) for object in objects
+                                             if hasattr(object, 'ref_time_id') and self.code_of(object) in ids))
+        if issubclass(self.cls, Value) and 'value' in updated:
+            store_numbers(self.session, dict((ids[self.code_of(object)][0], object.value) for object in objects
+                                             if hasattr(object, 'value') and self.code_of(object) in ids))
+        if issubclass(self.cls, Region) and 'is_part_of_id' in updated:
+            rebuild_region_closure(self.session)
+
+    def delete_where(self, *criteria):
+        """
+        Method to delete all the elements that meet some criteria with set based statements.
+        Rows of the subclasses are deleted too. Dependent rows are handled as the session would do it: rows
+        of association tables and dependents that can not exist without the element, like translations, are
+        deleted and the references of the rest, like the region of an observation, are set to NULL. References
+        between the deleted elements, like the parent of a region, are cleared first, as MySQL checks foreign
+        keys row by row
+
+        :param criteria: filter expressions over the columns of the class, all elements are deleted if none
+        :return: number of deleted elements
+        """
+        mapper = class_mapper(self.cls)
+        tables = set(chain(*[subclass_mapper.tables for subclass_mapper in mapper.self_and_descendants]))
+        references = [foreign_key.parent for table in tables for foreign_key in table.foreign_keys
+                      if foreign_key.column.table in tables and not foreign_key.parent.primary_key]
+        dependents = self.get_dependents()
+        if len(tables) == 1 and len(references) == 0 and len(dependents) == 0:
+            criteria = list(criteria)
+            if mapper.single and mapper.polymorphic_on is not None:
+                identities = [subclass_mapper.polymorphic_identity for subclass_mapper in mapper.self_and_descendants]
+                criteria.append(mapper.polymorphic_on.in_(identities))
+            if issubclass(self.cls, Observation):
+                periods = ObservationPeriod.__table__.delete()
+                if len(criteria) > 0:
+                    periods = periods.where(ObservationPeriod.observation_id.in_(
+                        select([Observation.id]).where(and_(*criteria))))
+                self.session.execute(periods)
+            if issubclass(self.cls, Value):
+                numbers = NumericValue.__table__.delete()
+                if len(criteria) > 0:
+                    numbers = numbers.where(NumericValue.value_id.in_(select([Value.id]).where(and_(*criteria))))
+                self.session.execute(numbers)
+            statement = mapper.local_table.delete()
+            if len(criteria) > 0:
+                statement = statement.where(and_(*criteria))
+            count = self.session.execute(statement).rowcount
+        else:
+            ids = [row[0] for row in self.session.query(*mapper.primary_key).select_from(self.cls).filter(*criteria)]
+            for column in references:
+                key = list(column.table.primary_key.columns)[0]
+                for start in range(0, len(ids), BULK_BATCH_SIZE):
+                    self.session.execute(column.table.update().where(key.in_(ids[start:start + BULK_BATCH_SIZE]))
+                                         .values({column.key: None}))
+            for start in range(0, len(ids), BULK_BATCH_SIZE):
+                batch = ids[start:start + BULK_BATCH_SIZE]
+                for relationship in dependents:
+                    self.clear_dependents(relationship, batch)
+                if issubclass(self.cls, Observation):
+                    self.session.execute(ObservationPeriod.__table__.delete()
+                                         .where(ObservationPeriod.observation_id.in_(batch)))
+                if issubclass(self.cls, Value):
+                    self.session.execute(NumericValue.__table__.delete().where(NumericValue.value_id.in_(batch)))
+            for table in [table for table in reversed(mapper.local_table.metadata.sorted_tables) if table in tables]:
+                column = list(table.primary_key.columns)[0]
+                for start in range(0, len(ids), BULK_BATCH_SIZE):
+                    self.session.execute(table.delete().where(column.in_(ids[start:start + BULK_BATCH_SIZE])))
+            count = len(ids)
+        if issubclass(self.cls, Region):
+            rebuild_region_closure(self.session)
+        return count
+
+    def get_dependents(self):
+        """
+        Method that returns the relationships of the class and its subclasses whose rows reference the elements,
+        one to many and many to many relationships
+
+        :return: a list of relationships
+        """
+        dependents = []
+        for subclass_mapper in class_mapper(self.cls).self_and_descendants:
+            for relationship in subclass_mapper.relationships:
+                if not relationship.viewonly and relationship.direction in (ONETOMANY, MANYTOMANY) \
+                        and relationship not in dependents:
+                    dependents.append(relationship)
+        return dependents
+
+    def clear_dependents(self, relationship, ids):
+        """
+        Method that deletes or clears the rows that reference some elements through a relationship, before the
+        elements are deleted
+
+        :param relationship: one to many or many to many relationship of the class
+        :param ids: primary keys of the elements
+        """
+        if relationship.direction is MANYTOMANY:
+            for local, remote in relationship.synchronize_pairs:
+                self.session.execute(relationship.secondary.delete().where(remote.in_(ids)))
+            return
+        for local, remote in relationship.local_remote_pairs:
+            if remote.primary_key or 'delete' in relationship.cascade:
+                dao = DAO(relationship.mapper.class_)
+                dao.set_session(self.session)
+                dao.delete_where(remote.in_(ids))
+            else:
+                self.session.execute(remote.table.update().where(remote.in_(ids)).values({remote.key: None}))
+
+    def get_ids(self, objects):
+        """
+        Method that returns the primary keys of the elements with the codes of some objects
+
+        :param objects: objects with the codes of the elements, named by *CODES*
+        :return: dict from code, as given by code_of, to primary key as a tuple, codes without element are not included
+        """
+        mapper = class_mapper(self.cls)
+        keys = [mapper.get_property_by_column(column).key for column in mapper.primary_key]
+        if set(keys) == set(self.CODES):
+            requested = {}  # codes by their primary key, as given by code_key, only the existing ones are returned
+            for object in objects:
+                requested[code_key([getattr(object, key, None) for key in keys])] = self.code_of(object)
+            values = [tuple(getattr(object, key, None) for key in keys) for object in objects]
+            size = BULK_BATCH_SIZE // len(keys)  # every primary key takes one parameter per column
+            ids = {}
+            for start in range(0, len(values), size):
+                if len(keys) == 1:
+                    condition = mapper.primary_key[0].in_([value[0] for value in values[start:start + size]])
+                else:
+                    condition = or_(*[and_(*[column == part for column, part in zip(mapper.primary_key, value)])
+                                      for value in values[start:start + size]])
+                for row in self.session.query(*mapper.primary_key).filter(condition):
+                    ids[requested[code_key(row)]] = tuple(row)
+            return ids
+        column = getattr(self.cls, self.CODES[0])  # codes that are not the primary key are single attributes
+        codes = list(set(getattr(object, self.CODES[0]) for object in objects))
+        ids = {}
+        for start in range(0, len(codes), BULK_BATCH_SIZE):
+            for row in self.session.query(column, *mapper.primary_key)\
+                    .filter(column.in_(codes[start:start + BULK_BATCH_SIZE])):
+                ids[code_key(row[:1])] = tuple(row[1:])
+        return ids
+
+    def code_of(self, object):
+        """
+        Method that returns the code of an object, to match it with the persisted elements
+
+        :param object: object with the attributes named by *CODES*
+        :return: code, as given by code_key
+        """
+        return code_key([getattr(object, name, None) for name in self.CODES])
+
 
 class IndicatorDAO(DAO):
     """
@@ -111,14 +329,24 @@ class IndicatorDAO(DAO):
         """
         super(IndicatorDAO, self).__init__(Indicator)
 
-    def get_indicators_by_country(self, iso3):
+    def get_codes(self):
+        """
+        Returns the id of every indicator, paired with itself as it is also its code
+
+        :return: list of tuples (id, id)
+        """
+        return self.session.query(self.cls.id, self.cls.id).all()
+
+    def get_indicators_by_country(self, iso3, fields=None):
         """
         Method to get all the indicators of a given country
 
         :param iso3: iso3 code of the given country
+        :param fields: names of the fields that will be used, all columns are loaded if None
         :return: indicators of the given country
         """
-        return self.session.query(Indicator).join(Observation).join(Country).filter(Country.iso3 == iso3).all()
+        return self.session.query(Indicator).options(*load_only_options(Indicator, fields)).join(Observation)\
+            .join(Country).filter(Country.iso3 == iso3).all()
 
     def get_indicator_by_country(self, iso3, indicator_id):
         """
@@ -130,13 +358,15 @@ class IndicatorDAO(DAO):
         return self.session.query(Indicator).join(Observation).join(Country).filter(Country.iso3 == iso3)\
             .filter(Indicator.id == indicator_id).first()
 
-    def get_starred_indicators(self):
+    def get_starred_indicators(self, fields=None):
         """
         Returns indicators that are starred
 
+        :param fields: names of the fields that will be used, all columns are loaded if None
         :return: starred indicators
         """
-        return self.session.query(Indicator).filter(Indicator.starred == True).all()
+        return self.session.query(Indicator).options(*load_only_options(Indicator, fields))\
+            .filter(Indicator.starred == True).all()
 
     def get_average(self, indicator_id):
         """
@@ -145,23 +375,28 @@ class IndicatorDAO(DAO):
         :param indicator_id: indicator id of the given indicator
         :return: average
         """
-        return self.session.query(func.avg(Value.value)).join(Observation)\
-            .filter(Observation.indicator_id == indicator_id).filter(Value.value != 'null').first()
+        return self.session.query(func.avg(NumericValue.number))\
+            .join(Observation, Observation.value_id == NumericValue.value_id)\
+            .filter(Observation.indicator_id == indicator_id).first()
 
-    def get_indicators_by_datasource(self, datasource_id):
+    def get_indicators_by_datasource(self, datasource_id, fields=None):
         """
         Returns the indicators of a datasource
 
         :param datasource_id: datasource id for the given datasource
+        :param fields: names of the fields that will be used, all columns are loaded if None
         :return: indicators of the given datasource
         """
-        return self.session.query(Indicator).join((Indicator, Dataset.indicators)).filter(Dataset.datasource_id == datasource_id).all()
+        return self.session.query(Indicator).options(*load_only_options(Indicator, fields))\
+            .join((Indicator, Dataset.indicators)).filter(Dataset.datasource_id == datasource_id).all()
 
 
 class CountryDAO(DAO):
     """
     Dao for country entity
     """
+    CODES = ('iso3',)
+
     def __init__(self):
         """
         Constructor for country dao
@@ -175,7 +410,15 @@ class CountryDAO(DAO):
         :param code: iso3 of the country requested
         :return: country with given iso3
         """
-        return self.session.query(self.cls).filter_by(iso3=code).first()
+        return first_by(self.session, self.cls, iso3=code)
+
+    def get_codes(self):
+        """
+        Returns the iso3 and the id of every country
+
+        :return: list of tuples (iso3, id)
+        """
+        return self.session.query(self.cls.iso3, self.cls.id).all()
 
     def get_by_id(self, code):
         """
@@ -184,7 +427,7 @@ class CountryDAO(DAO):
         :param code: id of the country requested
         :return: country with given id
         """
-        return self.session.query(self.cls).filter_by(id=code).first()
+        return first_by(self.session, self.cls, id=code)
 
     def update(self, country):
         """
@@ -202,10 +445,7 @@ class CountryDAO(DAO):
         :param id: id of the region
         :return: list of countries
         """
-        if id == 1:
-            return self.session.query(Country).filter(global_expression).all()
-        else:
-            return self.session.query(Country).filter(Country.is_part_of_id == id).all()
+        return in_region(self.session.query(Country), id, Country.id).all()
 
     def get_country_by_region(self, region_id, iso3):
         """
@@ -215,12 +455,7 @@ class CountryDAO(DAO):
         :param iso3: iso3 of the country to search
         :return: country
         """
-        if region_id == 1:
-            return self.session.query(Country).filter(global_expression)\
-                .filter(Country.iso3 == iso3).first()
-        else:
-            return self.session.query(Country).filter(Country.is_part_of_id == region_id)\
-                .filter(Country.iso3 == iso3).first()
+        return in_region(self.session.query(Country), region_id, Country.id).filter(Country.iso3 == iso3).first()
 
     def get_countries_with_data_by_region(self, id):
         """
@@ -229,16 +464,15 @@ class CountryDAO(DAO):
         :param id: id of the given region
         :return: list of countries
         """
-        if id == 1:
-            return self.session.query(Country).join(Observation).filter(global_expression).group_by(Country.id).all()
-        else:
-            return self.session.query(Country).join(Observation).filter(Country.is_part_of_id == id).group_by(Country.id).all()
+        return in_region(self.session.query(Country).join(Observation), id, Country.id).group_by(Country.id).all()
 
 
 class RegionDAO(DAO):
     """
     Dao for region entity
     """
+    CODES = ('un_code',)
+
     def __init__(self):
         """
         Constructor for region dao
@@ -252,7 +486,15 @@ class RegionDAO(DAO):
         :param code: un_code of the region
         :return: region with given un_ocde
         """
-        return self.session.query(self.cls).filter_by(un_code=code).first()
+        return first_by(self.session, self.cls, un_code=code)
+
+    def get_codes(self):
+        """
+        Returns the un_code and the id of every region, countries included
+
+        :return: list of tuples (un_code, id)
+        """
+        return self.session.query(self.cls.un_code, self.cls.id).all()
 
     def get_all_regions(self):
         """
@@ -271,16 +513,31 @@ class RegionDAO(DAO):
         """
         return self.session.query(Region).filter(Region.type == 'regions').filter(Region.is_part_of_id == id).all()
 
-    def get_regions_with_data(self, indicator_id):
+    def get_data_coverage(self, indicator_id, region_id):
         """
-        Returns the regions that have data for a given indicator
+        Returns, in one statement, the regions with countries that have data for a given indicator
+        along with the regions that belong to a given region
 
         :param indicator_id: id of the given indicator
-        :return: list of regions
+        :param region_id: id of the given region
+        :return: list of tuples (region id, True if it has data, True if it belongs to the given region)
         """
-        regions_ids = self.session.query(Country).join(Observation).filter(Observation.indicator_id == indicator_id)\
-            .group_by(Country.is_part_of_id).all()
-        return [self.get_by_artificial_code(region_id.is_part_of_id) for region_id in regions_ids]
+        country = aliased(Country, flat=True)
+        parents_with_data = self.session.query(country.is_part_of_id.label('region_id'))\
+            .join(Observation, Observation.region_id == country.id).filter(Observation.indicator_id == indicator_id)\
+            .distinct().subquery()
+        has_data = parents_with_data.c.region_id != None
+        belongs = and_(Region.type == 'regions', Region.is_part_of_id == region_id)
+        rows = self.session.query(Region.id, has_data, belongs)\
+            .outerjoin(parents_with_data, parents_with_data.c.region_id == Region.id)\
+            .filter(or_(has_data, belongs)).order_by(Region.id)
+        return [(id, bool(with_data), bool(child)) for id, with_data, child in rows]
+
+    def rebuild_closure(self):
+        """
+        Rebuilds the region closure table from the current hierarchy of regions
+        """
+        rebuild_region_closure(self.session)
 
     def get_by_artificial_code(self, code):
         """
@@ -289,7 +546,7 @@ class RegionDAO(DAO):
         :param code: id of the region
         :return: region with given id
         """
-        return self.session.query(self.cls).filter_by(id=code).first()
+        return first_by(self.session, self.cls, id=code)
 
     def update(self, region):
         """
@@ -305,6 +562,8 @@ class RegionTranslationDAO(DAO):
     """
     Dao for region translation entity
     """
+    CODES = ('region_id', 'lang_code')
+
     def __init__(self):
         """
         Contructor for region translation dao
@@ -319,8 +578,7 @@ class RegionTranslationDAO(DAO):
         :param: lang_code: code of the language like: 'en', 'es', 'fr'
         :return: region translation
         """
-        return self.session.query(self.cls).filter(RegionTranslation.region_id == region_id)\
-            .filter(RegionTranslation.lang_code == lang_code).first()
+        return first_by(self.session, self.cls, region_id=region_id, lang_code=lang_code)
 
     def delete(self, region_id, lang_code):
         """
@@ -346,6 +604,8 @@ class IndicatorTranslationDAO(DAO):
     """
     Dao for indicator translation entity
     """
+    CODES = ('indicator_id', 'lang_code')
+
     def __init__(self):
         """
         Constructor for indicator translation dao
@@ -360,8 +620,7 @@ class IndicatorTranslationDAO(DAO):
         :param: lang_code: code of the language like: 'en', 'es', 'fr'
         :return: indicator translation
         """
-        return self.session.query(self.cls).filter(IndicatorTranslation.indicator_id == indicator_id)\
-            .filter(IndicatorTranslation.lang_code == lang_code).first()
+        return first_by(self.session, self.cls, indicator_id=indicator_id, lang_code=lang_code)
 
     def delete(self, indicator_id, lang_code):
         """
@@ -387,6 +646,8 @@ class TopicTranslationDAO(DAO):
     """
     Dao for topic translation entity
     """
+    CODES = ('topic_id', 'lang_code')
+
     def __init__(self):
         """
         Constructor for topic translation dao
@@ -401,8 +662,7 @@ class TopicTranslationDAO(DAO):
         :param: lang_code: code of the language like: 'en', 'es', 'fr'
         :return: topic translation
         """
-        return self.session.query(self.cls).filter(TopicTranslation.topic_id == topic_id)\
-            .filter(TopicTranslation.lang_code == lang_code).first()
+        return first_by(self.session, self.cls, topic_id=topic_id, lang_code=lang_code)
 
     def delete(self, topic_id, lang_code):
         """
@@ -431,75 +691,234 @@ class ObservationDAO(DAO):
         """
         super(ObservationDAO, self).__init__(Observation)
 
-    def get_by_region_and_indicator(self, region_id, indicator_id, limit, offset):
+    def query(self, profile=None):
+        """
+        Returns a query of observations that loads the relationships of a loading profile
+
+        :param profile: name of one of OBSERVATION_LOADING_PROFILES, None to load relationships lazily
+        :return: query of observations
+        """
+        query = self.session.query(Observation)
+        if profile is not None:
+            query = query.options(*loading_options(Observation, OBSERVATION_LOADING_PROFILES[profile]))
+        return query
+
+    def get_by_region_and_indicator(self, region_id, indicator_id, limit, offset, profile=None, after=None):
         """
         Returns observations of a given region and a given indicator
 
         :param region_id: id of the given region
         :param indicator_id: id of the given indicator
-        :param limit: number of limit results
-        :param offset: number of results to skip
+        :param limit: number of limit results, all observations if None
+        :param offset: number of results to skip, None to page by observation id
+        :param profile: name of the loading profile, by default relationships are loaded lazily
+        :param after: id of the last observation of the previous page, only if offset is None
         :return: list of observations
         """
-        if region_id == 1:
-            return self.session.query(Observation).join(Region).filter(Observation.indicator_id == indicator_id)\
-                .filter(global_expression).offset(offset).limit(limit)
-        else:
-            return self.session.query(Observation).join(Region).filter(Observation.indicator_id == indicator_id)\
-                .filter(Region.is_part_of_id == region_id).offset(offset).limit(limit)
+        query = self.query(profile).filter(Observation.indicator_id == indicator_id)
+        query = in_region(query, region_id, Observation.region_id)
+        return paginate(query, Observation.id, limit, offset, after).all()
 
-    def get_by_country_and_indicator(self, indicator_id, iso3):
+    def get_by_country_and_indicator(self, indicator_id, iso3, profile=None, limit=None, offset=None, after=None,
+                                     from_date=None, to_date=None):
         """
         Returns observations of a given indicator and a given country
 
         :param indicator_id: id of the given indicator
         :param iso3: iso3 of the given country
+        :param profile: name of the loading profile, by default relationships are loaded lazily
+        :param limit: number of limit results, all observations if None
+        :param offset: number of results to skip, None to page by observation id
+        :param after: id of the last observation of the previous page, only if offset is None
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
+        :return: list of observations
+        """
+        query = self.query(profile).join(Country).filter(Observation.indicator_id == indicator_id)\
+            .filter(Country.iso3 == iso3)
+        query = filter_by_period(query, from_date, to_date)
+        return paginate(query, Observation.id, limit, offset, after).all()
+
+    def get_averages_by_region_and_indicator(self, region_id, indicator_id):
+        """
+        Returns the average value of the observations of a given region and a given indicator, overall and by period
+
+        :param region_id: id of the given region
+        :param indicator_id: id of the given indicator
+        :return: tuple (overall average, list of tuples (period, average, count) ordered by period)
+        """
+        query = self.session.query(Observation).filter(Observation.indicator_id == indicator_id)
+        return averages_by_period(in_region(query, region_id, Observation.region_id))
+
+    def get_averages_by_country_and_indicator(self, indicator_id, iso3):
+        """
+        Returns the average value of the observations of a given indicator and a given country, overall and by period
+
+        :param indicator_id: id of the given indicator
+        :param iso3: iso3 of the given country
+        :return: tuple (overall average, list of tuples (period, average, count) ordered by period)
+        """
+        query = self.session.query(Observation).join(Country).filter(Observation.indicator_id == indicator_id)\
+            .filter(Country.iso3 == iso3)
+        return averages_by_period(query)
+
+    def get_by_country(self, iso3, limit, offset, after=None, from_date=None, to_date=None):
         """
-        return self.session.query(Observation).join(Country).filter(Observation.indicator_id == indicator_id)\
-            .filter(Country.iso3 == iso3).all()
+        Returns observations of a given country
+
+        :param iso3: iso3 of the given country
+        :param limit: number of limit results
+        :param offset: number of results to skip, None to page by observation id
+        :param after: id of the last observation of the previous page, only if offset is None
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
+        :return: list of observations
+        """
+        query = self.session.query(Observation).join(Country).filter(Country.iso3 == iso3)
+        query = filter_by_period(query, from_date, to_date)
+        return paginate(query, Observation.id, limit, offset, after).all()
+
+    def get_page_by_indicator(self, indicator_id, limit, offset, after=None, from_date=None, to_date=None):
+        """
+        Returns a page of the observations of a given indicator
+
+        :param indicator_id: id of the given indicator
+        :param limit: number of limit results
+        :param offset: number of results to skip, None to page by observation id
+        :param after: id of the last observation of the previous page, only if offset is None
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
+        :return: list of observations
+        """
+        query = self.session.query(Observation).filter(Observation.indicator_id == indicator_id)
+        query = filter_by_period(query, from_date, to_date)
+        return paginate(query, Observation.id, limit, offset, after).all()
+
+    def get_by_region(self, region_id, limit, offset, after=None, from_date=None, to_date=None):
+        """
+        Returns observations of the countries of a given region
+
+        :param region_id: id of the given region
+        :param limit: number of limit results
+        :param offset: number of results to skip, None to page by observation id
+        :param after: id of the last observation of the previous page, only if offset is None
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
+        :return: list of observations
+        """
+        query = self.session.query(Observation).join(Country, Observation.region_id == Country.id)
+        query = in_region(query, region_id, Country.id)
+        query = filter_by_period(query, from_date, to_date)
+        return paginate(query, Observation.id, limit, offset, after).all()
 
     def get_top_by_region(self, indicator_id, region_id, top):
         """
-        Returns observations of a given indicator and a given region.
+        Returns the observations of a given indicator and a given region with the greatest numeric values.
 
         :param indicator_id: id of the given indicator
         :param region_id: id of the given region
         :param top: number of results to be returned
         :return: list of observations
         """
-        if region_id == 1:
-            return self.session.query(Observation).join(Value).join(Region).filter(
+        query = self.session.query(Observation).join(NumericValue, NumericValue.value_id == Observation.value_id)\
+            .filter(Observation.indicator_id == indicator_id)
+        return in_region(query, region_id, Observation.region_id).order_by(NumericValue.number.desc()).limit(top).all()
 
-                ).filter(Observation.indicator_id == indicator_id).order_by(desc(Observation.value)).limit(top).all()
-        else:
-            return self.session.query(Observation).join(Value).join(Region).filter(Region.is_part_of_id == region_id)\
-                .filter(Observation.indicator_id == indicator_id).order_by(desc(Observation.value)).limit(top).all()
-
-    def get_starred_observations_by_country(self, iso3, limit, offset):
+    def get_starred_observations_by_country(self, iso3, limit, offset, profile=None, after=None):
         """
         Returns starred indicators of a country
 
         :param iso3: iso3 of the given country
+        :param limit: number of limit results
+        :param offset: number of results to skip, None to page by observation id
+        :param profile: name of the loading profile, by default relationships are loaded lazily
+        :param after: id of the last observation of the previous page, only if offset is None
         :return: list of observations
         """
-        return self.session.query(Observation).join(Indicator).join(Country).filter(Country.iso3 == iso3)\
-            .filter(Indicator.starred == True).limit(limit).offset(offset).all()
+        query = self.query(profile).join(Indicator).join(Country).filter(Country.iso3 == iso3)\
+            .filter(Indicator.starred == True)
+        return paginate(query, Observation.id, limit, offset, after).all()
+
+    def iterate_by_indicator(self, indicator_id, fields=None, from_date=None, to_date=None):
+        """
+        Returns the observations of a given indicator, loaded in batches while they are iterated
+
+        :param indicator_id: id of the given indicator
+        :param fields: names of the fields that will be used, all columns are loaded if None
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
+        :return: query of observations
+        """
+        query = self.session.query(Observation).options(*load_only_options(Observation, fields))\
+            .filter(Observation.indicator_id == indicator_id)
+        return filter_by_period(query, from_date, to_date).yield_per(LAZY_BATCH_SIZE)
 
-    def get_by_indicator(self, indicator_id):
+    def get_by_indicator(self, indicator_id, from_date=None, to_date=None):
         """
         Returns the observations of a given indicator
 
         :param indicator_id: id of the given indicator
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
         :return: list of observations
         """
-        return self.session.query(Observation).join(Value).filter(Observation.indicator_id == indicator_id)\
-            .filter(Value.value != 'null').all()
+        query = self.session.query(Observation).join(NumericValue, NumericValue.value_id == Observation.value_id)\
+            .filter(Observation.indicator_id == indicator_id)
+        return filter_by_period(query, from_date, to_date).all()
+
+    def backfill_periods(self):
+        """
+        Stores the periods of the observations that do not have them yet, in batches
+
+        :return: number of stored periods
+        """
+        missing = self.session.query(Observation.id, Observation.ref_time_id)\
+            .outerjoin(ObservationPeriod, ObservationPeriod.observation_id == Observation.id)\
+            .filter(ObservationPeriod.observation_id == None).filter(Observation.ref_time_id != None).all()
+        stored = 0
+        for start in range(0, len(missing), LAZY_BATCH_SIZE):
+            rows = period_rows(self.session, dict(missing[start:start + LAZY_BATCH_SIZE]))
+            if len(rows) > 0:
+                self.session.execute(ObservationPeriod.__table__.insert(), rows)
+            stored += len(rows)
+        return stored
+
+
+class ValueDAO(DAO):
+    """
+    Dao for value entity
+    """
+    def __init__(self):
+        """
+        Constructor for value dao
+        """
+        super(ValueDAO, self).__init__(Value)
+
+    def backfill_numbers(self):
+        """
+        Stores the numbers of the values that do not have them yet, in batches. Values that are
+        not numbers are read again on every call, as they never have a number
+
+        :return: number of stored numbers
+        """
+        missing = self.session.query(Value.id, Value.value)\
+            .outerjoin(NumericValue, NumericValue.value_id == Value.id)\
+            .filter(NumericValue.value_id == None).filter(Value.value != None).all()
+        stored = 0
+        for start in range(0, len(missing), LAZY_BATCH_SIZE):
+            rows = number_rows(dict(missing[start:start + LAZY_BATCH_SIZE]))
+            if len(rows) > 0:
+                self.session.execute(NumericValue.__table__.insert(), rows)
+            stored += len(rows)
+        return stored
 
 
 class AuthDAO(DAO):
     """
     Dao for auth user entity
     """
+    CODES = ('user',)
+
     def __init__(self):
         """
         Constructor for auth user dao
@@ -513,7 +932,7 @@ class AuthDAO(DAO):
         :param username: name of the username requested
         :return: user with given username
         """
-        return self.session.query(self.cls).filter_by(user=username).first()
+        return first_by(self.session, self.cls, user=username)
 
     def update(self, auth):
         """
@@ -535,4 +954,239 @@ def update_object_attributes(object_to_update, object_with_new_attributes):
     """
     for attr in dir(object_to_update):
             if hasattr(object_with_new_attributes, attr) and attr[0] is not "_":
-                setattr(object_to_update, attr, getattr(object_with_new_attributes, attr))
\ No newline at end of file
+                setattr(object_to_update, attr, getattr(object_with_new_attributes, attr))
+
+
+def column_values(mapper, table, object, with_primary_key=True, with_none=False):
+    """
+    Returns the values of the attributes of an object stored in a table of a mapped class, attributes
+    the object does not have are not included, nor None values unless asked, so the defaults of the table apply
+
+    :param mapper: mapper of the class
+    :param table: one of the tables of the mapper
+    :param object: mapped object, or any object with the names of the attributes
+    :param with_primary_key: False to leave out the columns of the primary key of the table
+    :param with_none: True to include the None values of the attributes the object has, to clear them
+    :return: dict from column key to value
+    """
+    values = {}
+    for prop in mapper.column_attrs:
+        if not hasattr(object, prop.key):
+            continue
+        value = getattr(object, prop.key)
+        if value is None and not with_none:
+            continue
+        for column in prop.columns:  # columns of expressions, like Value.number, have no table
+            if getattr(column, 'table', None) is table and (with_primary_key or not column.primary_key):
+                values[column.key] = value
+    return values
+
+
+def is_insertable_row(mapper, object):
+    """
+    Returns if an object can be inserted as a row, that is, it has its primary key and no related objects
+
+    :param mapper: mapper of the class of the object
+    :param object: object to insert
+    :return: True if it can be inserted without the session
+    """
+    return all(getattr(object, mapper.get_property_by_column(column).key, None) is not None
+               for column in mapper.primary_key) \
+        and not any(object.__dict__.get(relationship.key) for relationship in mapper.relationships)
+
+
+def code_key(values):
+    """
+    Returns the key of a code in the dicts of the bulk operations, codes of the requests may be
+    strings while the persisted ones are integers
+
+    :param values: values of the code
+    :return: tuple of strings
+    """
+    return tuple(value if isinstance(value, basestring) or value is None else unicode(value) for value in values)
+
+
+def full_scans(connection, statement, parameters):
+    """
+    Returns the tables a statement reads fully, according to the plan the database gives for it
+    with EXPLAIN. Scans of small tables, like indicators or regions, are usually cheaper than indexes
+
+    :param connection: connection to a mysql, postgresql or sqlite database
+    :param statement: sql statement as sent to the database
+    :param parameters: parameters of the statement as sent to the database
+    :return: list of names of the fully read tables
+    """
+    dialect = connection.dialect.name
+    if dialect not in ('sqlite', 'mysql', 'postgresql'):
+        raise ValueError('EXPLAIN of ' + dialect + ' databases is not supported')
+    cursor = connection.connection.cursor()
+    try:
+        if dialect == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            scans = [row[-1].split() for row in cursor.fetchall() if row[-1].startswith('SCAN ')]
+            return [words[2] if words[1] == 'TABLE' else words[1] for words in scans
+                    if words[1] not in ('SUBQUERY', 'CONSTANT')]
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        if dialect == 'mysql':
+            names = [column[0] for column in cursor.description]
+            return [row[names.index('table')] for row in cursor.fetchall() if row[names.index('type')] == 'ALL']
+        return [row[0].split('Seq Scan on ')[1].split()[0] for row in cursor.fetchall() if 'Seq Scan on ' in row[0]]
+    finally:
+        cursor.close()
+
+
+def load_only_options(cls, fields):
+    """
+    Returns the query options that load only the columns needed by some fields of a class
+    Relationships need their local columns, and the primary key and the polymorphic
+    discriminator are always loaded
+
+    :param cls: mapped class that is queried
+    :param fields: names of the fields that will be used, None if all of them
+    :return: list of query options, empty if every column has to be loaded
+    """
+    if fields is None:
+        return []
+    mapper = class_mapper(cls)
+    columns = list(mapper.primary_key)
+    if mapper.polymorphic_on is not None:
+        columns.append(mapper.polymorphic_on)
+    for relationship in mapper.relationships:
+        if relationship.key in fields:
+            columns.extend(relationship.local_columns)
+    keys = set(mapper.get_property_by_column(column).key for column in columns)
+    keys.update(prop.key for prop in mapper.column_attrs if prop.key in fields)
+    return [load_only(*keys)]
+
+
+def paginate(query, key, limit, offset, after=None):
+    """
+    Returns a page of a query, by offset or by key
+    Pages by key, or keyset pages, are ordered by the key and start after the last key of
+    the previous page, so they are read from the index of the key and cost the same at
+    any depth, while rows skipped by an offset have to be read anyway. The query is ordered only
+    by the key, so the last row of a page is its greatest key in the collation used by the filter
+
+    :param query: query to be paginated
+    :param key: unique and indexed column, like the primary key
+    :param limit: number of results of the page, None to return the query without pagination
+    :param offset: number of results to skip, None to page by key
+    :param after: last key of the previous page, None for the first page, only if offset is None
+    :return: query of the page
+    """
+    if limit is None:
+        return query
+    if offset is not None:
+        return query.offset(offset).limit(limit)
+    if after is not None:
+        query = query.filter(key > after)
+    return query.order_by(None).order_by(key).limit(limit)
+
+
+def in_region(query, region_id, column):
+    """
+    Filters a query to the regions under a given one, at any depth, with a join to the region closure table.
+    The region itself is left out. The global region contains the regions under any other one, like the
+    countries of every continent, whether the continents are under it or not, so it and the continents are left out
+
+    :param query: query to filter
+    :param region_id: id of the given region
+    :param column: column of the query with the id of the regions to filter
+    :return: filtered query
+    """
+    if region_id == GLOBAL_REGION_ID:
+        return query.filter(column.in_(select([RegionClosure.descendant_id]).where(RegionClosure.depth > 0)
+                                       .where(RegionClosure.ancestor_id != GLOBAL_REGION_ID)))
+    return query.join(RegionClosure, RegionClosure.descendant_id == column)\
+        .filter(RegionClosure.ancestor_id == region_id).filter(RegionClosure.depth > 0)
+
+
+def first_by(session, cls, **values):
+    """
+    Returns the first element of a class whose attributes are equal to the given values, like
+    filter_by(...).first(). The statement of every lookup is built once with bound parameters, and its
+    compilation is kept by dialect, so repeated lookups neither build an ORM query nor compile SQL again
+
+    :param session: session of the database used
+    :param cls: mapped class of the element
+    :param values: values of the attributes, by name
+    :return: first element found, None if there is none
+    """
+    if None in values.values():  # compared with IS NULL, which a bound parameter can not express
+        return session.query(cls).filter_by(**values).first()
+    names = tuple(sorted(values.keys()))
+    lookup = COMPILED_LOOKUPS.get((cls, names))
+    if lookup is None:
+        query = Query(cls)
+        for name in names:
+            query = query.filter(getattr(cls, name) == bindparam(name))
+        lookup = COMPILED_LOOKUPS[(cls, names)] = (query.with_labels().limit(1).statement, {})
+    statement, compiled_cache = lookup
+    return session.query(cls).from_statement(statement).params(**values)\
+        .execution_options(compiled_cache=compiled_cache).first()
+
+
+def filter_by_period(query, from_date, to_date):
+    """
+    Filters a query of observations by the periods of their times that overlap a date range,
+    as a range predicate on the indexed columns of the observation periods table
+
+    :param query: query of observations
+    :param from_date: first day of the range, no lower bound if None
+    :param to_date: last day of the range, no upper bound if None
+    :return: filtered query, the same query if there are no bounds
+    """
+    if from_date is None and to_date is None:
+        return query
+    query = query.join(ObservationPeriod, ObservationPeriod.observation_id == Observation.id)
+    if to_date is not None:
+        query = query.filter(ObservationPeriod.start_date <= to_date)
+    if from_date is not None:
+        query = query.filter(ObservationPeriod.end_date >= from_date)
+    return query
+
+
+def averages_by_period(query):
+    """
+    Groups the observations of a query by the value of their time interval, averaging their values
+    in one statement, the overall average is weighted by the number of values of every period.
+    Observations whose time is not an interval have no period, but they count in the overall average
+
+    :param query: query of observations
+    :return: tuple (overall average, list of tuples (period, average, count) ordered by period)
+    """
+    rows = query.join(NumericValue, Observation.value_id == NumericValue.value_id)\
+        .outerjoin(Interval, Observation.ref_time_id == Interval.id)\
+        .with_entities(Interval.value, func.avg(NumericValue.number), func.count(NumericValue.number))\
+        .group_by(Interval.value).order_by(Interval.value).all()
+    rows = [(period, float(average), count) for period, average, count in rows]
+    count = sum(row[2] for row in rows)
+    average = sum(row[1] * row[2] for row in rows) / count if count > 0 else 0
+    return average, [row for row in rows if row[0] is not None]
+
+
+def loading_options(cls, paths):
+    """
+    Returns the query options that load some relationship paths of a class in the same query
+    Relationships to polymorphic classes load the columns of all their subclasses, so the
+    objects are not loaded again to get the columns of their subclass
+
+    :param cls: mapped class that is queried
+    :param paths: tuples of relationship names, like ('indicator', 'measurement_unit')
+    :return: list of query options
+    """
+    options = []
+    for path in paths:
+        option = None
+        entity = cls
+        for name in path:
+            attribute = getattr(entity, name)
+            target = attribute.property.mapper
+            if target.polymorphic_on is not None:
+                entity = with_polymorphic(target.class_, '*', aliased=True, flat=True)
+                attribute = attribute.of_type(entity)
+            else:
+                entity = target.class_
+            option = joinedload(attribute) if option is None else option.joinedload(attribute)
+        options.append(option)
+    return options
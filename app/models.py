@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+
+# landportal-data-access-api
+# Copyright (c)2014, WESO, Web Semantics Oviedo.
+# Written by Herminio García.
+
+# This file is part of landportal-data-access-api.
+#
+# landportal-data-access-api is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License.
+#
+# landportal-data-access-api is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with landportal-data-access-api.  If not, see <http://www.gnu.org/licenses/>.
+
+# landportal-data-access-api is licensed under the terms of the GPLv2
+# <http://www.gnu.org/licenses/old-licenses/gpl-2.0.html>
+
+"""
+Created on 18/10/2026
+This file includes the tables owned by this api, the shared ones are defined in the model package,
+and the indexes the queries of the api need on the shared tables
+
+:author: Herminio García
+"""
+import calendar
+import math
+from datetime import date, datetime
+from itertools import chain
+from sqlalchemy import Column, String, Integer, Float, Date, ForeignKey, Index, event, inspect, select
+from sqlalchemy.orm import Session, with_polymorphic, column_property
+from sqlalchemy.orm.attributes import get_history
+from app import db
+from model.models import Observation, Region, Time, Instant, Interval, YearInterval, MonthInterval, Country, \
+    RegionTranslation, IndicatorTranslation, TopicTranslation, Value
+
+GLOBAL_REGION_ID = 1  # region that contains every other region
+BULK_BATCH_SIZE = 500  # values of every IN list of the bulk statements, below the limits of the databases
+
+
+class ObservationPeriod(db.Model):
+    """
+    Period covered by the time of an observation, normalized to a first and a last day,
+    so observations can be filtered by date range with an indexed predicate
+    """
+    __tablename__ = 'observation_periods'
+    observation_id = Column(String(255), ForeignKey('observations.id', ondelete='CASCADE'), primary_key=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    __table_args__ = (Index('ix_observation_periods_dates', 'start_date', 'end_date'),)
+
+    def __init__(self, observation_id=None, start_date=None, end_date=None):
+        self.observation_id = observation_id
+        self.start_date = start_date
+        self.end_date = end_date
+
+
+class NumericValue(db.Model):
+    """
+    Number of an observation value, stored when the value is written so queries compare and aggregate
+    numbers instead of strings. Values that are not numbers, like 'null', have no row
+    """
+    __tablename__ = 'numeric_values'
+    value_id = Column(Integer, ForeignKey('values.id', ondelete='CASCADE'), primary_key=True)
+    number = Column(Float, nullable=False)
+
+    def __init__(self, value_id=None, number=None):
+        self.value_id = value_id
+        self.number = number
+
+
+class RegionClosure(db.Model):
+    """
+    Pair of a region and one of its ancestors, at any depth, regions are also paired with
+    themselves at depth 0. It answers the regions under another one with a single join
+    """
+    __tablename__ = 'region_closure'
+    ancestor_id = Column(Integer, ForeignKey('regions.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey('regions.id', ondelete='CASCADE'), primary_key=True)
+    depth = Column(Integer, nullable=False)
+    __table_args__ = (Index('ix_region_closure_descendant', 'descendant_id'),)
+
+    def __init__(self, ancestor_id=None, descendant_id=None, depth=None):
+        self.ancestor_id = ancestor_id
+        self.descendant_id = descendant_id
+        self.depth = depth
+
+
+Value.number = column_property(select([NumericValue.number]).where(NumericValue.value_id == Value.id)
+                               .correlate_except(NumericValue).label('number'))  # None if it is not a number
+observations_table = Observation.__table__
+QUERY_INDEXES = (  # indexes of the shared tables needed by the most frequent queries of the daos
+    Index('ix_observations_indicator_region', observations_table.c.indicator_id, observations_table.c.region_id),
+    Index('ix_observations_region_indicator', observations_table.c.region_id, observations_table.c.indicator_id),
+    Index('ix_observations_dataset_indicator', observations_table.c.dataset_id, observations_table.c.indicator_id),
+    Index('ix_observations_ref_time', observations_table.c.ref_time_id),
+    Index('ix_regions_is_part_of', Region.__table__.c.is_part_of_id),
+    Index('ix_regions_un_code', Region.__table__.c.un_code),
+    Index('ix_countries_iso3', Country.__table__.c.iso3),
+    Index('ix_region_translations_region_lang', RegionTranslation.__table__.c.region_id,
+          RegionTranslation.__table__.c.lang_code),
+    Index('ix_indicator_translations_indicator_lang', IndicatorTranslation.__table__.c.indicator_id,
+          IndicatorTranslation.__table__.c.lang_code),
+    Index('ix_topic_translations_topic_lang', TopicTranslation.__table__.c.topic_id,
+          TopicTranslation.__table__.c.lang_code)
+)
+
+
+def missing_indexes(connection):
+    """
+    Returns the indexes of QUERY_INDEXES whose columns do not lead any index or primary key of their table,
+    whatever its name, as the database gives them
+
+    :param connection: connection to the database
+    :return: list of indexes
+    """
+    inspector = inspect(connection)
+    missing = []
+    for index in QUERY_INDEXES:
+        columns = [column.name for column in index.columns]
+        existing = [existing_index['column_names'] for existing_index in inspector.get_indexes(index.table.name)]
+        existing.append(inspector.get_pk_constraint(index.table.name)['constrained_columns'])
+        if not any(names[:len(columns)] == columns for names in existing):
+            missing.append(index)
+    return missing
+
+
+def create_missing_indexes(connection):
+    """
+    Creates the indexes of QUERY_INDEXES that are missing, tables created by create_all already have them
+
+    :param connection: connection to the database
+    :return: list of created indexes
+    """
+    missing = missing_indexes(connection)
+    for index in missing:
+        index.create(connection)
+    return missing
+
+
+def period_of(time):
+    """
+    Returns the first and the last day covered by a time
+
+    :param time: instant or interval, year and month intervals without dates cover the whole year or month
+    :return: tuple (start date, end date), None if the time does not give them
+    """
+    if isinstance(time, Instant):
+        day = as_date(time.timestamp)
+        return (day, day) if day is not None else None
+    if isinstance(time, Interval):
+        start, end = as_date(time.start_time), as_date(time.end_time)
+        if (start is None or end is None) and isinstance(time, MonthInterval) and time.year and time.month:
+            start = date(time.year, time.month, 1)
+            end = date(time.year, time.month, calendar.monthrange(time.year, time.month)[1])
+        elif (start is None or end is None) and isinstance(time, YearInterval) and time.year:
+            start, end = date(time.year, 1, 1), date(time.year, 12, 31)
+        return (start, end) if start is not None and end is not None else None
+    return None
+
+
+def as_date(value):
+    """
+    Returns the date of a date or datetime
+
+    :param value: date, datetime or None
+    :return: date or None
+    """
+    return value.date() if isinstance(value, datetime) else value
+
+
+def period_rows(session, time_ids):
+    """
+    Returns the rows of the observation periods table for the given observations
+
+    :param session: session used to load the times
+    :param time_ids: dict from observation id to the id of its time
+    :return: list of dicts with observation_id, start_date and end_date
+    """
+    ids = list(set(time_id for time_id in time_ids.values() if time_id is not None))
+    times = with_polymorphic(Time, '*')
+    periods = {}
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        for time in session.query(times).filter(times.id.in_(ids[start:start + BULK_BATCH_SIZE])):
+            periods[time.id] = period_of(time)
+    rows = []
+    for observation_id, time_id in time_ids.items():
+        period = periods.get(time_id)
+        if period is not None:
+            rows.append(dict(observation_id=observation_id, start_date=period[0], end_date=period[1]))
+    return rows
+
+
+def store_periods(session, time_ids):
+    """
+    Replaces the periods of the given observations, in batches of BULK_BATCH_SIZE
+
+    :param session: session whose connection is used
+    :param time_ids: dict from observation id to the id of its time, None if the observation was deleted
+    """
+    table = ObservationPeriod.__table__
+    ids = list(time_ids.keys())
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        batch = ids[start:start + BULK_BATCH_SIZE]
+        session.execute(table.delete().where(table.c.observation_id.in_(batch)))
+        rows = period_rows(session, dict((id, time_ids[id]) for id in batch))
+        if len(rows) > 0:
+            session.execute(table.insert(), rows)
+
+
+def update_periods_on_flush(session, flush_context):
+    """
+    Listener of the flushes, keeps the periods of the written observations and times up to date
+
+    :param session: session that has been flushed
+    :param flush_context: internal state of the flush
+    """
+    time_ids = {}
+    changed_times = []
+    for instance in chain(session.new, session.dirty):
+        if isinstance(instance, Observation) and (instance in session.new
+                                                  or get_history(instance, 'ref_time_id').has_changes()
+                                                  or get_history(instance, 'ref_time').has_changes()):
+            time_ids[instance.id] = instance.ref_time_id
+        elif isinstance(instance, Time) and instance in session.dirty:
+            changed_times.append(instance.id)
+    for instance in session.deleted:
+        if isinstance(instance, Observation):
+            time_ids[instance.id] = None
+    if len(changed_times) > 0:
+        for observation_id, time_id in session.query(Observation.id, Observation.ref_time_id)\
+                .filter(Observation.ref_time_id.in_(changed_times)):
+            time_ids.setdefault(observation_id, time_id)
+    if len(time_ids) > 0:
+        store_periods(session, time_ids)
+
+
+def number_of(text):
+    """
+    Returns the number written in the text of a value
+
+    :param text: text of the value, or a number
+    :return: float, None if there is no text or it is not a finite number
+    """
+    if text is None:
+        return None
+    try:
+        number = float(text)
+    except (TypeError, ValueError):
+        return None
+    return number if not math.isnan(number) and not math.isinf(number) else None
+
+
+def number_rows(texts):
+    """
+    Returns the rows of the numeric values table for the given values
+
+    :param texts: dict from value id to the text of the value
+    :return: list of dicts with value_id and number, only for the values that are numbers
+    """
+    rows = []
+    for value_id, text in texts.items():
+        number = number_of(text)
+        if number is not None:
+            rows.append(dict(value_id=value_id, number=number))
+    return rows
+
+
+def store_numbers(session, texts):
+    """
+    Replaces the numbers of the given values, in batches of BULK_BATCH_SIZE
+
+    :param session: session whose connection is used
+    :param texts: dict from value id to the text of the value, None if the value was deleted
+    """
+    table = NumericValue.__table__
+    ids = list(texts.keys())
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        batch = ids[start:start + BULK_BATCH_SIZE]
+        session.execute(table.delete().where(table.c.value_id.in_(batch)))
+        rows = number_rows(dict((id, texts[id]) for id in batch))
+        if len(rows) > 0:
+            session.execute(table.insert(), rows)
+
+
+def update_numbers_on_flush(session, flush_context):
+    """
+    Listener of the flushes, keeps the numbers of the written values up to date
+
+    :param session: session that has been flushed
+    :param flush_context: internal state of the flush
+    """
+    texts = {}
+    for instance in chain(session.new, session.dirty):
+        if isinstance(instance, Value) and (instance in session.new or get_history(instance, 'value').has_changes()):
+            texts[instance.id] = instance.value
+    for instance in session.deleted:
+        if isinstance(instance, Value):
+            texts[instance.id] = None
+    if len(texts) > 0:
+        store_numbers(session, texts)
+
+
+def closure_rows(parents):
+    """
+    Returns the rows of the region closure table for a hierarchy of regions
+
+    :param parents: dict from region id to the id of its parent, None for the roots
+    :return: list of dicts with ancestor_id, descendant_id and depth
+    """
+    rows = []
+    for region_id in parents:
+        ancestor_id, depth, visited = region_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in visited:  # visited guards against cycles
+            rows.append(dict(ancestor_id=ancestor_id, descendant_id=region_id, depth=depth))
+            visited.add(ancestor_id)
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+    return rows
+
+
+def rebuild_region_closure(session):
+    """
+    Replaces the region closure table with the current hierarchy of regions
+
+    :param session: session whose connection is used
+    """
+    parents = dict(session.query(Region.id, Region.is_part_of_id))
+    table = RegionClosure.__table__
+    session.execute(table.delete())
+    rows = closure_rows(parents)
+    if len(rows) > 0:
+        session.execute(table.insert(), rows)
+
+
+def update_region_closure_on_flush(session, flush_context):
+    """
+    Listener of the flushes, rebuilds the region closure table if regions were inserted, deleted or moved
+
+    :param session: session that has been flushed
+    :param flush_context: internal state of the flush
+    """
+    for instance in chain(session.new, session.deleted, session.dirty):
+        if isinstance(instance, Region) and (instance not in session.dirty
+                                             or get_history(instance, 'is_part_of_id').has_changes()):
+            rebuild_region_closure(session)
+            return
+
+
+event.listen(Session, 'after_flush', update_periods_on_flush)
+event.listen(Session, 'after_flush', update_numbers_on_flush)
+event.listen(Session, 'after_flush', update_region_closure_on_flush)
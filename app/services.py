@@ -28,11 +28,22 @@ This file includes all the services that communicate views.py and daos.py
 :author: Herminio García
 """
 import time
-from app import db
-from app.daos import AuthDAO, ObservationDAO, IndicatorDAO
+from contextlib import contextmanager
+from itertools import chain
+from threading import Lock
+from flask import _app_ctx_stack
+from sqlalchemy import event, create_engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import Session, scoped_session
+from app import app, db, pool_monitor
+from app.daos import AuthDAO, ObservationDAO, IndicatorDAO, ValueDAO
 from daos import DAO, CountryDAO, RegionTranslationDAO, IndicatorTranslationDAO, TopicTranslationDAO, RegionDAO
-from model.models import Indicator, User, Organization, Observation, Region, DataSource, Dataset, Value, Topic, \
-    IndicatorRelationship, MeasurementUnit
+from model.models import Indicator, User, Organization, Region, DataSource, Dataset, Topic, IndicatorRelationship, \
+    MeasurementUnit
+
+UNITS_OF_WORK = 'units_of_work'  # key of the session info with the number of units of work that are open
+PRIMARY_READS = 'primary_reads'  # key of the session info that is True if reads must not go to the replicas
+DIMENSIONS_WRITTEN = 'dimensions_written'  # key of the session info that is True if its transaction wrote dimensions
 
 
 class GenericService(object):
@@ -47,13 +58,23 @@ class GenericService(object):
         """
         self.tm = TransactionManager()
 
-    def get_all(self):
+    def get_all(self, fields=None):
         """
         Method that returns all elements given by the dao
 
+        :param fields: names of the fields that will be used, all fields are loaded if None
         :return: collection of elements
         """
-        return self.tm.execute(self.dao, self.dao.get_all)
+        return self.tm.execute(self.dao, self.dao.get_all, fields)
+
+    def iterate_all(self, fields=None):
+        """
+        Method that returns all elements given by the dao, loaded while they are iterated
+
+        :param fields: names of the fields that will be used, all fields are loaded if None
+        :return: iterable of elements
+        """
+        return self.tm.execute(self.dao, self.dao.iterate_all, fields)
 
     def get_by_code(self, code):
         """
@@ -70,7 +91,7 @@ class GenericService(object):
 
         :param object: element to be persisted
         """
-        self.tm.execute(self.dao, self.dao.insert, object)
+        self.tm.execute_write(self.dao, self.dao.insert, object)
 
     def delete(self, code):
         """
@@ -78,7 +99,7 @@ class GenericService(object):
 
         :param code: id of the element to be deleted
         """
-        self.tm.execute(self.dao, self.dao.delete, code)
+        self.tm.execute_write(self.dao, self.dao.delete, code)
 
     def update(self, object):
         """
@@ -86,17 +107,40 @@ class GenericService(object):
 
         :param object: element to be updated with updated attributes
         """
-        self.tm.execute(self.dao, self.dao.update, object)
+        self.tm.execute_write(self.dao, self.dao.update, object)
+
+    def insert_many(self, objects):
+        """
+        Method that inserts many elements at once calling the dao
+
+        :param objects: list of elements to be persisted
+        """
+        self.tm.execute_write(self.dao, self.dao.insert_many, objects)
+
+    def update_many(self, objects):
+        """
+        Method that updates many elements at once calling the dao
+
+        :param objects: list of objects with the codes of the elements and the updated attributes
+        """
+        self.tm.execute_write(self.dao, self.dao.update_many, objects)
+
+    def delete_where(self, *criteria):
+        """
+        Method that deletes the elements that meet some criteria at once calling the dao
+
+        :param criteria: filter expressions over the columns of the class, all elements are deleted if none
+        :return: number of deleted elements
+        """
+        return self.tm.execute_write(self.dao, self.dao.delete_where, *criteria)
 
     def delete_all(self):
         """
         Method that deletes all elements by calling the dao
 
-        :attention: Take care of what you do, all countries will be destroyed
+        :attention: Take care of what you do, all elements will be destroyed
         """
-        objects = self.tm.execute(self.dao, self.dao.get_all)
-        for object in objects:
-            self.tm.execute(self.dao, self.dao.delete, object.id)
+        self.delete_where()
 
     def update_all(self, objects):
         """
@@ -104,8 +148,7 @@ class GenericService(object):
 
         :params objects: list of objects to be updated with updated attributes
         """
-        for object in objects:
-            self.tm.execute(self.dao, self.dao.update, object)
+        self.update_many(objects)
 
 
 class CountryService(GenericService):
@@ -120,16 +163,6 @@ class CountryService(GenericService):
         super(CountryService, self).__init__()
         self.dao = CountryDAO()
 
-    def delete_all(self):
-        """
-        Method that deletes all countries by calling the dao
-
-        :attention: Take care of what you do, all countries will be destroyed
-        """
-        objects = self.tm.execute(self.dao, self.dao.get_all)
-        for object in objects:
-            self.tm.execute(self.dao, self.dao.delete, object.iso3)
-
     def get_by_id(self, id):
         """
         Returns the country with the given id
@@ -181,14 +214,15 @@ class IndicatorService(GenericService):
         super(IndicatorService, self).__init__()
         self.dao = IndicatorDAO()
 
-    def get_indicators_by_country(self, iso3):
+    def get_indicators_by_country(self, iso3, fields=None):
         """
         Returns the indicators of a given country
 
         :param iso3: iso3 code of the given country
+        :param fields: names of the fields that will be used, all fields are loaded if None
         :return: list of indicators
         """
-        return self.tm.execute(self.dao, self.dao.get_indicators_by_country, iso3)
+        return self.tm.execute(self.dao, self.dao.get_indicators_by_country, iso3, fields)
 
     def get_indicator_by_country(self, iso3, indicator_id):
         """
@@ -199,13 +233,14 @@ class IndicatorService(GenericService):
         """
         return self.tm.execute(self.dao, self.dao.get_indicator_by_country, iso3, indicator_id)
 
-    def get_starred_indicators(self):
+    def get_starred_indicators(self, fields=None):
         """
         Returns the indicators that are starred
 
+        :param fields: names of the fields that will be used, all fields are loaded if None
         :return: list of indicators
         """
-        return self.tm.execute(self.dao, self.dao.get_starred_indicators)
+        return self.tm.execute(self.dao, self.dao.get_starred_indicators, fields)
 
     def get_average(self, indicator_id):
         """
@@ -216,14 +251,15 @@ class IndicatorService(GenericService):
         """
         return self.tm.execute(self.dao, self.dao.get_average, indicator_id)
 
-    def get_indicators_by_datasource(self, datasource_id):
+    def get_indicators_by_datasource(self, datasource_id, fields=None):
         """
         Returns the indicators of a given datasource
 
         :param datasource_id: id of the given datasource
+        :param fields: names of the fields that will be used, all fields are loaded if None
         :return: list of indicators
         """
-        return self.tm.execute(self.dao, self.dao.get_indicators_by_datasource, datasource_id)
+        return self.tm.execute(self.dao, self.dao.get_indicators_by_datasource, datasource_id, fields)
 
 
 class UserService(GenericService):
@@ -261,17 +297,28 @@ class ObservationService(GenericService):
         super(ObservationService, self).__init__()
         self.dao = ObservationDAO()
 
-    def get_by_region_and_indicator(self, region_id, indicator_id, limit, offset):
+    def backfill_periods(self):
+        """
+        Stores the periods of the observations that do not have them yet
+
+        :return: number of stored periods
+        """
+        return self.tm.execute_write(self.dao, self.dao.backfill_periods)
+
+    def get_by_region_and_indicator(self, region_id, indicator_id, limit, offset, profile=None, after=None):
         """
         Returns observations of a given region and indicator
 
         :param region_id: id of the given region
         :param indicator_id: id of the given indicator
         :param limit: number of limit results
-        :param offset: number of results to skip
+        :param offset: number of results to skip, None to page by observation id
+        :param profile: name of the loading profile of the observations, by default none
+        :param after: id of the last observation of the previous page, only if offset is None
         :return: list of observations
         """
-        return self.tm.execute(self.dao, self.dao.get_by_region_and_indicator, region_id, indicator_id, limit, offset)
+        return self.tm.execute(self.dao, self.dao.get_by_region_and_indicator, region_id, indicator_id, limit, offset,
+                               profile, after)
 
     def get_top_by_region(self, indicator_id, region_id, top):
         """
@@ -284,35 +331,124 @@ class ObservationService(GenericService):
         """
         return self.tm.execute(self.dao, self.dao.get_top_by_region, indicator_id, region_id, top)
 
-    def get_starred_observations_by_country(self, iso3, limit, offset):
+    def get_starred_observations_by_country(self, iso3, limit, offset, profile=None, after=None):
         """
         Returns observations of starred indicators for a given country
 
         :param iso3: iso3 code of a given country
         :param limit: number of limit results
-        :param offset: number of results to skip
+        :param offset: number of results to skip, None to page by observation id
+        :param profile: name of the loading profile of the observations, by default none
+        :param after: id of the last observation of the previous page, only if offset is None
         :return: list of observations
         """
-        return self.tm.execute(self.dao, self.dao.get_starred_observations_by_country, iso3, limit, offset)
+        return self.tm.execute(self.dao, self.dao.get_starred_observations_by_country, iso3, limit, offset, profile,
+                               after)
 
-    def get_by_indicator(self, indicator_id):
+    def get_by_indicator(self, indicator_id, from_date=None, to_date=None):
         """
         Returns observations of a given indicator
 
         :param indicator_id: id of the given indicator
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
         :return: list of observations
         """
-        return self.tm.execute(self.dao, self.dao.get_by_indicator, indicator_id)
+        return self.tm.execute(self.dao, self.dao.get_by_indicator, indicator_id, from_date, to_date)
+
+    def iterate_by_indicator(self, indicator_id, fields=None, from_date=None, to_date=None):
+        """
+        Returns observations of a given indicator, loaded while they are iterated
+
+        :param indicator_id: id of the given indicator
+        :param fields: names of the fields that will be used, all fields are loaded if None
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
+        :return: iterable of observations
+        """
+        return self.tm.execute(self.dao, self.dao.iterate_by_indicator, indicator_id, fields, from_date, to_date)
+
+    def get_averages_by_region_and_indicator(self, region_id, indicator_id):
+        """
+        Returns the average value of the observations of a given region and indicator, overall and by period
 
-    def get_by_country_and_indicator(self, indicator_id, iso3):
+        :param region_id: id of the given region
+        :param indicator_id: id of the given indicator
+        :return: tuple (overall average, list of tuples (period, average, count) ordered by period)
+        """
+        return self.tm.execute(self.dao, self.dao.get_averages_by_region_and_indicator, region_id, indicator_id)
+
+    def get_averages_by_country_and_indicator(self, indicator_id, iso3):
+        """
+        Returns the average value of the observations of a given country and indicator, overall and by period
+
+        :param indicator_id: id of the given indicator
+        :param iso3: iso3 code of the given country
+        :return: tuple (overall average, list of tuples (period, average, count) ordered by period)
+        """
+        return self.tm.execute(self.dao, self.dao.get_averages_by_country_and_indicator, indicator_id, iso3)
+
+    def get_by_country_and_indicator(self, indicator_id, iso3, profile=None, limit=None, offset=None, after=None,
+                                     from_date=None, to_date=None):
         """
         Returns observations of a given country and a given indicator
 
         :param indicator_id: id of the given indicator
         :param iso3: iso3 code of the given country
+        :param profile: name of the loading profile of the observations, by default none
+        :param limit: number of limit results, all observations if None
+        :param offset: number of results to skip, None to page by observation id
+        :param after: id of the last observation of the previous page, only if offset is None
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
         :return: list of observations
         """
-        return self.tm.execute(self.dao, self.dao.get_by_country_and_indicator, indicator_id, iso3)
+        return self.tm.execute(self.dao, self.dao.get_by_country_and_indicator, indicator_id, iso3, profile, limit,
+                               offset, after, from_date, to_date)
+
+    def get_by_country(self, iso3, limit, offset, after=None, from_date=None, to_date=None):
+        """
+        Returns a page of the observations of a given country
+
+        :param iso3: iso3 code of the given country
+        :param limit: number of limit results
+        :param offset: number of results to skip, None to page by observation id
+        :param after: id of the last observation of the previous page, only if offset is None
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
+        :return: list of observations
+        """
+        return self.tm.execute(self.dao, self.dao.get_by_country, iso3, limit, offset, after, from_date, to_date)
+
+    def get_page_by_indicator(self, indicator_id, limit, offset, after=None, from_date=None, to_date=None):
+        """
+        Returns a page of the observations of a given indicator
+
+        :param indicator_id: id of the given indicator
+        :param limit: number of limit results
+        :param offset: number of results to skip, None to page by observation id
+        :param after: id of the last observation of the previous page, only if offset is None
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
+        :return: list of observations
+        """
+        return self.tm.execute(self.dao, self.dao.get_page_by_indicator, indicator_id, limit, offset, after,
+                               from_date, to_date)
+
+    def get_by_region(self, region_id, limit, offset, after=None, from_date=None, to_date=None):
+        """
+        Returns a page of the observations of the countries of a given region
+
+        :param region_id: id of the given region
+        :param limit: number of limit results
+        :param offset: number of results to skip, None to page by observation id
+        :param after: id of the last observation of the previous page, only if offset is None
+        :param from_date: first day of the periods of the observations, no lower bound if None
+        :param to_date: last day of the periods of the observations, no upper bound if None
+        :return: list of observations
+        """
+        return self.tm.execute(self.dao, self.dao.get_by_region, region_id, limit, offset, after,
+                               from_date, to_date)
 
 
 class RegionService(GenericService):
@@ -352,24 +488,22 @@ class RegionService(GenericService):
         region = self.get_by_code(un_code)
         return self.tm.execute(self.dao, self.dao.get_regions_of_region, region.id)
 
-    def get_regions_with_data(self, indicator_id):
+    def get_data_coverage(self, indicator_id, region_id):
         """
-        Returns regions with countries that have data for a given indicator
+        Returns the regions with countries that have data for a given indicator
+        along with the regions that belong to a given region
 
         :param indicator_id: id of the given indicator
-        :return: list of regions
+        :param region_id: id of the given region
+        :return: list of tuples (region id, True if it has data, True if it belongs to the given region)
         """
-        return self.tm.execute(self.dao, self.dao.get_regions_with_data, indicator_id)
+        return self.tm.execute(self.dao, self.dao.get_data_coverage, indicator_id, region_id)
 
-    def delete_all(self):
+    def rebuild_closure(self):
         """
-        Method that deletes all regions by calling the dao
-
-        :attention: Take care of what you do, all regions will be destroyed
+        Rebuilds the table of the ancestors of every region, it is rebuilt on every region write
         """
-        objects = self.tm.execute(self.dao, self.dao.get_all)
-        for object in objects:
-            self.tm.execute(self.dao, self.dao.delete, object.un_code)
+        self.tm.execute_write(self.dao, self.dao.rebuild_closure)
 
 
 class DataSourceService(GenericService):
@@ -420,7 +554,15 @@ class ValueService(GenericService):
         Constructor for value service
         """
         super(ValueService, self).__init__()
-        self.dao = DAO(Value)
+        self.dao = ValueDAO()
+
+    def backfill_numbers(self):
+        """
+        Stores the numbers of the values that do not have them yet
+
+        :return: number of stored numbers
+        """
+        return self.tm.execute_write(self.dao, self.dao.backfill_numbers)
 
 
 class TopicService(GenericService):
@@ -487,17 +629,7 @@ class RegionTranslationService(GenericService):
         :param region_id: id of requested region
         :param lang_code: code of the language like: 'en', 'es', 'fr'
         """
-        self.tm.execute(self.dao, self.dao.delete, region_id, lang_code)
-
-    def delete_all(self):
-        """
-        Method that deletes all region translation by calling the dao
-
-        :attention: Take care of what you do, all countries will be destroyed
-        """
-        objects = self.tm.execute(self.dao, self.dao.get_all)
-        for object in objects:
-            self.tm.execute(self.dao, self.dao.delete, object.region_id, object.lang_code)
+        self.tm.execute_write(self.dao, self.dao.delete, region_id, lang_code)
 
 
 class IndicatorTranslationService(GenericService):
@@ -528,17 +660,7 @@ class IndicatorTranslationService(GenericService):
         :param indicator_id: id of requested indicator
         :param lang_code: code of the language like: 'en', 'es', 'fr'
         """
-        self.tm.execute(self.dao, self.dao.delete, indicator_id, lang_code)
-
-    def delete_all(self):
-        """
-        Method that deletes all indicator translations by calling the dao
-
-        :attention: Take care of what you do, all countries will be destroyed
-        """
-        objects = self.tm.execute(self.dao, self.dao.get_all)
-        for object in objects:
-            self.tm.execute(self.dao, self.dao.delete, object.indicator_id, object.lang_code)
+        self.tm.execute_write(self.dao, self.dao.delete, indicator_id, lang_code)
 
 
 class TopicTranslationService(GenericService):
@@ -569,17 +691,7 @@ class TopicTranslationService(GenericService):
         :param topic_id: id of requested indicator
         :param lang_code: code of the language like: 'en', 'es', 'fr'
         """
-        self.tm.execute(self.dao, self.dao.delete, topic_id, lang_code)
-
-    def delete_all(self):
-        """
-        Method that deletes all countries by calling the dao
-
-        :attention: Take care of what you do, all topic translations will be destroyed
-        """
-        objects = self.tm.execute(self.dao, self.dao.get_all)
-        for object in objects:
-            self.tm.execute(self.dao, self.dao.delete, object.topic_id, object.lang_code)
+        self.tm.execute_write(self.dao, self.dao.delete, topic_id, lang_code)
 
 
 class AuthService(GenericService):
@@ -594,16 +706,367 @@ class AuthService(GenericService):
         self.dao = AuthDAO()
 
 
+class DimensionRegistry(object):
+    """
+    In-process registry of the small dimension tables: countries, regions, indicators, measurement units and topics.
+    They are loaded once per worker into detached objects indexed by every code, so lookups do not query.
+    It also resolves the ids of the polymorphic routes (iso3, indicator id or un_code) to the type and primary
+    key of their entity. Every load is a new version, discarded after any commit that writes these dimensions,
+    after a cache deletion or once the timeout has passed, which bounds the staleness across workers
+    """
+    COUNTRY = 'country'
+    REGION = 'region'
+    INDICATOR = 'indicator'
+    MEASUREMENT_UNIT = 'measurement_unit'
+    TOPIC = 'topic'
+    LOAD_ORDER = (COUNTRY, REGION, INDICATOR, MEASUREMENT_UNIT, TOPIC)
+    RESOLUTION_ORDER = (COUNTRY, INDICATOR, REGION)
+    ROUTE_CODES = {
+        COUNTRY: 'iso3',
+        INDICATOR: 'id',
+        REGION: 'un_code'
+    }
+    INDEXED_CODES = {
+        COUNTRY: ('id', 'iso2', 'iso3', 'un_code'),
+        REGION: ('id', 'un_code'),
+        INDICATOR: ('id',),
+        MEASUREMENT_UNIT: ('id',),
+        TOPIC: ('id',)
+    }
+    DAO_FACTORIES = {
+        COUNTRY: CountryDAO,
+        REGION: RegionDAO,
+        INDICATOR: IndicatorDAO,
+        MEASUREMENT_UNIT: lambda: DAO(MeasurementUnit),
+        TOPIC: lambda: DAO(Topic)
+    }
+
+    def __init__(self, timeout=None):
+        """
+        Constructor for dimension registry, it listens to the flushes and commits of every session
+
+        :param timeout: seconds a loaded version is used, forever if None
+        """
+        self.timeout = timeout
+        self.dimensions = None
+        self.loaded_at = None
+        self.version = 0
+        self.lock = Lock()
+        event.listen(Session, 'after_flush', self.written_on_flush)
+        event.listen(Session, 'after_commit', self.invalidate_on_commit)
+        event.listen(Session, 'after_rollback', self.discard_on_rollback)
+
+    def get_all(self, kind):
+        """
+        Returns all the elements of a dimension
+
+        :param kind: one of COUNTRY, REGION, INDICATOR, MEASUREMENT_UNIT or TOPIC, regions include countries
+        :return: list of detached elements
+        """
+        return list(self.get_dimensions()[kind][0])
+
+    def get(self, kind, code, attribute='id'):
+        """
+        Returns the element of a dimension that owns the given code
+
+        :param kind: one of COUNTRY, REGION, INDICATOR, MEASUREMENT_UNIT or TOPIC, regions include countries
+        :param code: value of the code
+        :param attribute: name of the code, one of INDEXED_CODES of the kind
+        :return: detached element, None if there is not such element
+        """
+        return self.get_dimensions()[kind][1][attribute].get(index_key(code))
+
+    def get_id(self, kind, code):
+        """
+        Returns the primary key of the entity of the given kind that owns the code of the routes
+
+        :param kind: one of COUNTRY, INDICATOR or REGION
+        :param code: iso3, indicator id or un_code
+        :return: primary key of the entity, None if there is not such entity
+        """
+        element = self.get(kind, code, self.ROUTE_CODES[kind])
+        return element.id if element is not None else None
+
+    def resolve(self, code):
+        """
+        Returns the kind and primary key of the entity that owns the code, countries are
+        preferred to indicators and indicators to regions
+
+        :param code: iso3, indicator id or un_code
+        :return: tuple (kind, primary key), (None, None) if no entity owns the code
+        """
+        for kind in self.RESOLUTION_ORDER:
+            id = self.get_id(kind, code)
+            if id is not None:
+                return kind, id
+        return None, None
+
+    def attach(self, element):
+        """
+        Returns a copy of a detached element that belongs to the current session, without querying,
+        so its relationships can be loaded
+
+        :param element: element given by the registry
+        :return: element of the current session
+        """
+        return TransactionManager().read_session().merge(element, load=False)
+
+    def get_dimensions(self):
+        """
+        Returns the loaded version of the dimensions, loading a new one if it is missing or too old
+
+        :return: dict from kind to a tuple (elements, dict from code name to a dict from code to element)
+        """
+        dimensions = self.dimensions
+        if dimensions is None or (self.timeout is not None and time.time() - self.loaded_at > self.timeout):
+            dimensions = self.load()
+        return dimensions
+
+    def load(self):
+        """
+        Loads all dimensions with one query per table. A session of its own is used, so the elements
+        of the current session are not detached. They are kept only if no write has invalidated them meanwhile.
+        They are always read from the primary database, as a lagging replica would bring back the rows from
+        before the write that invalidated them for every client until the timeout
+
+        :return: dict from kind to a tuple (elements, dict from code name to a dict from code to element)
+        """
+        version = self.version
+        session = Session(bind=db.engine)
+        try:
+            elements = {}
+            for kind in self.LOAD_ORDER:
+                dao = self.DAO_FACTORIES[kind]()
+                dao.set_session(session)
+                elements[kind] = dao.get_all()
+        finally:
+            session.close()
+        dimensions = {}
+        for kind in self.LOAD_ORDER:
+            indexes = {}
+            for attribute in self.INDEXED_CODES[kind]:
+                index = {}
+                for element in elements[kind]:
+                    code = getattr(element, attribute)
+                    if code is not None and index_key(code) not in index:
+                        index[index_key(code)] = element
+                indexes[attribute] = index
+            dimensions[kind] = (elements[kind], indexes)
+        with self.lock:
+            if version == self.version:
+                self.dimensions = dimensions
+                self.loaded_at = time.time()
+        return dimensions
+
+    def invalidate(self):
+        """
+        Discards the loaded version, a new one will be loaded on next use
+        """
+        with self.lock:
+            self.version += 1
+            self.dimensions = None
+
+    def invalidate_after_commit(self):
+        """
+        Discards the loaded version once the transaction of the current session commits, for writes the
+        flushes do not see, like bulk statements. Outside units of work it is discarded at once, as their
+        writes are already committed
+        """
+        session = db.session()
+        if session.info.get(UNITS_OF_WORK, 0) > 0:
+            session.info[DIMENSIONS_WRITTEN] = True
+        else:
+            self.invalidate()
+
+    def written_on_flush(self, session, flush_context):
+        """
+        Listener of the flushes, marks the transaction of the session if any dimension was written, the
+        registry is invalidated when it commits, so no version is loaded from rows about to change
+
+        :param session: session that has been flushed
+        :param flush_context: internal state of the flush
+        """
+        for instance in chain(session.new, session.dirty, session.deleted):
+            if isinstance(instance, (Region, Indicator, MeasurementUnit, Topic)):
+                session.info[DIMENSIONS_WRITTEN] = True
+                return
+
+    def invalidate_on_commit(self, session):
+        """
+        Listener of the commits, invalidates the registry if the committed transaction wrote dimensions
+
+        :param session: session that has been committed
+        """
+        if session.info.pop(DIMENSIONS_WRITTEN, False):
+            self.invalidate()
+
+    def discard_on_rollback(self, session):
+        """
+        Listener of the rollbacks, forgets the dimensions written by the rolled back transaction
+
+        :param session: session that has been rolled back
+        """
+        session.info.pop(DIMENSIONS_WRITTEN, None)
+
+
+def index_key(code):
+    """
+    Returns the key of a code in the registry indexes, codes of the urls are strings while some codes are integers
+
+    :param code: iso3, indicator id or un_code
+    :return: code as a string
+    """
+    return code if isinstance(code, basestring) else unicode(code)
+
+
+class ReadReplicas(object):
+    """
+    Read-only copies of the database, given by the SQLALCHEMY_REPLICA_URIS setting. Every request
+    reads from one of them, chosen in turn, through a session of its own removed with the request
+    """
+
+    def __init__(self, app):
+        """
+        Constructor for read replicas
+
+        :param app: flask application whose settings give the replicas
+        """
+        self.app = app
+        self.engines = None
+        self.position = 0
+        self.lock = Lock()
+        self.session = scoped_session(self.create_session, scopefunc=_app_ctx_stack.__ident_func__)
+        app.teardown_appcontext(self.remove)
+
+    def get_engines(self):
+        """
+        Returns the engines of the replicas, created on first use
+
+        :return: list of engines, empty if there are no replicas
+        """
+        with self.lock:
+            if self.engines is None:
+                uris = self.app.config.get('SQLALCHEMY_REPLICA_URIS', [])
+                self.engines = [self.create_engine(uri) for uri in uris]
+            return self.engines
+
+    def create_engine(self, uri):
+        """
+        Creates the engine of a replica, with the same pool settings as the primary database
+
+        :param uri: url of the replica
+        :return: engine, whose pool is watched
+        """
+        info, options = make_url(uri), {'convert_unicode': True}
+        db.apply_pool_defaults(self.app, options)
+        db.apply_driver_hacks(self.app, info, options)
+        engine = create_engine(info, **options)
+        pool_monitor.watch(engine.pool, repr(engine.url), self.app.config.get('SQLALCHEMY_POOL_PRE_PING'))
+        return engine
+
+    def next_engine(self):
+        """
+        Returns the engine of the next replica in turn
+
+        :return: engine, None if there are no replicas
+        """
+        engines = self.get_engines()
+        if len(engines) == 0:
+            return None
+        with self.lock:
+            self.position = (self.position + 1) % len(engines)
+            return engines[self.position]
+
+    def create_session(self):
+        """
+        Creates a session bound to the next replica, it is only used to read
+        """
+        return Session(bind=self.next_engine(), autoflush=False)
+
+    def remove(self, exception=None):
+        """
+        Removes the session of the current request, if any
+        """
+        self.session.remove()
+
+    def dispose(self):
+        """
+        Closes the connections to the replicas, they are created again from the settings on next use
+        """
+        self.session.remove()
+        with self.lock:
+            for engine in self.engines or []:
+                engine.dispose()
+            self.engines = None
+
+
+read_replicas = ReadReplicas(app)
+
+
 class TransactionManager(object):
     """
     Transaction manager that helps to abstract from the execution
+    Reads are run in the transaction of the current session, that they never commit, so the objects
+    loaded during a request are not expired. They are run on a replica of the database, if any,
+    unless they are run in a unit of work or the reads were bound to the primary one. Writes are
+    committed by the outermost unit of work they are run in, or right away if there is not any
     """
     def execute(self, dao, function, *args):
         """
-        Abstraction for all calls to the dao methods, like command executor
+        Abstraction for all calls to the dao methods that only read, like command executor
+        """
+        getattr(dao, 'set_session')(self.read_session())
+        return function(*args)
+
+    def execute_write(self, dao, function, *args):
+        """
+        Abstraction for all calls to the dao methods that write, like command executor
         """
-        session = db.session
+        session = db.session()
         getattr(dao, 'set_session')(session)
         result = function(*args)
-        session.commit()
+        if session.info.get(UNITS_OF_WORK, 0) > 0:
+            session.flush()
+        else:
+            session.commit()
+            self.read_from_primary()
         return result
+
+    def read_session(self):
+        """
+        Returns the session where reads are run
+
+        :return: session of a replica, or the primary session inside units of work, when the reads
+        were bound to the primary database or there are no replicas
+        """
+        info = db.session().info
+        if info.get(UNITS_OF_WORK, 0) > 0 or info.get(PRIMARY_READS) or len(read_replicas.get_engines()) == 0:
+            return db.session
+        return read_replicas.session
+
+    def read_from_primary(self):
+        """
+        Binds the reads of the current session to the primary database, so the writes committed
+        by it are read back even if the replicas lag behind
+        """
+        db.session().info[PRIMARY_READS] = True
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Context whose writes are run in a single transaction, committed when it ends or rolled back if an
+        exception is raised. Units of work can be nested, only the outermost one commits or rolls back
+        """
+        session = db.session()
+        session.info[UNITS_OF_WORK] = session.info.get(UNITS_OF_WORK, 0) + 1
+        try:
+            yield session
+        except:
+            session.info[UNITS_OF_WORK] -= 1
+            if session.info[UNITS_OF_WORK] == 0:
+                session.rollback()
+            raise
+        session.info[UNITS_OF_WORK] -= 1
+        if session.info[UNITS_OF_WORK] == 0:
+            session.commit()
+            self.read_from_primary()
@@ -28,9 +28,38 @@ This file includes some util features like marshalling
 :author: Herminio García
 """
 
+import csv
 import json
 import datetime, time
-from dicttoxml import dicttoxml
+import os
+import zlib
+from operator import attrgetter
+from threading import Lock
+from timeit import default_timer
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Date, DateTime, event, exc
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional, only needed by the arrow and parquet formats
+    pyarrow = None
+try:
+    import brotli
+except ImportError:  # optional, only needed by the br content encoding
+    brotli = None
+
+
+STREAM_CHUNK_SIZE = 64 * 1024  # length of the chunks written to streamed responses
+PRIMITIVE_TYPES = (int, long, str, bool, float, unicode)
+DATE_TYPES = (datetime.date, datetime.datetime)
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+COLUMNAR_BATCH_SIZE = 10000  # rows of every arrow record batch or parquet row group
+GZIP_LEVEL = 6  # compression level of the gzip responses, compressed while they are sent
+BROTLI_QUALITY = 5  # compression quality of the br responses, compressed while they are sent
+STATIC_VARIANT_SUFFIXES = {'br': '.br', 'gzip': '.gz'}  # suffixes of the compressed static files, by encoding
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')  # options sqlite engines do not take
+XML_TYPES = {str: 'str', unicode: 'str', int: 'int', long: 'int', float: 'float', bool: 'bool', type(None): 'null'}
 
 
 class JSONConverter(object):
@@ -44,35 +73,55 @@ class JSONConverter(object):
         :param elements_list: list of elements to be converted
         :return: json array ready be returned as string
         """
-        json_result = '[\n'
-        for element in elements_list:
-            json_result += self.object_to_json(element) + ",\n" \
-                if len(elements_list)-1 != elements_list.index(element) \
-                else self.object_to_json(element) + "\n"
-        json_result += "]"
-        return json_result
-        
-    def object_to_json(self, element):
+        return ''.join(self.list_to_json_stream(elements_list))
+
+    def list_to_json_stream(self, elements_list, chunk_size=None, fields=None):
+        """
+        Convert a list to its json equivalent, chunk by chunk
+
+        :param elements_list: iterable of elements to be converted, it is only iterated once
+        :param chunk_size: approximate length of every chunk, by default *STREAM_CHUNK_SIZE*
+        :param fields: names of the fields of every element to include, all fields if None
+        :return: generator of strings that joined are the json array
+        """
+        def elements():
+            yield '[\n'
+            separator = ''
+            for element in elements_list:
+                yield separator
+                yield self.object_to_json(element, fields)
+                separator = ',\n'
+            yield '\n]' if separator else ']'
+        return join_in_chunks(elements(), chunk_size)
+
+    def list_to_ndjson_stream(self, elements_list, chunk_size=None, fields=None):
+        """
+        Convert a list to newline delimited json, one object per line, chunk by chunk
+
+        :param elements_list: iterable of elements to be converted, it is only iterated once
+        :param chunk_size: approximate length of every chunk, by default *STREAM_CHUNK_SIZE*
+        :param fields: names of the fields of every element to include, all fields if None
+        :return: generator of strings that joined are the json lines
+        """
+        return join_in_chunks((self.object_to_json(element, fields) + '\n' for element in elements_list),
+                              chunk_size)
+
+    def object_to_json(self, element, fields=None):
         """
         Convert a object to its json equivalent
 
         :param element: element to be converted
+        :param fields: names of the fields to include, all fields if None
         :return: json object in string format
         """
-        return json.dumps(row2dict(element))
+        return json.dumps(row2dict(element, fields))
 
 
 class XMLConverter(object):
     """
     XML converter from objects and list
     """
-    
-    def __init__(self):
-        """
-        Constructor for XML converter
-        """
-        self.json_converter = JSONConverter()  # needed, first to json and then to xml
-    
+
     def list_to_xml(self, elements_list, root_node="elements", child_node="element"):
         """
         Convert a list to its XML equivalent
@@ -82,25 +131,40 @@ class XMLConverter(object):
         :param child_node: name for object tag in every element of the list, by default *element*
         :return: Xml string
         """
-        xml_result = '<' + root_node + '>'
-        for element in elements_list:
-            xml_result += self.object_to_xml(element, child_node)
-        xml_result += '</' + root_node + '>'
-        return xml_result
+        return ''.join(self.list_to_xml_stream(elements_list, root_node, child_node))
 
-    def object_to_xml(self, element, root_node="element"):
+    def list_to_xml_stream(self, elements_list, root_node="elements", child_node="element", chunk_size=None,
+                           fields=None):
+        """
+        Convert a list to its XML equivalent, chunk by chunk
+
+        :param elements_list: iterable of elements to be converted, it is only iterated once
+        :param root_node: name for the root tag in the xml, by default *elements*
+        :param child_node: name for object tag in every element of the list, by default *element*
+        :param chunk_size: approximate length of every chunk, by default *STREAM_CHUNK_SIZE*
+        :param fields: names of the fields of every element to include, all fields if None
+        :return: generator of strings that joined are the xml document
+        """
+        def elements():
+            yield '<' + root_node + '>'
+            for element in elements_list:
+                yield self.object_to_xml(element, child_node, fields)
+            yield '</' + root_node + '>'
+        return join_in_chunks(elements(), chunk_size)
+
+    def object_to_xml(self, element, root_node="element", fields=None):
         """
         Convert a object to its XML equivalent
 
         :param element: element to be converted
         :param root_node: name for root tag on xml, by default *element*
+        :param fields: names of the fields to include, all fields if None
         :return: Xml string
         """
-        element = json.loads(self.json_converter.object_to_json(element))
-        xml_result = '<' + root_node + '>'
-        xml_result += dicttoxml(element, False)        
-        xml_result += '</' + root_node + '>'
-        return xml_result
+        output = ['<', root_node, '>']
+        dict_to_xml(row2dict(element, fields), output)
+        output.extend(('</', root_node, '>'))
+        return ''.join(output)
 
 
 class CSVConverter(object):
@@ -115,12 +179,28 @@ class CSVConverter(object):
         :param elements_list: collection to be converted
         :return: csv string
         """
-        csv_result = ''
-        keys = row2dict(elements_list[0]).keys()
-        csv_result += ';'.join(keys) + '\n'
-        for element in elements_list:
-            csv_result += self.object_to_csv(element, False, keys)
-        return csv_result
+        return ''.join(self.list_to_csv_stream(elements_list))
+
+    def list_to_csv_stream(self, elements_list, chunk_size=None, fields=None):
+        """
+        Convert a list to its csv equivalent, chunk by chunk
+        Header is taken from the first element
+
+        :param elements_list: iterable of elements to be converted, it is only iterated once
+        :param chunk_size: approximate length of every chunk, by default *STREAM_CHUNK_SIZE*
+        :param fields: names of the fields of every element to include, all fields if None
+        :return: generator of strings that joined are the csv
+        """
+        def lines():
+            writer = csv_writer()
+            keys = None
+            for element in elements_list:
+                element = row2dict(element, fields)
+                if keys is None:
+                    keys = element.keys()
+                    yield writer.writerow(keys)
+                yield self.element_line(writer, element, keys)
+        return join_in_chunks(lines(), chunk_size)
 
     def object_to_csv(self, element, header=True, keys=None):
         """
@@ -128,26 +208,332 @@ class CSVConverter(object):
 
         :param element: object to be converted
         :param header: True if headers are desired, False if not, by default True
-        :param keys: Header keys to use if method used by list_to_csv, default None
+        :param keys: Header keys to use, default None
         :return: csv string
         """
         element = row2dict(element)
-        csv = ''
+        writer = csv_writer()
         if keys is None:
             keys = element.keys()
-        if header:
-            csv += ';'.join(element.keys()) + '\n'
-        for key in keys:
-            if key in element.keys():
-                try:
-                    value = str(element[key])
-                except UnicodeEncodeError:
-                    value = element[key]
+        csv_result = writer.writerow(element.keys()) if header else ''
+        return csv_result + self.element_line(writer, element, keys)
+
+    def element_line(self, writer, element, keys):
+        """
+        Returns the csv line of a converted element, every value is followed by the delimiter
+
+        :param writer: csv writer, as returned by csv_writer
+        :param element: dictionary given by row2dict
+        :param keys: header keys, values of missing keys are left empty
+        :return: csv line
+        """
+        values = [csv_value(element[key]) if key in element else '' for key in keys]
+        values.append('')
+        return writer.writerow(values)
+
+
+class LineReturner(object):
+    """
+    File-like object whose write method returns the given line, so a csv
+    writer returns every line instead of storing it
+    """
+    def write(self, line):
+        return line
+
+
+def csv_writer():
+    """
+    Returns a csv writer whose writerow method returns the line written
+    Values are separated by *;* and quoted only if needed
+
+    :return: csv writer
+    """
+    return csv.writer(LineReturner(), delimiter=';', lineterminator='\n')
+
+
+def csv_value(value):
+    """
+    Convert a value to its csv representation
+
+    :param value: value to be converted
+    :return: utf-8 encoded string
+    """
+    return value.encode('utf-8') if type(value) is unicode else str(value)
+
+
+class ColumnarConverter(object):
+    """
+    Apache Arrow IPC stream and Parquet converter from lists
+    Values are taken column by column into record batches, without converting
+    every element into a dictionary
+    """
+
+    def __init__(self, columns, batch_size=None):
+        """
+        Constructor for columnar converter
+
+        :param columns: list of (name, arrow type name, extractor) like ('value', 'float64', get_value)
+        :param batch_size: number of rows of every record batch or row group, by default *COLUMNAR_BATCH_SIZE*
+        """
+        self.columns = columns
+        self.batch_size = batch_size if batch_size is not None else COLUMNAR_BATCH_SIZE
+
+    def select(self, fields):
+        """
+        Returns a converter of only some of the columns of this one
+
+        :param fields: names of the columns to keep, all columns if None
+        :return: columnar converter
+        """
+        if fields is None:
+            return self
+        return ColumnarConverter([column for column in self.columns if column[0] in fields], self.batch_size)
+
+    def is_available(self):
+        """
+        Returns if the columnar formats can be used, they need pyarrow to be installed
+
+        :return: True if pyarrow is available, False otherwise
+        """
+        return pyarrow is not None
+
+    def schema(self):
+        """
+        Returns the arrow schema of the converted lists
+
+        :return: arrow schema
+        """
+        return pyarrow.schema([pyarrow.field(name, getattr(pyarrow, type_name)())
+                               for name, type_name, extractor in self.columns])
+
+    def list_to_batches(self, elements_list):
+        """
+        Convert a list to arrow record batches
+
+        :param elements_list: iterable of elements to be converted, it is only iterated once
+        :return: generator of record batches
+        """
+        schema = self.schema()
+        extractors = [extractor for name, type_name, extractor in self.columns]
+        columns = [[] for extractor in extractors]
+        for element in elements_list:
+            for column, extractor in zip(columns, extractors):
+                column.append(extractor(element))
+            if len(columns[0]) == self.batch_size:
+                yield self.to_batch(columns, schema)
+                columns = [[] for extractor in extractors]
+        if len(columns[0]) > 0:
+            yield self.to_batch(columns, schema)
+
+    def to_batch(self, columns, schema):
+        """
+        Builds a record batch from lists of values
+
+        :param columns: a list of values for every column
+        :param schema: arrow schema of the batch
+        :return: record batch
+        """
+        arrays = [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)]
+        return pyarrow.RecordBatch.from_arrays(arrays, schema.names)
+
+    def list_to_arrow_stream(self, elements_list):
+        """
+        Convert a list to the Arrow IPC streaming format, batch by batch
+
+        :param elements_list: iterable of elements to be converted, it is only iterated once
+        :return: generator of byte strings that joined are the arrow stream
+        """
+        sink = ChunkSink()
+        writer = pyarrow.RecordBatchStreamWriter(sink, self.schema())
+        for batch in self.list_to_batches(elements_list):
+            writer.write_batch(batch)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    def list_to_parquet_stream(self, elements_list):
+        """
+        Convert a list to a Parquet file, one row group per batch
+
+        :param elements_list: iterable of elements to be converted, it is only iterated once
+        :return: generator of byte strings that joined are the parquet file
+        """
+        sink = ChunkSink()
+        writer = pyarrow.parquet.ParquetWriter(sink, self.schema())
+        for batch in self.list_to_batches(elements_list):
+            writer.write_table(pyarrow.Table.from_batches([batch]))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+
+class ChunkSink(object):
+    """
+    File-like object that keeps the bytes written until they are drained
+    """
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        """
+        Returns the bytes written since the last call
+
+        :return: byte string
+        """
+        data = ''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def dict_to_xml(dictionary, output):
+    """
+    Write the XML equivalent of a dictionary, every value tagged with its type
+    like *<iso3 type="str">ESP</iso3>*
+
+    :param dictionary: dictionary to be converted, usually given by row2dict
+    :param output: list where the pieces of the xml string are appended
+    """
+    for key, value in dictionary.items():
+        if key.isdigit():
+            key = 'n' + key
+        value_type = XML_TYPES.get(type(value))
+        if value_type is None:
+            if isinstance(value, dict):
+                output.extend(('<', key, ' type="dict">'))
+                dict_to_xml(value, output)
+            elif isinstance(value, (list, tuple, set)):
+                output.extend(('<', key, ' type="list">'))
+                for item in value:
+                    dict_to_xml({'item': item}, output)
             else:
-                value = ''
-            csv += value + ';'
-        csv += '\n'
-        return csv
+                raise TypeError('Unsupported data type: %s (%s)' % (value, type(value).__name__))
+        elif value_type == 'str':
+            output.extend(('<', key, ' type="str">', xml_escape(value)))
+        elif value_type == 'bool':
+            output.extend(('<', key, ' type="bool">', 'true' if value else 'false'))
+        elif value_type == 'null':
+            output.extend(('<', key, ' type="null">'))
+        else:
+            output.extend(('<', key, ' type="', value_type, '">', str(value)))
+        output.extend(('</', key, '>'))
+
+
+def xml_escape(text):
+    """
+    Escape the characters of a text that are not allowed in XML
+
+    :param text: str or unicode
+    :return: escaped text
+    """
+    return text.replace('&', '&amp;').replace('"', '&quot;').replace('\'', '&apos;')\
+        .replace('<', '&lt;').replace('>', '&gt;')
+
+
+def join_in_chunks(strings, chunk_size=None):
+    """
+    Join an iterable of small strings into chunks of, at least, the given length
+
+    :param strings: iterable of strings
+    :param chunk_size: minimum length of every chunk except the last one, by default *STREAM_CHUNK_SIZE*
+    :return: generator of joined strings
+    """
+    if chunk_size is None:
+        chunk_size = STREAM_CHUNK_SIZE
+    buffer = []
+    size = 0
+    for string in strings:
+        buffer.append(string)
+        size += len(string)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def available_encodings():
+    """
+    Returns the content encodings that can be used to compress responses, preferred first
+
+    :return: list of encodings, br is only available if brotli is installed
+    """
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def compress_stream(chunks, encoding, level=None):
+    """
+    Compresses a stream of strings, every chunk is flushed so it can be sent without
+    waiting for the next one
+
+    :param chunks: iterable of strings to be compressed
+    :param encoding: content encoding, gzip or br
+    :param level: compression level, by default *GZIP_LEVEL* or *BROTLI_QUALITY*
+    :return: generator of strings that joined are the compressed data
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level if level is not None else BROTLI_QUALITY)
+        compress_chunk, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(level if level is not None else GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress_chunk, finish = compressor.compress, compressor.flush
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+    for chunk in chunks:
+        compressed = compress_chunk(chunk) + flush()
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+def compress(data, encoding, best=False):
+    """
+    Compresses a string
+
+    :param data: string to be compressed
+    :param encoding: content encoding, gzip or br
+    :param best: True to use the best compression level, which is much slower for br, only for build steps
+    :return: compressed string
+    """
+    return ''.join(compress_stream([data], encoding, (11 if encoding == 'br' else 9) if best else None))
+
+
+def build_static_variants(folder, extensions):
+    """
+    Writes the compressed variants of the static files next to them, with the best compression level
+    and the suffixes of *STATIC_VARIANT_SUFFIXES*, for every available encoding
+
+    :param folder: static folder
+    :param extensions: extensions of the files to compress, like '.js'
+    :return: list of paths of the written files
+    """
+    written = []
+    for directory, directories, filenames in os.walk(folder):
+        for filename in filenames:
+            if os.path.splitext(filename)[1] not in extensions:
+                continue
+            path = os.path.join(directory, filename)
+            with open(path, 'rb') as static_file:
+                data = static_file.read()
+            for encoding in available_encodings():
+                with open(path + STATIC_VARIANT_SUFFIXES[encoding], 'wb') as variant_file:
+                    variant_file.write(compress(data, encoding, True))
+                written.append(path + STATIC_VARIANT_SUFFIXES[encoding])
+    return written
 
 
 class Struct(object):
@@ -177,46 +563,269 @@ class DictionaryList2ObjectList(object):
         return returned_list
 
 
-def check_if_date(field_name, object, row):
+class ViewModel(object):
+    """
+    Read-only view of an object, usually a SQLAlchemy row, with some additional fields
+    Attributes are read from the additional fields first and then from the object, and
+    assigned attributes are added to the additional fields, so the object is never
+    modified and the session is not dirtied while building a response
     """
-    Convert a date field into long format
 
-    :param field_name: name of the field where the date is
-    :param object: object to store the date in long format
-    :param row: object, usually a SQLAlchemy row where field is stored
+    def __init__(self, element, **fields):
+        """
+        Constructor for view model
+
+        :param element: object to be viewed
+        :param fields: additional fields, serialized along with the fields of the object
+        """
+        self.__dict__['_element'] = element
+        self.__dict__['_fields'] = fields
+
+    def __getattr__(self, name):
+        fields = self.__dict__['_fields']
+        if name in fields:
+            return fields[name]
+        return getattr(self.__dict__['_element'], name)
+
+    def __setattr__(self, name, value):
+        self._fields[name] = value
+
+    def __eq__(self, other):
+        return self._element == (other._element if isinstance(other, ViewModel) else other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._element)
+
+
+class Serializer(object):
+    """
+    Serializer that converts objects, usually SQLAlchemy rows, into dictionaries.
+    The fields of every class and set of other parseable fields are resolved once
+    into a plan, a list of (field, extractor) pairs that is applied to every object.
+    Requested fields are restricted to the ones of the class before a filtered plan
+    is cached, so the cache does not grow with the fields asked by the clients
     """
-    if type(getattr(row, field_name)) is datetime.date or type(getattr(row, field_name)) is datetime.datetime:
-        object[field_name] = time.mktime(getattr(row, field_name).timetuple())
-    else:
-        object[field_name] = getattr(row, field_name)
 
+    def __init__(self, date_encoder=None):
+        """
+        Constructor for serializer
 
-def row2dict(row):
+        :param date_encoder: encoder of the dates and datetimes, by default a *DateEncoder* to epoch seconds
+        """
+        self.plans = {}
+        self.date_encoder = date_encoder if date_encoder is not None else DateEncoder()
+
+    def set_date_encoder(self, date_encoder):
+        """
+        Changes the encoder of the dates and datetimes, the plans already built are discarded
+
+        :param date_encoder: encoder of the dates and datetimes
+        """
+        self.date_encoder = date_encoder
+        self.plans = {}
+
+    def serialize(self, element, fields=None):
+        """
+        Converts an object into a dictionary
+
+        :param element: object to be converted, usually a SQLAlchemy row
+        :param fields: names of the fields to include, all fields if None
+        :return: dictionary, None if element is None
+        """
+        if element is None:
+            return None
+        if type(element) is ViewModel:
+            return self.serialize_view(element, fields)
+        plan = self.get_plan(element, fields)
+        result = {}
+        for field, extractor in plan:
+            result[field] = extractor(element)
+        return result
+
+    def serialize_view(self, view, fields=None):
+        """
+        Converts a view model into a dictionary, the fields of the viewed object and the additional ones
+
+        :param view: view model to be converted
+        :param fields: names of the fields to include, all fields if None
+        :return: dictionary
+        """
+        result = self.serialize(view._element, fields)
+        for field, value in view._fields.iteritems():
+            if fields is None or field in fields:
+                result[field] = self.serialize_value(value)
+        return result
+
+    def serialize_value(self, value):
+        """
+        Converts a value that could contain another object
+
+        :param value: value to be converted
+        :return: the value, encoded if it is a date or serialized if it is an object
+        """
+        if type(value) in PRIMITIVE_TYPES:
+            return value
+        elif type(value) in DATE_TYPES:
+            return self.date_encoder.encode(value)
+        return self.serialize(value)
+
+    def plan_key(self, element):
+        """
+        Returns the key of the plan that serializes all the fields of the given object
+
+        :param element: object to be converted
+        :return: class and other fields that identify the plan
+        """
+        cls = element.__class__
+        if hasattr(cls, '__table__'):
+            return cls, tuple(getattr(element, 'other_parseable_fields', ()))
+        return cls, frozenset(getattr(element, '__dict__', ()))
+
+    def get_plan(self, element, fields=None):
+        """
+        Returns the plan to serialize objects like the given one, built the first time it is needed
+
+        :param element: object to be converted
+        :param fields: names of the fields to include, all fields if None
+        :return: list of (field, extractor) pairs
+        """
+        key = self.plan_key(element)
+        plan = self.plans.get(key)
+        if plan is None:
+            plan = self.plans[key] = self.build_full_plan(element)
+        if fields is None:
+            return plan
+        key = key, frozenset(field for field, extractor in plan if field in fields)
+        filtered = self.plans.get(key)
+        if filtered is None:
+            filtered = self.plans[key] = [(field, extractor) for field, extractor in plan if field in key[1]]
+        return filtered
+
+    def build_full_plan(self, element):
+        """
+        Builds the plan to serialize all the fields of objects like the given one
+
+        :param element: object to be converted
+        :return: list of (field, extractor) pairs
+        """
+        if not hasattr(element.__class__, '__table__'):
+            return [(field, date_extractor(field, self.date_encoder)) for field in get_user_attrs(element)]
+        plan = []
+        for column in element.__mapper__.columns:
+            if isinstance(column.type, (Date, DateTime)):
+                plan.append((column.name, date_extractor(column.name, self.date_encoder)))
+            else:
+                plan.append((column.name, attrgetter(column.name)))
+        for field in getattr(element, 'other_parseable_fields', ()):
+            plan.append((field, self.nested_extractor(field)))
+        return plan
+
+    def nested_extractor(self, field):
+        """
+        Returns an extractor for a field that could contain another object
+
+        :param field: name of the field
+        :return: function that returns the value of the field, serialized if it is an object
+        """
+        serialize = self.serialize
+        encode = self.date_encoder.encode
+
+        def extractor(element):
+            value = getattr(element, field)
+            if type(value) in PRIMITIVE_TYPES:
+                return value
+            elif type(value) in DATE_TYPES:
+                return encode(value)
+            return serialize(value)
+        return extractor
+
+
+def date_extractor(field, date_encoder):
+    """
+    Returns an extractor for a field that could contain a date
+
+    :param field: name of the field
+    :param date_encoder: encoder of the dates and datetimes
+    :return: function that returns the value of the field, encoded if it is a date
+    """
+    encode = date_encoder.encode
+
+    def extractor(element):
+        value = getattr(element, field)
+        return encode(value) if type(value) in DATE_TYPES else value
+    return extractor
+
+
+class DateEncoder(object):
+    """
+    Encoder of dates and datetimes into seconds since epoch, or ISO 8601 strings
+    Naive values are taken in a fixed UTC offset, computed once, so the result does
+    not depend on daylight saving time and no call to the C time functions is needed
+    """
+
+    def __init__(self, utc_offset=None, iso=False):
+        """
+        Constructor for date encoder
+
+        :param utc_offset: seconds west of UTC of the naive values, like time.timezone, by default the server one
+        :param iso: True to encode into ISO 8601 strings instead of seconds since epoch, by default False
+        """
+        self.utc_offset = utc_offset if utc_offset is not None else time.timezone
+        self.iso = iso
+        if iso:
+            self.encode = self.to_iso
+
+    def encode(self, value):
+        """
+        Convert a date or datetime into seconds since epoch
+
+        :param value: date or datetime
+        :return: seconds since epoch, as float
+        """
+        if type(value) is datetime.datetime:
+            offset = value.utcoffset()
+            if offset is not None:
+                value = value.replace(tzinfo=None) - offset
+                return (value - EPOCH).total_seconds()
+            return (value - EPOCH).total_seconds() + self.utc_offset
+        return (value.toordinal() - EPOCH_ORDINAL) * 86400.0 + self.utc_offset
+
+    def decode(self, seconds):
+        """
+        Convert seconds since epoch into a naive datetime, in the same fixed UTC offset used by encode,
+        so decoded values are encoded back into the same seconds
+
+        :param seconds: seconds since epoch
+        :return: naive datetime
+        """
+        return EPOCH + datetime.timedelta(seconds=seconds - self.utc_offset)
+
+    def to_iso(self, value):
+        """
+        Convert a date or datetime into an ISO 8601 string
+
+        :param value: date or datetime
+        :return: ISO 8601 string
+        """
+        return value.isoformat()
+
+
+serializer = Serializer()
+
+
+def row2dict(row, fields=None):
     """
     Converts a row of SQLAlchemy into a dictionary
 
     :see: http://stackoverflow.com/questions/1958219/convert-sqlalchemy-row-object-to-python-dict
     :param row: SQLAlchemy row
+    :param fields: names of the fields to include, tuple or frozenset, all fields if None
     :return: dictionary
     """
-    if row is None:
-        return None
-    d = {}
-    if hasattr(row, '__table__'):
-        for column in row.__mapper__.columns:
-            check_if_date(column.name, d, row)
-        if hasattr(row, 'other_parseable_fields'):
-            for field in row.other_parseable_fields:
-                result = is_primitive(getattr(row, field))
-                if isinstance(getattr(row, field), object) and not is_primitive(getattr(row, field)):
-                    d[field] = row2dict(getattr(row, field))
-                else:
-                    check_if_date(field, d, row)
-        return d
-    else:
-        for column in get_user_attrs(row):
-            check_if_date(column, d, row)
-        return d
+    return serializer.serialize(row, fields)
 
 
 def get_user_attrs(object):
@@ -238,5 +847,174 @@ def is_primitive(thing):
     :param thing: object to check if its type is primitive
     :return: True if it is primitive, else False
     """
-    primitive = (int, str, bool, float, unicode)
-    return type(thing) in primitive
\ No newline at end of file
+    return type(thing) in PRIMITIVE_TYPES
+
+
+class PoolMonitor(object):
+    """
+    Counts the use of the connection pools of a server process: checkouts and the time waited for
+    them, saturation, that is checkouts that had to wait or failed, and connection churn, that is
+    connections opened and invalidated. Slow checkouts, saturation and invalidations are logged
+    """
+
+    def __init__(self, logger, slow_checkout=0.1):
+        """
+        Constructor for pool monitor
+
+        :param logger: logger of the reports
+        :param slow_checkout: seconds a checkout can take before it is considered a wait for a busy pool
+        """
+        self.logger = logger
+        self.slow_checkout = slow_checkout
+        self.pools = {}
+        self.lock = Lock()
+
+    def watch(self, pool, name, pre_ping=False):
+        """
+        Starts counting the use of a pool, pools already watched are ignored
+
+        :param pool: connection pool
+        :param name: name of the pool in the reports, like the url of the database without password
+        :param pre_ping: True to check the connections are alive before they are used
+        """
+        with self.lock:
+            if id(pool) in self.pools:
+                return
+            counters = dict(name=name, checkouts=0, checkins=0, checked_out=0, peak_checked_out=0, waits=0,
+                            wait_seconds=0.0, max_wait_seconds=0.0, failed_checkouts=0, connects=0,
+                            invalidations=0)
+            self.pools[id(pool)] = (pool, counters)
+        for method in ('connect', 'unique_connection'):  # engines check out their connections through them
+            setattr(pool, method, self.timed_checkout(pool, counters, getattr(pool, method)))
+        if pre_ping:
+            event.listen(pool, 'checkout', ping_connection)
+        event.listen(pool, 'connect', lambda dbapi_connection, record: self.count(counters, connects=1))
+        event.listen(pool, 'checkout', lambda dbapi_connection, record, proxy: self.count(counters, checkouts=1,
+                                                                                            checked_out=1))
+        event.listen(pool, 'checkin', lambda dbapi_connection, record: self.count(counters, checkins=1,
+                                                                                   checked_out=-1))
+        event.listen(pool, 'invalidate', lambda dbapi_connection, record, exception: self.invalidated(
+            counters, exception))
+
+    def timed_checkout(self, pool, counters, checkout):
+        """
+        Returns a checkout method of a pool that records how long it takes
+
+        :param pool: connection pool
+        :param counters: counters of the pool
+        :param checkout: method of the pool that checks out a connection
+        :return: function that checks out a connection
+        """
+        def call():
+            start = default_timer()
+            try:
+                connection = checkout()
+            except exc.TimeoutError:
+                self.count(counters, failed_checkouts=1)
+                self.logger.warning('Pool %s saturated, checkout timed out after %.3f s: %s',
+                                    counters['name'], default_timer() - start, pool.status())
+                raise
+            self.record_checkout(pool, counters, default_timer() - start)
+            return connection
+        return call
+
+    def count(self, counters, **increments):
+        """
+        Adds some increments to the counters of a pool
+
+        :param counters: counters of the pool
+        :param increments: increment of every counter, by name
+        """
+        with self.lock:
+            for key, increment in increments.items():
+                counters[key] += increment
+            counters['peak_checked_out'] = max(counters['peak_checked_out'], counters['checked_out'])
+
+    def record_checkout(self, pool, counters, seconds):
+        """
+        Records the time a checkout has taken, logging it if it has had to wait
+
+        :param pool: pool of the checkout
+        :param counters: counters of the pool
+        :param seconds: duration of the checkout
+        """
+        with self.lock:
+            counters['wait_seconds'] += seconds
+            counters['max_wait_seconds'] = max(counters['max_wait_seconds'], seconds)
+            if seconds >= self.slow_checkout:
+                counters['waits'] += 1
+        if seconds >= self.slow_checkout:
+            self.logger.warning('Pool %s saturated, checkout waited %.3f s: %s', counters['name'], seconds,
+                                pool.status())
+
+    def invalidated(self, counters, exception):
+        """
+        Records and logs the invalidation of a connection
+
+        :param counters: counters of the pool
+        :param exception: exception that caused the invalidation, if any
+        """
+        self.count(counters, invalidations=1)
+        self.logger.info('Pool %s invalidated a connection: %s', counters['name'], exception)
+
+    def stats(self):
+        """
+        Returns the counters of all the pools watched, along with their current state
+
+        :return: dict with the process id and the list of pools
+        """
+        pools = []
+        with self.lock:
+            for pool, counters in self.pools.values():
+                stats = dict(counters)
+                stats['pool'] = type(pool).__name__
+                stats['status'] = pool.status()
+                for key in ('size', 'checkedin', 'overflow'):
+                    if hasattr(pool, key):
+                        stats[key] = getattr(pool, key)()
+                pools.append(stats)
+        return {'pid': os.getpid(), 'pools': sorted(pools, key=lambda stats: stats['name'])}
+
+
+def ping_connection(dbapi_connection, connection_record, connection_proxy):
+    """
+    Listener of the checkouts of a pool that checks the connection is alive before it is used,
+    so connections dropped by the database are replaced instead of failing a request
+
+    :see: http://docs.sqlalchemy.org/en/rel_0_9/core/pooling.html#disconnect-handling-pessimistic
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    except Exception:
+        raise exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+
+class MonitoredSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy extension whose engines have their pool watched and check their connections
+    before use if SQLALCHEMY_POOL_PRE_PING is True. Settings of queue pools are not given to sqlite
+    """
+
+    def __init__(self, app, pool_monitor):
+        """
+        Constructor for monitored SQLAlchemy
+
+        :param app: flask application
+        :param pool_monitor: monitor of the pools of the engines
+        """
+        self.pool_monitor = pool_monitor
+        super(MonitoredSQLAlchemy, self).__init__(app)
+
+    def apply_driver_hacks(self, app, info, options):
+        if info.drivername == 'sqlite':
+            for key in QUEUE_POOL_OPTIONS:  # sqlite files are not pooled, and memory ones by thread
+                options.pop(key, None)
+        super(MonitoredSQLAlchemy, self).apply_driver_hacks(app, info, options)
+
+    def get_engine(self, app, bind=None):
+        engine = super(MonitoredSQLAlchemy, self).get_engine(app, bind)
+        self.pool_monitor.watch(engine.pool, repr(engine.url), app.config.get('SQLALCHEMY_POOL_PRE_PING'))
+        return engine
@@ -27,23 +27,32 @@ This file includes all the URI implementation and calls
 
 :author: Herminio García
 """
-from itertools import groupby
+from itertools import groupby, chain, ifilter
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+import os
+import time
+import mimetypes
 import urllib2
 from flask_restful import Resource, abort, Api
 from flask.wrappers import Response
-from flask.helpers import url_for
-from flask import json, render_template
-from app import app, cache, sql_database_storage
-from app.utils import JSONConverter, XMLConverter, CSVConverter, DictionaryList2ObjectList
+from flask.helpers import url_for, safe_join
+from flask import json, render_template, stream_with_context
+from app import app, cache, sql_database_storage, pool_monitor
+from app.models import period_of
+from app.utils import JSONConverter, XMLConverter, CSVConverter, ColumnarConverter, DictionaryList2ObjectList, \
+    ViewModel, DateEncoder, serializer, available_encodings, compress_stream, compress, STATIC_VARIANT_SUFFIXES
 from model.models import Country, Indicator, User, Organization, Observation, Region, DataSource, Dataset, Value, \
-    Topic, Instant, Interval, RegionTranslation, IndicatorTranslation, TopicTranslation, YearInterval, Time, \
+    Topic, Instant, RegionTranslation, IndicatorTranslation, TopicTranslation, YearInterval, Time, \
     MeasurementUnit, Auth, MonthInterval
 from app.services import CountryService, IndicatorService, UserService, OrganizationService, ObservationService, \
     RegionService, DataSourceService, DatasetService, ValueService, TopicService, IndicatorRelationshipService, \
-    RegionTranslationService, IndicatorTranslationService, TopicTranslationService, MeasurementUnitService, AuthService
-from flask import request, redirect
+    RegionTranslationService, IndicatorTranslationService, TopicTranslationService, MeasurementUnitService, AuthService, \
+    DimensionRegistry, TransactionManager
+from flask import request, redirect, after_this_request
 from datetime import datetime
 from functools import wraps
+from operator import attrgetter
+from threading import Lock
 
 
 api = Api(app)
@@ -63,10 +72,28 @@ indicator_translation_service = IndicatorTranslationService()
 topic_translation_service = TopicTranslationService()
 auth_service = AuthService()
 measurement_unit_service = MeasurementUnitService()
+dimension_registry = DimensionRegistry(app.config['DIMENSION_REGISTRY_TIMEOUT'])
 json_converter = JSONConverter()
 xml_converter = XMLConverter()
 csv_converter = CSVConverter()
 list_converter = DictionaryList2ObjectList()
+serializer.set_date_encoder(DateEncoder(app.config['DATES_UTC_OFFSET'], app.config['DATES_AS_ISO']))
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/xml', 'text/csv', 'application/octet-stream',
+                          'application/javascript', 'application/x-ndjson', 'application/vnd.apache.arrow.stream')
+COMPRESSIBLE_STATIC_EXTENSIONS = ('.js', '.css')
+PRIMARY_READS_COOKIE = 'primary_reads_until'  # time until the client reads from the primary database
+static_variants = {}  # compressed static files, by path and encoding
+static_variants_lock = Lock()  # guards static_variants, so every file is compressed once per process
+columnar_converters = {
+    'observation': ColumnarConverter([
+        ('id', 'string', attrgetter('id')),
+        ('indicator_id', 'string', attrgetter('indicator_id')),
+        ('region_id', 'int64', attrgetter('region_id')),
+        ('dataset_id', 'string', attrgetter('dataset_id')),
+        ('ref_time', 'string', lambda observation: time_label(observation.ref_time)),
+        ('value', 'float64', lambda observation: numeric_value(observation.value))
+    ])
+}
 
 
 def localhost_decorator(f):
@@ -82,6 +109,43 @@ def localhost_decorator(f):
     return call
 
 
+def write_transaction(f):
+    """
+    Decorator that runs a view that writes in a single transaction, committed when the view
+    returns and rolled back if it fails
+    """
+    def call(*args, **kwargs):
+        with TransactionManager().unit_of_work():
+            result = f(*args, **kwargs)
+        if app.config['READ_YOUR_WRITES_SECONDS'] > 0:
+            after_this_request(read_from_primary_after_write)
+        return result
+    return call
+
+
+def read_from_primary_after_write(response):
+    """
+    Sets the cookie that binds the reads of the client to the primary database for
+    READ_YOUR_WRITES_SECONDS, so it reads its own writes even if the replicas lag behind
+
+    :param response: response of a request that has written
+    :return: same response
+    """
+    seconds = app.config['READ_YOUR_WRITES_SECONDS']
+    response.set_cookie(PRIMARY_READS_COOKIE, str(int(time.time()) + seconds), max_age=seconds)
+    return response
+
+
+@app.before_request
+def route_reads():
+    """
+    Binds the reads of the request to the primary database if the client has written recently
+    """
+    until = request.cookies.get(PRIMARY_READS_COOKIE)
+    if until is not None and until.isdigit() and int(until) > time.time():
+        TransactionManager().read_from_primary()
+
+
 def check_auth(username, password):
     """
     This function is called to check if a username /
@@ -125,23 +189,168 @@ def make_cache_key(*args, **kwargs):
     return request.url+str(request.headers.get('Accept'))
 
 
+def cached_response(f):
+    """
+    Decorator that caches the response of a view, identified by make_cache_key
+    Streamed responses are cached once they have been completely sent, only if
+    their body is not bigger than RESPONSE_CACHE_MAX_SIZE, so they are never
+    materialized before the first chunk reaches the client
+    Responses are compressed with the encoding negotiated with the client, the
+    compressed variant is cached next to the raw one, so it is compressed only once
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        cache_key = make_cache_key()
+        encoding = negotiate_encoding()
+        if encoding is not None:
+            response = cache.get(cache_key + ':' + encoding)
+            if response is not None:
+                return response
+        response = cache.get(cache_key)
+        if response is None:
+            response = f(*args, **kwargs)
+            if isinstance(response, Response) and response.is_streamed:
+                response.response = cache_when_sent(response.response, response, cache_key)
+            else:
+                cache.set(cache_key, response)
+        if is_compressible(response):
+            response.vary.add('Accept-Encoding')
+            if encoding is not None:
+                response = compress_response(response, encoding, cache_key + ':' + encoding)
+        return response
+    return decorated
+
+
+def negotiate_encoding():
+    """
+    Returns the content encoding to use in the response, given the Accept-Encoding header
+
+    :return: br or gzip, None if the response must not be compressed
+    """
+    return request.accept_encodings.best_match(available_encodings())
+
+
+def is_compressible(response):
+    """
+    Returns if a response is worth compressing, its mimetype is one of COMPRESSIBLE_MIMETYPES
+
+    :param response: response returned by a view
+    :return: True if it can be compressed, False otherwise
+    """
+    return isinstance(response, Response) and response.mimetype in COMPRESSIBLE_MIMETYPES \
+        and 'Content-Encoding' not in response.headers
+
+
+def compress_response(response, encoding, cache_key):
+    """
+    Returns a compressed copy of a response, compressed while it is sent and cached once it has been sent
+
+    :param response: raw response
+    :param encoding: content encoding, br or gzip
+    :param cache_key: key to store the compressed response in the cache
+    :return: streamed compressed response
+    """
+    compressed = Response(status=response.status, headers=response.headers.items())
+    del compressed.headers['Content-Length']
+    compressed.headers['Content-Encoding'] = encoding
+    compressed.response = cache_when_sent(compress_stream(response.response, encoding), compressed, cache_key)
+    return compressed
+
+
+def send_static_file(filename):
+    """
+    Sends a static file, scripts and style sheets are sent compressed if the client accepts it
+
+    :param filename: path of the file inside the static folder
+    :return: response with the file
+    """
+    encoding = negotiate_encoding()
+    if encoding is None or os.path.splitext(filename)[1] not in COMPRESSIBLE_STATIC_EXTENSIONS:
+        return app.send_static_file(filename)
+    path = safe_join(app.static_folder, filename)
+    if not os.path.isfile(path):
+        abort(404)
+    modified, data = static_variant(path, encoding)
+    response = Response(data, mimetype=mimetypes.guess_type(filename)[0])
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = app.get_send_file_max_age(filename)
+    response.last_modified = modified
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+app.view_functions['static'] = send_static_file
+
+
+def static_variant(path, encoding):
+    """
+    Returns the compressed variant of a static file, kept in *static_variants* until the file is modified.
+    It is read from the file written by compress_static.py if it is up to date, else the file is compressed
+    with the level of the responses, as the best one takes seconds with br
+
+    :param path: path of the static file
+    :param encoding: content encoding, br or gzip
+    :return: tuple (modification time of the static file, compressed contents)
+    """
+    modified = os.path.getmtime(path)
+    with static_variants_lock:
+        variant = static_variants.get((path, encoding))
+        if variant is None or variant[0] != modified:
+            built_path = path + STATIC_VARIANT_SUFFIXES[encoding]
+            if os.path.isfile(built_path) and os.path.getmtime(built_path) >= modified:
+                with open(built_path, 'rb') as built_file:
+                    data = built_file.read()
+            else:
+                with open(path, 'rb') as static_file:
+                    data = compress(static_file.read(), encoding)
+            variant = static_variants[(path, encoding)] = (modified, data)
+    return variant
+
+
+def cache_when_sent(body, response, cache_key):
+    """
+    Yields the body of a streamed response and caches it once it has been sent
+
+    :param body: iterable with the original body of the response
+    :param response: streamed response
+    :param cache_key: key to store the response in the cache
+    :return: generator of the body chunks
+    """
+    max_size = app.config['RESPONSE_CACHE_MAX_SIZE']
+    chunks = []
+    size = 0
+    for chunk in body:
+        if chunks is not None:
+            size += len(chunk)
+            if size <= max_size:
+                chunks.append(chunk)
+            else:
+                chunks = None  # too big to be cached, stop keeping it in memory
+        yield chunk
+    if chunks is not None:
+        cache.set(cache_key, Response(''.join(chunks), status=response.status, headers=response.headers))
+
+
 class CountryListAPI(Resource):
     """
     Countries collection URI
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all countries
         Response 200 OK
         """
-        countries = country_service.get_all()
-        translate_region_list(countries)
+        countries = country_service.get_all(get_requested_fields(request))
+        countries = translate_region_list(countries)
         return response_xml_or_json_list(request, countries, 'countries', 'country')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new country
@@ -158,6 +367,7 @@ class CountryListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all countries given
@@ -166,9 +376,11 @@ class CountryListAPI(Resource):
         country_list = json.loads(request.data)
         country_list = list_converter.convert(country_list)
         country_service.update_all(country_list)
+        dimension_registry.invalidate_after_commit()  # bulk writes are not seen by its flush listener
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all countries
@@ -177,6 +389,7 @@ class CountryListAPI(Resource):
         :attention: Take care of what you do, all countries will be destroyed
         """
         country_service.delete_all()
+        dimension_registry.invalidate_after_commit()  # bulk writes are not seen by its flush listener
         return {}, 204
 
 
@@ -186,7 +399,7 @@ class CountryAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, code):
         """
         Show country
@@ -195,16 +408,13 @@ class CountryAPI(Resource):
         country = country_service.get_by_code(code)
         if country is None:
             abort(404)
-        translate_region(country)
-        country.region = region_service.get_by_artificial_code(country.is_part_of_id)
-        if not hasattr(country, 'other_parseable_fields'):
-            country.other_parseable_fields = []
-        country.other_parseable_fields.append('region')
-        if country.region is not None:
-            translate_region(country.region)
+        country = translate_region(country)
+        region = region_service.get_by_artificial_code(country.is_part_of_id)
+        country.region = translate_region(region) if region is not None else None
         return response_xml_or_json_item(request, country, 'country')
 
     @localhost_decorator
+    @write_transaction
     def put(self, code):
         """
         If exists update country
@@ -223,6 +433,7 @@ class CountryAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, code):
         """
         Delete country
@@ -238,17 +449,18 @@ class IndicatorListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all indicators
         Response 200 OK
         """
-        indicators = indicator_service.get_all()
-        translate_indicator_list(indicators)
+        indicators = indicator_service.get_all(get_requested_fields(request))
+        indicators = translate_indicator_list(indicators)
         return response_xml_or_json_list(request, indicators, 'indicators', 'indicator')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new indicator
@@ -263,13 +475,14 @@ class IndicatorListAPI(Resource):
         indicator.topic_id = request.json.get("topic_id")
         indicator.preferable_tendency = request.json.get("preferable_tendency")
         if request.json.get("last_update") is not None:
-            indicator.last_update = datetime.fromtimestamp(long(request.json.get("last_update")))
+            indicator.last_update = serializer.date_encoder.decode(long(request.json.get("last_update")))
         if indicator.id is not None:
             indicator_service.insert(indicator)
             return {'URI': url_for('indicators', id=indicator.id)}, 201  # returns the URI for the new indicator
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all indicators given
@@ -278,9 +491,11 @@ class IndicatorListAPI(Resource):
         indicator_list = json.loads(request.data)
         indicator_list = list_converter.convert(indicator_list)
         indicator_service.update_all(indicator_list)
+        dimension_registry.invalidate_after_commit()  # bulk writes are not seen by its flush listener
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all indicators
@@ -289,6 +504,7 @@ class IndicatorListAPI(Resource):
         :attention: Take care of what you do, all indicators will be destroyed
         """
         indicator_service.delete_all()
+        dimension_registry.invalidate_after_commit()  # bulk writes are not seen by its flush listener
         return {}, 204
 
 
@@ -298,7 +514,7 @@ class IndicatorAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show indicator
@@ -307,10 +523,11 @@ class IndicatorAPI(Resource):
         indicator = indicator_service.get_by_code(id)
         if indicator is None:
             abort(404)
-        translate_indicator(indicator)
+        indicator = translate_indicator(indicator)
         return response_xml_or_json_item(request, indicator, 'indicator')
 
     @localhost_decorator
+    @write_transaction
     def put(self, id):
         """
         If exists update indicator
@@ -331,6 +548,7 @@ class IndicatorAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, id):
         """
         Delete indicators
@@ -346,7 +564,7 @@ class IndicatorTopAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show top 10 countries with the highest value for a given indicator
@@ -368,7 +586,7 @@ class IndicatorAverageAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show the average value for a indicator of all countries
@@ -386,18 +604,20 @@ class IndicatorCompatibleAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show the compatible indicators of the given indicator
         Response 200 OK
         """
-        indicator = indicator_service.get_by_code(id)
-        indicators = indicator_service.get_all()
+        indicator = dimension_registry.get(DimensionRegistry.INDICATOR, id)
+        if indicator is None:
+            abort(404)
+        indicators = dimension_registry.get_all(DimensionRegistry.INDICATOR)
         compatibles = [ind for ind in indicators
                        if indicator.measurement_unit_id == ind.measurement_unit_id
                         and ind is not indicator]
-        translate_indicator_list(compatibles)
+        compatibles = translate_indicator_list(compatibles)
         return response_xml_or_json_list(request, compatibles, 'indicators', 'indicator')
 
 
@@ -407,14 +627,14 @@ class IndicatorStarredAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List starred indicators
         Response 200 OK
         """
-        indicators = indicator_service.get_starred_indicators()
-        translate_indicator_list(indicators)
+        indicators = indicator_service.get_starred_indicators(get_requested_fields(request))
+        indicators = translate_indicator_list(indicators)
         return response_xml_or_json_list(request, indicators, 'indicators', 'indicator')
 
 
@@ -424,7 +644,7 @@ class UserListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all users
@@ -433,6 +653,7 @@ class UserListAPI(Resource):
         return response_xml_or_json_list(request, user_service.get_all(), 'users', 'user')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new user
@@ -448,6 +669,7 @@ class UserListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all users given
@@ -459,6 +681,7 @@ class UserListAPI(Resource):
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all users
@@ -476,7 +699,7 @@ class UserAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show user
@@ -488,6 +711,7 @@ class UserAPI(Resource):
         return response_xml_or_json_item(request, user, 'user')
 
     @localhost_decorator
+    @write_transaction
     def put(self, id):
         """
         If exists update user
@@ -507,6 +731,7 @@ class UserAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, id):
         """
         Delete user
@@ -522,7 +747,7 @@ class OrganizationListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all organizations
@@ -531,6 +756,7 @@ class OrganizationListAPI(Resource):
         return response_xml_or_json_list(request, organization_service.get_all(), 'organizations', 'organization')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new organization
@@ -547,6 +773,7 @@ class OrganizationListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all organizations given
@@ -558,6 +785,7 @@ class OrganizationListAPI(Resource):
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all organizations
@@ -575,7 +803,7 @@ class OrganizationAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show organization
@@ -587,6 +815,7 @@ class OrganizationAPI(Resource):
         return response_xml_or_json_item(request, organization, 'organization')
 
     @localhost_decorator
+    @write_transaction
     def put(self, id):
         """
         If exists update organization
@@ -606,6 +835,7 @@ class OrganizationAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, id):
         """
         Delete organization
@@ -621,7 +851,7 @@ class OrganizationUserListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, organization_id):
         """
         List all users of a given organization
@@ -636,7 +866,7 @@ class OrganizationUserAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, organization_id, user_id):
         """
         Show a user by its organization id and its user id
@@ -658,14 +888,14 @@ class CountriesIndicatorListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, iso3):
         """
         List all indicators of a given country
         Response 200 OK
         """
-        indicators = indicator_service.get_indicators_by_country(iso3)
-        translate_indicator_list(indicators)
+        indicators = indicator_service.get_indicators_by_country(iso3, get_requested_fields(request))
+        indicators = translate_indicator_list(indicators)
         return response_xml_or_json_list(request, indicators, 'indicators', 'indicator')
 
 
@@ -675,7 +905,7 @@ class CountriesIndicatorAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, iso3, indicator_id):
         """
         Show a indicators by its country id and its indicator id
@@ -685,7 +915,7 @@ class CountriesIndicatorAPI(Resource):
         indicator = indicator_service.get_indicator_by_country(iso3, indicator_id)
         if indicator is None:
             abort(404)
-        translate_indicator(indicator)
+        indicator = translate_indicator(indicator)
         return response_xml_or_json_item(request, indicator, 'indicator')
 
 
@@ -695,15 +925,17 @@ class ObservationListAPI(Resource):
     """
 
     @localhost_decorator
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all observations
         Response 200 OK
         """
-        return response_xml_or_json_list(request, observation_service.get_all(), 'observations', 'observation')
+        return response_xml_or_json_list(request, observation_service.iterate_all(get_requested_fields(request)),
+                                         'observations', 'observation')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new observation
@@ -726,6 +958,7 @@ class ObservationListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all observations given
@@ -737,6 +970,7 @@ class ObservationListAPI(Resource):
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all observations
@@ -754,33 +988,23 @@ class ObservationAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show observations
         Response 200 OK
         """
-        limit, offset = get_limit_and_offset()
-        if country_service.get_by_code(id) is not None:
-            country = country_service.get_by_code(id)
-            observations = slice_by_limit_and_offset(country.observations, limit, offset)
-            return response_xml_or_json_list(request, observations, 'observations', 'observation')
-        elif indicator_service.get_by_code(id) is not None:
-            observations = []
-            indicator = indicator_service.get_by_code(id)
-            for dataset in indicator.datasets:
-                observations.extend(dataset.observations)
-            observations = [observation for observation in observations if observation.indicator_id == indicator.id]
-            observations = slice_by_limit_and_offset(observations, limit, offset)
-            return response_xml_or_json_list(request, observations, 'observations', 'observation')
-        elif region_service.get_by_code(id) is not None:
-            region = region_service.get_by_code(id)
-            observations = []
-            for country in country_service.get_all():
-                if country.is_part_of_id is region.id:
-                    observations.extend(country.observations)
-            observations = slice_by_limit_and_offset(observations, limit, offset)
-            return response_xml_or_json_list(request, observations, 'observations', 'observation')
+        limit, offset, after = get_pagination()
+        kind, entity_id = dimension_registry.resolve(id)
+        if kind == DimensionRegistry.COUNTRY:
+            observations = observation_service.get_by_country(id, limit, offset, after)
+            return paginated_response(request, observations, limit, offset)
+        elif kind == DimensionRegistry.INDICATOR:
+            observations = observation_service.get_page_by_indicator(entity_id, limit, offset, after)
+            return paginated_response(request, observations, limit, offset)
+        elif kind == DimensionRegistry.REGION:
+            observations = observation_service.get_by_region(entity_id, limit, offset, after)
+            return paginated_response(request, observations, limit, offset)
         else:
             response = observation_service.get_by_code(id)
             if response is None:
@@ -788,6 +1012,7 @@ class ObservationAPI(Resource):
             return response_xml_or_json_item(request, response, 'observation')
 
     @localhost_decorator
+    @write_transaction
     def put(self, id):
         """
         If exists update observation
@@ -811,6 +1036,7 @@ class ObservationAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, id):
         """
         Delete observation
@@ -826,17 +1052,18 @@ class RegionListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all region
         Response 200 OK
         """
         regions = region_service.get_all_regions()
-        translate_region_list(regions)
+        regions = translate_region_list(regions)
         return response_xml_or_json_list(request, regions, 'regions', 'region')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new region
@@ -855,6 +1082,7 @@ class RegionListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all regions given
@@ -863,9 +1091,11 @@ class RegionListAPI(Resource):
         region_list = json.loads(request.data)
         region_list = list_converter.convert(region_list)
         region_service.update_all(region_list)
+        dimension_registry.invalidate_after_commit()  # bulk writes are not seen by its flush listener
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all regions
@@ -874,6 +1104,7 @@ class RegionListAPI(Resource):
         :attention: Take care of what you do, all regions will be destroyed
         """
         region_service.delete_all()
+        dimension_registry.invalidate_after_commit()  # bulk writes are not seen by its flush listener
         return {}, 204
 
 
@@ -883,7 +1114,7 @@ class RegionAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show region
@@ -892,10 +1123,11 @@ class RegionAPI(Resource):
         region = region_service.get_by_code(id)
         if region is None:
             abort(404)
-        translate_region(region)
+        region = translate_region(region)
         return response_xml_or_json_item(request, region, 'region')
 
     @localhost_decorator
+    @write_transaction
     def put(self, id):
         """
         If exists update region
@@ -912,6 +1144,7 @@ class RegionAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, id):
         """
         Delete region
@@ -927,14 +1160,14 @@ class RegionsCountryListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         List all countries of a given region
         Response 200 OK
         """
         countries = country_service.get_countries_by_regions(id)
-        translate_region_list(countries)
+        countries = translate_region_list(countries)
         return response_xml_or_json_list(request, countries, 'countries', 'country')
 
 
@@ -944,7 +1177,7 @@ class RegionsRegionListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         List all regions of a given region
@@ -960,7 +1193,7 @@ class RegionsCountryAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id, iso3):
         """
         Show country by its region id and its country id
@@ -969,7 +1202,7 @@ class RegionsCountryAPI(Resource):
         country = country_service.get_country_by_region(id, iso3)
         if country is None:
             abort(404)
-        translate_region(country)
+        country = translate_region(country)
         return response_xml_or_json_item(request, country, 'country')
 
 
@@ -979,7 +1212,7 @@ class DataSourceListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all datasources
@@ -988,6 +1221,7 @@ class DataSourceListAPI(Resource):
         return response_xml_or_json_list(request, datasource_service.get_all(), 'datasources', 'datasource')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new datasource
@@ -1004,6 +1238,7 @@ class DataSourceListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all datasources given
@@ -1015,6 +1250,7 @@ class DataSourceListAPI(Resource):
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all datasources
@@ -1032,7 +1268,7 @@ class DataSourceAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show datasource
@@ -1044,6 +1280,7 @@ class DataSourceAPI(Resource):
         return response_xml_or_json_item(request, datasource, 'datasource')
 
     @localhost_decorator
+    @write_transaction
     def put(self, id):
         """
         If exists update datasource
@@ -1062,6 +1299,7 @@ class DataSourceAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, id):
         """
         Delete datasource
@@ -1077,7 +1315,7 @@ class DatasetListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all datasets
@@ -1086,6 +1324,7 @@ class DatasetListAPI(Resource):
         return response_xml_or_json_list(request, dataset_service.get_all(), 'datasets', 'dataset')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new dataset
@@ -1104,6 +1343,7 @@ class DatasetListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all datasets given
@@ -1115,6 +1355,7 @@ class DatasetListAPI(Resource):
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all datasets
@@ -1132,7 +1373,7 @@ class DatasetAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show dataset
@@ -1144,6 +1385,7 @@ class DatasetAPI(Resource):
         return response_xml_or_json_item(request, dataset, 'dataset')
 
     @localhost_decorator
+    @write_transaction
     def put(self, id):
         """
         If exists update dataset
@@ -1161,6 +1403,7 @@ class DatasetAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, id):
         """
         Delete dataset
@@ -1176,14 +1419,14 @@ class DataSourceIndicatorListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         List all indicators of a given datasource
         Response 200 OK
         """
-        indicators = indicator_service.get_indicators_by_datasource(id)
-        translate_indicator_list(indicators)
+        indicators = indicator_service.get_indicators_by_datasource(id, get_requested_fields(request))
+        indicators = translate_indicator_list(indicators)
         return response_xml_or_json_list(request, indicators, 'indicators', 'indicator')
 
 
@@ -1193,7 +1436,7 @@ class DataSourceIndicatorAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id, indicator_id):
         """
         Show indicator by its datasource id and indicator id
@@ -1207,7 +1450,7 @@ class DataSourceIndicatorAPI(Resource):
                     indicator = ind
         if indicator is None:
             abort(404)
-        translate_indicator(indicator)
+        indicator = translate_indicator(indicator)
         return response_xml_or_json_item(request, indicator, 'indicator')
 
 
@@ -1217,7 +1460,7 @@ class ObservationByTwoAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id_first_filter, id_second_filter):
         """
         Show observations filtering by two ids.
@@ -1231,9 +1474,10 @@ class ObservationByTwoAPI(Resource):
         Response 200 OK
         """
 
-        observations = get_observations_by_two_filters(id_first_filter, id_second_filter)
+        limit, offset, after = get_pagination()
+        observations = get_observations_by_two_filters(id_first_filter, id_second_filter, limit, offset, after)
         if observations is not None:
-            return response_xml_or_json_list(request, observations, 'observations', 'observation')
+            return paginated_response(request, observations, limit, offset)
         abort(400)
 
 
@@ -1243,7 +1487,7 @@ class ObservationByCountryStarred(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, iso3):
         """
         Show observations filtering by country and showed if the indicator is starred.
@@ -1252,20 +1496,19 @@ class ObservationByCountryStarred(Resource):
         :param iso3: iso3 of the country to filter
         """
         country = country_service.get_by_code(iso3)
-        translate_region(country)
         if country is None:
             abort(404)
-        limit, offset = get_limit_and_offset()
-        observations = observation_service.get_starred_observations_by_country(iso3, limit, offset)
-        for observation in observations:
-            observation.country = country
-            indicator = indicator_service.get_by_code(observation.indicator.id)
-            translate_indicator(indicator)
-            observation.indicator = indicator
-            observation.measurement_unit = indicator.measurement_unit
-            observation.other_parseable_fields = ['country', 'indicator', 'ref_time', 'value', 'measurement_unit']
+        country = translate_region(country)
+        limit, offset, after = get_pagination()
+        observations = []
+        indicators = {}
+        for observation in observation_service.get_starred_observations_by_country(iso3, limit, offset, 'detail',
+                                                                                   after):
+            if observation.indicator_id not in indicators:
+                indicators[observation.indicator_id] = translate_indicator(observation.indicator)
+            observations.append(observation_view(observation, country, indicators[observation.indicator_id]))
         if observations is not None:
-            return response_xml_or_json_list(request, observations, 'observations', 'observation')
+            return paginated_response(request, observations, limit, offset)
         abort(400)
 
 
@@ -1275,7 +1518,7 @@ class ObservationByTwoAverageAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id_first_filter, id_second_filter):
         """
         Show observations average filtering by two ids.
@@ -1288,30 +1531,34 @@ class ObservationByTwoAverageAPI(Resource):
         :param id_second_filter: second filter
         Response 200 OK
         """
-
-        observations = get_observations_by_two_filters(id_first_filter, id_second_filter)
-        if observations is not None:
-            averages = []
-            all_observations_average = EmptyObject()
-            all_observations_average.time = 'all'
-            all_observations_average.average = observations_average(observations)
-            averages.append(all_observations_average)
-            observations_times = [observation.ref_time.value for observation in observations]
-            observations_times = list(set(observations_times))
-            observations_times.sort()
-            for observation_time in observations_times:
-                grouped_observations = filter(lambda obs: obs.ref_time.value == observation_time, observations)
-                grouped_observations = [observation for observation in grouped_observations if observation.value.value is not None]
-                if len(grouped_observations) > 0:
-                    average_time = EmptyObject()
-                    average_time.time = observation_time
-                    average_time.average = reduce(lambda x, y: x + float(y.value.value), grouped_observations, 0) / len(grouped_observations)
-                    averages.append(average_time)
-            return response_xml_or_json_list(request, averages, 'averages', 'average')
-        abort(400)
+        if dimension_registry.get_id(DimensionRegistry.COUNTRY, id_first_filter) is not None \
+                and dimension_registry.get_id(DimensionRegistry.INDICATOR, id_second_filter) is not None:
+            average, periods = observation_service.get_averages_by_country_and_indicator(id_second_filter,
+                                                                                         id_first_filter)
+        elif dimension_registry.get_id(DimensionRegistry.INDICATOR, id_first_filter) is not None \
+                and dimension_registry.get_id(DimensionRegistry.COUNTRY, id_second_filter) is not None:
+            average, periods = observation_service.get_averages_by_country_and_indicator(id_first_filter,
+                                                                                         id_second_filter)
+        elif dimension_registry.get_id(DimensionRegistry.REGION, id_first_filter) is not None \
+                and dimension_registry.get_id(DimensionRegistry.INDICATOR, id_second_filter) is not None:
+            region_id = dimension_registry.get_id(DimensionRegistry.REGION, id_first_filter)
+            average, periods = observation_service.get_averages_by_region_and_indicator(region_id, id_second_filter)
+        else:
+            abort(400)
+        averages = []
+        all_observations_average = EmptyObject()
+        all_observations_average.time = 'all'
+        all_observations_average.average = average
+        averages.append(all_observations_average)
+        for period, period_average, count in periods:
+            average_time = EmptyObject()
+            average_time.time = period
+            average_time.average = period_average
+            averages.append(average_time)
+        return response_xml_or_json_list(request, averages, 'averages', 'average')
 
 
-def get_observations_by_two_filters(id_first_filter, id_second_filter):
+def get_observations_by_two_filters(id_first_filter, id_second_filter, limit, offset, after=None):
     """
     Return observations filtering by two ids.
     It could be one of three next:
@@ -1321,51 +1568,47 @@ def get_observations_by_two_filters(id_first_filter, id_second_filter):
 
     :param id_first_filter: id of the first filter
     :param id_second_filter: id of the second filter
+    :param limit: number of observations of the page, all observations if None
+    :param offset: number of observations to skip, None to page by observation id
+    :param after: id of the last observation of the previous page, only if offset is None
     :return: Filtered observations
     """
     def append_objects():
         """
-        Appends some neested object to main object, in order to be showed on the output
+        Returns views of the observations with some neested objects, in order to be showed on the output
         """
-        translate_region(country)
-        translate_indicator(indicator)
-        for observation in observations:
-            observation.country = country
-            observation.indicator = indicator
-            observation.ref_time = observation.ref_time
-            observation.measurement_unit = indicator.measurement_unit
-            observation.other_parseable_fields = ['country', 'indicator', 'ref_time', 'value', 'measurement_unit']
+        translated_country = translate_region(country)
+        translated_indicator = translate_indicator(indicator)
+        return [observation_view(observation, translated_country, translated_indicator)
+                for observation in observations]
 
     observations = None
-    limit, offset = get_limit_and_offset()
-    if country_service.get_by_code(id_first_filter) and indicator_service.get_by_code(id_second_filter):
-            country = country_service.get_by_code(id_first_filter)
-            indicator = indicator_service.get_by_code(id_second_filter)
-            observations = [observation for observation in country.observations
-                            if observation.indicator_id == id_second_filter]
-            slice_by_limit_and_offset(observations, limit, offset)
-            append_objects()
-    elif indicator_service.get_by_code(id_first_filter) and country_service.get_by_code(id_second_filter):
+    if dimension_registry.get_id(DimensionRegistry.COUNTRY, id_first_filter) is not None \
+            and dimension_registry.get_id(DimensionRegistry.INDICATOR, id_second_filter) is not None:
+        country = country_service.get_by_code(id_first_filter)
+        indicator = indicator_service.get_by_code(id_second_filter)
+        observations = observation_service.get_by_country_and_indicator(id_second_filter, country.iso3, 'detail',
+                                                                        limit, offset, after)
+        observations = append_objects()
+    elif dimension_registry.get_id(DimensionRegistry.INDICATOR, id_first_filter) is not None \
+            and dimension_registry.get_id(DimensionRegistry.COUNTRY, id_second_filter) is not None:
         country = country_service.get_by_code(id_second_filter)
         indicator = indicator_service.get_by_code(id_first_filter)
-        observations = [observation for observation in country.observations
-                        if observation.indicator_id == id_first_filter]
-        slice_by_limit_and_offset(observations, limit, offset)
-        append_objects()
-    elif region_service.get_by_code(id_first_filter) and indicator_service.get_by_code(id_second_filter):
+        observations = observation_service.get_by_country_and_indicator(id_first_filter, country.iso3, 'detail',
+                                                                        limit, offset, after)
+        observations = append_objects()
+    elif dimension_registry.get_id(DimensionRegistry.REGION, id_first_filter) is not None \
+            and dimension_registry.get_id(DimensionRegistry.INDICATOR, id_second_filter) is not None:
         observations = []
-        region = region_service.get_by_code(id_first_filter)
+        region_id = dimension_registry.get_id(DimensionRegistry.REGION, id_first_filter)
         indicator = indicator_service.get_by_code(id_second_filter)
-        translate_indicator(indicator)
-        for observation in observation_service.get_by_region_and_indicator(region.id, id_second_filter, limit, offset):
-            country = country_service.get_by_id(observation.region_id)
-            observation.country = country
-            translate_region(country)
-            observation.indicator = indicator
-            observation.ref_time = observation.ref_time
-            observation.measurement_unit = indicator.measurement_unit
-            observation.other_parseable_fields = ['country', 'indicator', 'ref_time', 'value', 'measurement_unit']
-            observations.append(observation)
+        indicator = translate_indicator(indicator)
+        countries = {}
+        for observation in observation_service.get_by_region_and_indicator(region_id, id_second_filter, limit, offset,
+                                                                           'detail', after):
+            if observation.region_id not in countries:
+                countries[observation.region_id] = translate_region(observation.region)
+            observations.append(observation_view(observation, countries[observation.region_id], indicator))
     if observations is not None and len(observations) > 0 and observations[0].ref_time is not None and isinstance(observations[0].ref_time, Time):
         observations.sort(key=lambda obs: get_intervals([obs.ref_time])[0])
         for observation in observations:
@@ -1374,23 +1617,35 @@ def get_observations_by_two_filters(id_first_filter, id_second_filter):
                 if observation == observations_country[j]:
                     if j == 0 or observation.value.value is None or observations_country[j-1].value.value:
                         observation.tendency = -2
-                    elif float(observation.value.value) == float(observations_country[j-1].value.value):
+                    elif observation.value.number == observations_country[j-1].value.number:
                         observation.tendency = 0
-                    elif float(observations_country[j-1].value.value) > float(observation.value.value):
+                    elif observations_country[j-1].value.number > observation.value.number:
                         observation.tendency = -1
-                    elif float(observations_country[j-1].value.value) < float(observation.value.value):
+                    elif observations_country[j-1].value.number < observation.value.number:
                         observation.tendency = 1
-                    observation.other_parseable_fields.append('tendency')
     return observations if observations is not None else []
 
 
+def observation_view(observation, country, indicator):
+    """
+    Returns a view of an observation with its country, indicator, time, value and measurement unit
+
+    :param observation: observation to be viewed
+    :param country: country of the observation, usually translated
+    :param indicator: indicator of the observation, usually translated
+    :return: view of the observation
+    """
+    return ViewModel(observation, country=country, indicator=indicator, ref_time=observation.ref_time,
+                     value=observation.value, measurement_unit=indicator.measurement_unit)
+
+
 class ValueListAPI(Resource):
     """
     Value collection URI
     """
 
     @localhost_decorator
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all values
@@ -1399,6 +1654,7 @@ class ValueListAPI(Resource):
         return response_xml_or_json_list(request, value_service.get_all(), 'values', 'value')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new value
@@ -1417,6 +1673,7 @@ class ValueListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all values given
@@ -1428,6 +1685,7 @@ class ValueListAPI(Resource):
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all value
@@ -1445,7 +1703,7 @@ class ValueAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show value
@@ -1457,6 +1715,7 @@ class ValueAPI(Resource):
         return response_xml_or_json_item(request, value, 'value')
 
     @localhost_decorator
+    @write_transaction
     def put(self, id):
         """
         If exists update value
@@ -1475,6 +1734,7 @@ class ValueAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, id):
         """
         Delete value
@@ -1490,17 +1750,18 @@ class TopicListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all topics
         Response 200 OK
         """
         topics = topic_service.get_all()
-        translate_topic_list(topics)
+        topics = translate_topic_list(topics)
         return response_xml_or_json_list(request, topics, 'topics', 'topic')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new topic
@@ -1515,6 +1776,7 @@ class TopicListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all topics given
@@ -1523,9 +1785,11 @@ class TopicListAPI(Resource):
         topic_list = json.loads(request.data)
         topic_list = list_converter.convert(topic_list)
         topic_service.update_all(topic_list)
+        dimension_registry.invalidate_after_commit()  # bulk writes are not seen by its flush listener
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all topics
@@ -1534,6 +1798,7 @@ class TopicListAPI(Resource):
         :attention: Take care of what you do, all topic will be destroyed
         """
         topic_service.delete_all()
+        dimension_registry.invalidate_after_commit()  # bulk writes are not seen by its flush listener
         return {}, 204
 
 
@@ -1543,7 +1808,7 @@ class TopicAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show topic
@@ -1552,10 +1817,11 @@ class TopicAPI(Resource):
         topic = topic_service.get_by_code(id)
         if topic is None:
             abort(404)
-        translate_topic(topic)
+        topic = translate_topic(topic)
         return response_xml_or_json_item(request, topic, 'topic')
 
     @localhost_decorator
+    @write_transaction
     def put(self, id):
         """
         If exists update topic
@@ -1572,6 +1838,7 @@ class TopicAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, id):
         """
         Delete topic
@@ -1587,7 +1854,7 @@ class MeasurementUnitListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all measurement untis
@@ -1597,6 +1864,7 @@ class MeasurementUnitListAPI(Resource):
         return response_xml_or_json_list(request, measurement_units, 'measurement_units', 'measurement_unit')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new measurement_unit
@@ -1612,6 +1880,7 @@ class MeasurementUnitListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all measurement_units given
@@ -1620,9 +1889,11 @@ class MeasurementUnitListAPI(Resource):
         measurement_unit_list = json.loads(request.data)
         measurement_unit_list = list_converter.convert(measurement_unit_list)
         measurement_unit_service.update_all(measurement_unit_list)
+        dimension_registry.invalidate_after_commit()  # bulk writes are not seen by its flush listener
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all measurement_untis
@@ -1631,6 +1902,7 @@ class MeasurementUnitListAPI(Resource):
         :attention: Take care of what you do, all measurement_units will be destroyed
         """
         measurement_unit_service.delete_all()
+        dimension_registry.invalidate_after_commit()  # bulk writes are not seen by its flush listener
         return {}, 204
 
 
@@ -1640,7 +1912,7 @@ class MeasurementUnitAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show measurement unit
@@ -1652,6 +1924,7 @@ class MeasurementUnitAPI(Resource):
         return response_xml_or_json_item(request, measurement_unit, 'measurement_unit')
 
     @localhost_decorator
+    @write_transaction
     def put(self, id):
         """
         If exists update measurement_unit
@@ -1670,6 +1943,7 @@ class MeasurementUnitAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, id):
         """
         Delete measurement_unit
@@ -1685,14 +1959,14 @@ class TopicIndicatorListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, topic_id):
         """
         List all indicators by a given topic
         Response 200 OK
         """
         indicators = topic_service.get_by_code(topic_id).indicators
-        translate_indicator_list(indicators)
+        indicators = translate_indicator_list(indicators)
         return response_xml_or_json_list(request, indicators, 'indicators', 'indicator')
 
 
@@ -1702,7 +1976,7 @@ class TopicIndicatorAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, topic_id, indicator_id):
         """
         Show indicators by its topic id and indicator id
@@ -1714,7 +1988,7 @@ class TopicIndicatorAPI(Resource):
                 selected_indicator = indicator
         if selected_indicator is None:
             abort(404)
-        translate_indicator(selected_indicator)
+        selected_indicator = translate_indicator(selected_indicator)
         return response_xml_or_json_item(request, selected_indicator, 'indicator')
 
 
@@ -1724,14 +1998,14 @@ class RegionCountriesWithDataAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, region_id):
         """
         Show country that have some observations by a given region (country is_part_of region)
         Response 200 OK
         """
         countries = country_service.get_countries_with_data_by_region(region_id)
-        translate_region_list(countries)
+        countries = translate_region_list(countries)
         return response_xml_or_json_list(request, countries, 'countries', 'country')
 
 
@@ -1741,7 +2015,7 @@ class CountriesIndicatorLastUpdateAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, iso3):
         """
         Show indicators last_update by a given country
@@ -1760,7 +2034,7 @@ class IndicatorsCountryLastUpdateAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id, iso3):
         """
         Show indicator last_update by its country id and indicator id
@@ -1779,7 +2053,7 @@ class ObservationByPeriodAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show observations of one of this given as parameter:
@@ -1792,25 +2066,16 @@ class ObservationByPeriodAPI(Resource):
         """
         date_from = request.args.get("from")
         date_to = request.args.get("to")
-        from_date, to_date = str_date_to_date(date_from, date_to)
-        if country_service.get_by_code(id) is not None:
-            country = country_service.get_by_code(id)
-            observations = filter_observations_by_date_range(country.observations, from_date, to_date)
+        from_date, to_date = date_range_bounds(*str_date_to_date(date_from, date_to))
+        kind, entity_id = dimension_registry.resolve(id)
+        if kind == DimensionRegistry.COUNTRY:
+            observations = observation_service.get_by_country(id, None, None, None, from_date, to_date)
             return response_xml_or_json_list(request, observations, 'observations', 'observation')
-        elif indicator_service.get_by_code(id) is not None:
-            observations = []
-            indicator = indicator_service.get_by_code(id)
-            for dataset in indicator.datasets:
-                observations.extend(dataset.observations)
-            observations = filter_observations_by_date_range(observations, from_date, to_date)
+        elif kind == DimensionRegistry.INDICATOR:
+            observations = observation_service.get_page_by_indicator(entity_id, None, None, None, from_date, to_date)
             return response_xml_or_json_list(request, observations, 'observations', 'observation')
-        elif region_service.get_by_code(id) is not None:
-            region = region_service.get_by_code(id)
-            observations = []
-            for country in country_service.get_all():
-                if country.is_part_of_id == region.id:
-                    observations.extend(country.observations)
-            observations = filter_observations_by_date_range(observations, from_date, to_date)
+        elif kind == DimensionRegistry.REGION:
+            observations = observation_service.get_by_region(entity_id, None, None, None, from_date, to_date)
             return response_xml_or_json_list(request, observations, 'observations', 'observation')
         else:
             response = observation_service.get_by_code(id)
@@ -1825,7 +2090,7 @@ class IndicatorByPeriodAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show observations by its given indicator
@@ -1835,11 +2100,10 @@ class IndicatorByPeriodAPI(Resource):
         """
         date_from = request.args.get("from")
         date_to = request.args.get("to")
-        from_date, to_date = str_date_to_date(date_from, date_to)
+        from_date, to_date = date_range_bounds(*str_date_to_date(date_from, date_to))
         if indicator_service.get_by_code(id) is not None:
-            observations = observation_service.get_all()
-            observations = [obs for obs in observations if obs.indicator_id == id]
-            observations = filter_observations_by_date_range(observations, from_date, to_date)
+            observations = observation_service.iterate_by_indicator(id, get_requested_fields(request), from_date,
+                                                                    to_date)
         else:
             abort(404)
         return response_xml_or_json_list(request, observations, 'observations', 'observation')
@@ -1850,14 +2114,14 @@ class IndicatorRegionsWithDataAPI(Resource):
     Indicator by period element URI
     """
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show regions with data for the given indicator
         Response 200 OK
         """
-        if indicator_service.get_by_code(id) is not None:
-            regions_with_data = get_regions_with_data(id)
+        if dimension_registry.get(DimensionRegistry.INDICATOR, id) is not None:
+            regions_with_data = regions_by_id(get_data_coverage(id)[0])
         else:
             abort(404)
         return response_xml_or_json_list(request, regions_with_data, 'regions', 'region')
@@ -1869,7 +2133,7 @@ class IndicatorRegionsWihtoutDataAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show observations by its given indicator
@@ -1877,13 +2141,8 @@ class IndicatorRegionsWihtoutDataAPI(Resource):
         whole range will be returned
         Response 200 OK
         """
-        if indicator_service.get_by_code(id) is not None:
-            regions_with_data = get_regions_with_data(id)
-            regions = get_regions_of_region(1)
-            regions_without_data = filter(lambda region: region not in regions_with_data, regions)
-            if len(regions_without_data) == len(regions):
-                regions_without_data.append(region_service.get_by_code(1))
-            translate_region_list(regions_without_data)
+        if dimension_registry.get(DimensionRegistry.INDICATOR, id) is not None:
+            regions_without_data = regions_by_id(get_data_coverage(id)[1])
         else:
             abort(404)
         return response_xml_or_json_list(request, regions_without_data, 'regions', 'region')
@@ -1895,7 +2154,7 @@ class IndicatorByCountryAndPeriodAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, indicator_id, iso3):
         """
         Show observations by its indicator id and countyr id
@@ -1905,10 +2164,10 @@ class IndicatorByCountryAndPeriodAPI(Resource):
         """
         date_from = request.args.get("from")
         date_to = request.args.get("to")
-        from_date, to_date = str_date_to_date(date_from, date_to)
+        from_date, to_date = date_range_bounds(*str_date_to_date(date_from, date_to))
         if country_service.get_by_code(iso3) is not None and indicator_service.get_by_code(indicator_id):
-            observations = observation_service.get_by_country_and_indicator(indicator_id, iso3)
-            observations = filter_observations_by_date_range(observations, from_date, to_date)
+            observations = observation_service.get_by_country_and_indicator(indicator_id, iso3, from_date=from_date,
+                                                                            to_date=to_date)
         else:
             abort(404)
         return response_xml_or_json_list(request, observations, 'observations', 'observation')
@@ -1920,7 +2179,7 @@ class IndicatorAverageByPeriodAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show average of indicator observations
@@ -1930,9 +2189,8 @@ class IndicatorAverageByPeriodAPI(Resource):
         """
         date_from = request.args.get("from")
         date_to = request.args.get("to")
-        from_date, to_date = str_date_to_date(date_from, date_to)
-        observations = observation_service.get_by_indicator(id)
-        observations = filter_observations_by_date_range(observations, from_date, to_date)
+        from_date, to_date = date_range_bounds(*str_date_to_date(date_from, date_to))
+        observations = observation_service.get_by_indicator(id, from_date, to_date)
         if len(observations) > 0:
             average = observations_average(observations)
             element = EmptyObject()
@@ -1948,7 +2206,7 @@ class IndicatorRelatedAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, id):
         """
         Show related indicators
@@ -1957,7 +2215,7 @@ class IndicatorRelatedAPI(Resource):
         indicators_relation = indicator_relationship_service.get_all()
         indicators_by_id = [indicator for indicator in indicators_relation if indicator.source_id == id]
         indicators_related = [indicator.target for indicator in indicators_by_id]
-        translate_indicator_list(indicators_related)
+        indicators_related = translate_indicator_list(indicators_related)
         return response_xml_or_json_list(request, indicators_related, "indicators", "indicator")
 
 
@@ -1967,7 +2225,7 @@ class IndicatorCountryTendencyAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, indicator_id, iso3):
         """
         Show indicator tendency for a country and indicator
@@ -1988,7 +2246,7 @@ class RegionTranslationListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all translations of a region
@@ -1997,6 +2255,7 @@ class RegionTranslationListAPI(Resource):
         return response_xml_or_json_list(request, region_translation_service.get_all(), 'translations', 'translation')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new region translation
@@ -2011,6 +2270,7 @@ class RegionTranslationListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all region translation
@@ -2022,6 +2282,7 @@ class RegionTranslationListAPI(Resource):
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all region translations
@@ -2039,7 +2300,7 @@ class RegionTranslationAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, region_id, lang_code):
         """
         Show region translation
@@ -2051,6 +2312,7 @@ class RegionTranslationAPI(Resource):
         return response_xml_or_json_item(request, translation, 'translation')
 
     @localhost_decorator
+    @write_transaction
     def put(self, region_id, lang_code):
         """
         If exists update region translation
@@ -2067,6 +2329,7 @@ class RegionTranslationAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, region_id, lang_code):
         """
         Delete region translation
@@ -2082,7 +2345,7 @@ class IndicatorTranslationListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all indicators translations
@@ -2091,6 +2354,7 @@ class IndicatorTranslationListAPI(Resource):
         return response_xml_or_json_list(request, indicator_translation_service.get_all(), 'translations', 'translation')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new indicator translation
@@ -2106,6 +2370,7 @@ class IndicatorTranslationListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all indicators translations given
@@ -2117,6 +2382,7 @@ class IndicatorTranslationListAPI(Resource):
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all indicators translations
@@ -2134,7 +2400,7 @@ class IndicatorTranslationAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, indicator_id, lang_code):
         """
         Show indicator translation
@@ -2146,6 +2412,7 @@ class IndicatorTranslationAPI(Resource):
         return response_xml_or_json_item(request, translation, 'translation')
 
     @localhost_decorator
+    @write_transaction
     def put(self, indicator_id, lang_code):
         """
         If exists update indicator translation
@@ -2163,6 +2430,7 @@ class IndicatorTranslationAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, indicator_id, lang_code):
         """
         Delete indicator translation
@@ -2178,7 +2446,7 @@ class TopicTranslationListAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self):
         """
         List all topic translations
@@ -2187,6 +2455,7 @@ class TopicTranslationListAPI(Resource):
         return response_xml_or_json_list(request, topic_translation_service.get_all(), 'translations', 'translation')
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new topic translation
@@ -2202,6 +2471,7 @@ class TopicTranslationListAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self):
         """
         Update all topic translations given
@@ -2213,6 +2483,7 @@ class TopicTranslationListAPI(Resource):
         return {}, 204
 
     @localhost_decorator
+    @write_transaction
     def delete(self):
         """
         Delete all topic translations
@@ -2229,7 +2500,7 @@ class TopicTranslationAPI(Resource):
     """
 
     @requires_auth
-    @cache.cached(key_prefix=make_cache_key)
+    @cached_response
     def get(self, topic_id, lang_code):
         """
         Show country topic translation
@@ -2241,6 +2512,7 @@ class TopicTranslationAPI(Resource):
         return response_xml_or_json_item(request, translation, 'translation')
 
     @localhost_decorator
+    @write_transaction
     def put(self, topic_id, lang_code):
         """
         If exists update topic translation
@@ -2257,6 +2529,7 @@ class TopicTranslationAPI(Resource):
             abort(400)
 
     @localhost_decorator
+    @write_transaction
     def delete(self, topic_id, lang_code):
         """
         Delete topic translation
@@ -2278,9 +2551,25 @@ class DeleteCacheAPI(Resource):
         Response 204 NO CONTENT
         """
         cache.clear()
+        dimension_registry.invalidate()
         return {}, 204
 
 
+class PoolStatsAPI(Resource):
+    """
+    Connection pool statistics URI
+    """
+
+    @localhost_decorator
+    def get(self):
+        """
+        Statistics of the connection pools of the server process that serves the request: checkouts
+        and the time waited for them, saturation and connection churn
+        Response 200 OK
+        """
+        return pool_monitor.stats(), 200
+
+
 @app.route('/graphs/barchart')
 def barChart():
     """
@@ -2326,10 +2615,11 @@ def scatterchart():
     indicators = [indicator_service.get_by_code(indicator) for indicator in indicators]
     countries = request.args.get('countries')
     if countries == 'all':
-        countries = country_service.get_all()
+        countries = dimension_registry.get_all(DimensionRegistry.COUNTRY)
     else:
         countries = countries.split(',')
-        countries = [country for country in country_service.get_all() if country.iso3 in countries]
+        countries = [country for country in dimension_registry.get_all(DimensionRegistry.COUNTRY)
+                     if country.iso3 in countries]
     colours = request.args.get('colours').split(',')
     colours = ['#'+colour for colour in colours]
     title = request.args.get('title') if request.args.get('title') is not None else ''
@@ -2340,6 +2630,7 @@ def scatterchart():
     to_time = datetime.strptime(request.args.get('to'), "%Y%m%d").date() if request.args.get('to') is not None else None
     series = []
     for country in countries:
+        country = dimension_registry.attach(country)
         observations_x_indicator = filter_observations_by_date_range([observation for observation in country.observations \
                                                       if observation.indicator_id == indicators[1].id], from_time, to_time)
         observations_y_indicator = filter_observations_by_date_range([observation for observation in country.observations \
@@ -2349,8 +2640,8 @@ def scatterchart():
             observations_y_indicator.sort(key=lambda observations: observation.ref_time.value)
             series.append({
                 'name': country.translations[0].name,
-                'values': [[float(observations_x_indicator[i].value.value) if observations_x_indicator[i].value.value is not None else 0,
-                            float(observations_y_indicator[i].value.value) if observations_y_indicator[i].value.value is not None else 0]
+                'values': [[numeric_value(observations_x_indicator[i].value) or 0,
+                            numeric_value(observations_y_indicator[i].value) or 0]
                            for i in range(min(len(observations_x_indicator), len(observations_y_indicator)))]
             })
     json_object = {
@@ -2532,6 +2823,7 @@ class AuthAPI(Resource):
     """
 
     @localhost_decorator
+    @write_transaction
     def post(self):
         """
         Create a new auth user
@@ -2544,6 +2836,7 @@ class AuthAPI(Resource):
         abort(400)  # in case something is wrong
 
     @localhost_decorator
+    @write_transaction
     def put(self, username):
         """
         If exists update auth user
@@ -2618,92 +2911,89 @@ api.add_resource(TopicTranslationListAPI, '/topics/translations', endpoint='topi
 api.add_resource(TopicTranslationAPI, '/topics/translations/<topic_id>/<lang_code>', endpoint='topic_translations')
 api.add_resource(IndicatorStarredAPI, '/indicators/starred', endpoint='indicator_starred')
 api.add_resource(DeleteCacheAPI, '/cache', endpoint='delete_cache')
+api.add_resource(PoolStatsAPI, '/pool', endpoint='pool_stats')
 api.add_resource(AuthAPI, '/auth', endpoint='auth')
 
 
-@cache.cached()
 def translate_indicator_list(indicators):
     """
     Translate an indicator list into given language
 
     :param indicators: list of indicators to be translated
+    :return: list of translated views of the indicators
     """
     lang = get_requested_lang()
-    for indicator in indicators:
-        translate_indicator(indicator, lang)
+    return [translate_indicator(indicator, lang) for indicator in indicators]
 
 
-@cache.cached()
 def translate_indicator(indicator, lang=None):
     """
-    Translate an indicator object into given language
+    Translate an indicator object into given language, the indicator is not modified
 
     :param indicator: indicator object to be translated
     :param lang: language of translation, by default en
+    :return: view of the indicator, with its name and description if there is a translation
     """
     if lang is None:
         lang = get_requested_lang()
     translation = indicator_translation_service.get_by_codes(indicator.id, lang)
     if translation is not None:
-        indicator.name = translation.name
-        indicator.description = translation.description
-        indicator.other_parseable_fields = ['name', 'description']
+        return ViewModel(indicator, name=translation.name, description=translation.description)
+    return ViewModel(indicator)
 
 
-@cache.cached()
 def translate_region_list(regions):
     """
     Translate a region list into given language
 
     :param regions: list of regions to be translated
+    :return: list of translated views of the regions
     """
     lang = get_requested_lang()
-    for region in regions:
-        translate_region(region, lang)
+    return [translate_region(region, lang) for region in regions]
 
 
-@cache.cached()
 def translate_region(region, lang=None):
     """
-    Translate a region object into given language
+    Translate a region object into given language, the region is not modified
 
     :param region: region object to be translated
     :param lang: language of translation, by default en
+    :return: view of the region, with its name if there is a translation
     """
     if lang is None:
         lang = get_requested_lang()
     translation = region_translation_service.get_by_codes(region.id, lang)
     if translation is not None:
-        region.name = translation.name
-        region.other_parseable_fields = ['name']
+        return ViewModel(region, name=translation.name)
+    return ViewModel(region)
 
 
-@cache.cached()
 def translate_topic_list(topics):
     """
     Translate a topic list into given language
 
     :param topics: list of topics to be translated
+    :return: list of translated views of the topics
     """
     lang = get_requested_lang()
-    for topic in topics:
-        translate_topic(topic, lang)
+    return [translate_topic(topic, lang) for topic in topics]
 
 
-@cache.cached()
 def translate_topic(topic, lang=None):
     """
-    Translate a topic object into given language
+    Translate a topic object into given language, the topic is not modified
 
     :param topic: topic object to be translated
     :param lang: language of translation, by default en
+    :return: view of the topic, with its translation_name if there is a translation
     """
     if lang is None:
         lang = get_requested_lang()
     translation = topic_translation_service.get_by_codes(topic.id, lang)
     if translation is not None:
-        topic.translation_name = translation.name
-        topic.other_parseable_fields = ['translation_name']
+        return ViewModel(topic, translation_name=translation.name)
+    return ViewModel(topic)
 
 
 def get_requested_lang():
@@ -2782,6 +3072,9 @@ def response_xml_or_json_list(request, collection, collection_string, item_strin
     * XML
     * JSONP
     * CSV
+    * NDJSON, one json object per line
+    * Arrow and Parquet, only for observations and if pyarrow is installed
+    Only the fields given in the *fields* argument are included, if present
 
     :param request: the request object
     :param collection: the collection to be converted
@@ -2789,36 +3082,70 @@ def response_xml_or_json_list(request, collection, collection_string, item_strin
     :param item_string: the string in the root node of the object, only needed for xml
     :return: response in the requested format
     """
+    fields = get_requested_fields(request)
+
     def return_json():
-        return Response(json_converter.list_to_json(collection
-                                                        ), mimetype='application/json')
+        return Response(stream_with_context(json_converter.list_to_json_stream(collection, fields=fields)),
+                        mimetype='application/json')
 
     def return_xml():
-        return Response(xml_converter.list_to_xml(collection,
-                                                  collection_string, item_string), mimetype='application/xml')
+        return Response(stream_with_context(xml_converter.list_to_xml_stream(collection, collection_string,
+                                                                             item_string, fields=fields)),
+                        mimetype='application/xml')
 
     def return_csv():
-        response = Response(csv_converter.list_to_csv(collection
-                                ), mimetype='text/csv', content_type='application/octet-stream')
+        response = Response(stream_with_context(csv_converter.list_to_csv_stream(collection, fields=fields)),
+                            mimetype='text/csv', content_type='application/octet-stream')
         response.headers["Content-Disposition"] = 'attachment; filename="' + collection_string + '".csv'
         return response
 
     def return_jsonp():
         function = request.args.get('jsonp') if request.args.get('jsonp') is not None else 'callback'
-        response = function + '(' + json_converter.list_to_json(collection) + ');'
-        return Response(response, mimetype='application/javascript')
+        response = chain([function + '('], json_converter.list_to_json_stream(collection, fields=fields), [');'])
+        return Response(stream_with_context(response), mimetype='application/javascript')
+
+    def return_ndjson():
+        return Response(stream_with_context(json_converter.list_to_ndjson_stream(collection, fields=fields)),
+                        mimetype='application/x-ndjson')
+
+    def get_columnar_converter():
+        converter = columnar_converters.get(item_string)
+        if converter is None or not converter.is_available():
+            abort(406)
+        converter = converter.select(fields)
+        if len(converter.columns) == 0:
+            abort(400)
+        return converter
+
+    def return_arrow():
+        converter = get_columnar_converter()
+        return Response(stream_with_context(converter.list_to_arrow_stream(collection)),
+                        mimetype='application/vnd.apache.arrow.stream')
+
+    def return_parquet():
+        converter = get_columnar_converter()
+        response = Response(stream_with_context(converter.list_to_parquet_stream(collection)),
+                            mimetype='application/vnd.apache.parquet')
+        response.headers["Content-Disposition"] = 'attachment; filename="' + collection_string + '".parquet'
+        return response
 
     functions = {
         'json': return_json,
         'xml': return_xml,
         'csv': return_csv,
-        'jsonp': return_jsonp
+        'jsonp': return_jsonp,
+        'ndjson': return_ndjson,
+        'arrow': return_arrow,
+        'parquet': return_parquet
     }
     functions_accept = {
         'application/json': return_json,
         'application/xml': return_xml,
         'text/csv': return_csv,
-        'application/javascript': return_jsonp
+        'application/javascript': return_jsonp,
+        'application/x-ndjson': return_ndjson,
+        'application/vnd.apache.arrow.stream': return_arrow,
+        'application/vnd.apache.parquet': return_parquet
     }
     if request.args.get('format') in functions.keys():
         return functions[request.args.get('format')]()
@@ -2827,6 +3154,19 @@ def response_xml_or_json_list(request, collection, collection_string, item_strin
                 if request.headers.get('Accept') in functions_accept.keys() else functions['json'])()
 
 
+def get_requested_fields(request):
+    """
+    Returns the fields requested in the *fields* argument, a comma separated list
+
+    :param request: the request object
+    :return: frozenset with the names of the fields, None if all fields are requested
+    """
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return frozenset(field.strip() for field in fields.split(',') if field.strip())
+
+
 def filter_observations_by_date_range(observations, from_date=None, to_date=None):
     """
     Filters observations by a given date range
@@ -2836,20 +3176,66 @@ def filter_observations_by_date_range(observations, from_date=None, to_date=None
     :param to_date: end of the date range
     :return: filtered list of observations
     """
+    return list(iterate_observations_by_date_range(observations, from_date, to_date))
+
+
+def iterate_observations_by_date_range(observations, from_date=None, to_date=None):
+    """
+    Filters observations by a given date range, while they are iterated
+
+    :param observations: iterable of observations to filter
+    :param from_date: beginning of the date range
+    :param to_date: end of the date range
+    :return: iterator of the filtered observations
+    """
     def filter_key(observation):
         """
         Filters a single observations
         :param observation: observations to filter
         :return: True if observations passes, False otherwise
         """
-        time = observation.ref_time
-        return (isinstance(time, Instant) and from_date <= time.timestamp <= to_date) \
-            or (isinstance(time, Interval) and time.start_time <= to_date and time.end_time >= from_date)  \
-            or (isinstance(time, YearInterval) and to_date.year <= time.year <= from_date.year)
+        period = period_of(observation.ref_time)
+        return period is not None and period[0] <= to_date and period[1] >= from_date
+
+    from_date, to_date = date_range_bounds(from_date, to_date)
+    return ifilter(filter_key, observations)
+
+
+def date_range_bounds(from_date=None, to_date=None):
+    """
+    Returns the bounds of a date range, from epoch and until today if they are not given
 
+    :param from_date: beginning of the date range
+    :param to_date: end of the date range
+    :return: from_date and to_date
+    """
     from_date = datetime.utcfromtimestamp(0).date() if from_date is None else from_date
     to_date = datetime.now().date() if to_date is None else to_date
-    return filter(filter_key, observations)
+    return from_date, to_date
+
+
+def time_label(time):
+    """
+    Returns a label for a time
+
+    :param time: time object, usually the ref_time of an observation
+    :return: ISO format of instants, value of intervals, None if time is None
+    """
+    if time is None:
+        return None
+    elif isinstance(time, Instant):
+        return time.timestamp.isoformat() if time.timestamp is not None else None
+    return time.value
+
+
+def numeric_value(value):
+    """
+    Returns the number of a value, stored when the value was written
+
+    :param value: value object, usually the value of an observation
+    :return: value as a float, None if there is no value or it is not a number
+    """
+    return value.number if value is not None else None
 
 
 def str_date_to_date(date_from, date_to):
@@ -2875,8 +3261,8 @@ def filter_by_region_and_top(id):
     top = int(request.args.get("top")) if request.args.get("top") is not None else 10
     region = int(request.args.get("region")) if request.args.get("region") not in (None, "global") else 1
     observations = observation_service.get_top_by_region(id, region, top)
-    countries = country_service.get_all()  # improve if changing directionality of model on observation country
-    countries = [country for observation in observations for country in countries if observation.region_id == country.id]
+    countries = [dimension_registry.get(DimensionRegistry.COUNTRY, observation.region_id) for observation in observations]
+    countries = [country for country in countries if country is not None]
     return countries, observations
 
 
@@ -2887,15 +3273,9 @@ def observations_average(observations):
     :param observations: observations to calculate the average
     :return: average
     """
-    if len(observations) == 1:
-        average = observations[0].value.value
-    elif len(observations) == 0:
-        return 0
-    else:
-        average = 0
-        for observation in observations:
-            average += float(observation.value.value)
-    return float(average)/len(observations)
+    numbers = [number for number in [numeric_value(observation.value) for observation in observations]
+               if number is not None]
+    return sum(numbers) / len(numbers) if len(numbers) > 0 else 0
 
 
 def group_observations_by_years(observations):
@@ -2921,9 +3301,10 @@ def group_observations_by_years(observations):
                     = [observation]
     returned_observations = []
     for key in observations_dict.keys():
+        numbers = [number for number in [numeric_value(observation.value) for observation in observations_dict[key]]
+                   if number is not None]
         value = Value()
-        value.value = reduce(lambda x, y: x + float(y.value.value) if y.value.value is not None else 0,
-                             observations_dict[key], 0) / len(observations_dict[key])
+        value.value = value.number = sum(numbers) / len(numbers) if len(numbers) > 0 else None
         returned_observations.append(Observation(ref_time=YearInterval(key), value=value))
     return returned_observations
 
@@ -2938,7 +3319,7 @@ def get_visualization_json(request, chartType):
     """
     indicator = indicator_service.get_by_code(request.args.get('indicator'))
     countries = request.args.get('countries').split(',')
-    countries = [country_service.get_by_code(country_code) for country_code in countries]
+    countries = [dimension_registry.get(DimensionRegistry.COUNTRY, country_code, 'iso3') for country_code in countries]
     colours = request.args.get('colours').split(',')
     colours = ['#'+colour for colour in colours]
     title = request.args.get('title') if request.args.get('title') is not None else ''
@@ -2947,11 +3328,13 @@ def get_visualization_json(request, chartType):
     yTag = request.args.get('yTag')
     from_time = datetime.strptime(request.args.get('from'), "%Y%m%d").date() if request.args.get('from') is not None else None
     to_time = datetime.strptime(request.args.get('to'), "%Y%m%d").date() if request.args.get('to') is not None else None
+    from_time, to_time = date_range_bounds(from_time, to_time)
     times = []
     series = []
     for country in countries:
-        observations = filter_observations_by_date_range([observation for observation in country.observations \
-                                                      if observation.indicator_id == indicator.id], from_time, to_time)
+        country = dimension_registry.attach(country)
+        observations = observation_service.get_by_country_and_indicator(indicator.id, country.iso3, 'visualization',
+                                                                        from_date=from_time, to_date=to_time)
         organization = Organization(id='unknown', name='unknown')
         if len(observations) > 0:
             organization = observations[0].dataset.datasource.organization
@@ -2968,7 +3351,7 @@ def get_visualization_json(request, chartType):
                 'es': region_translation_service.get_by_codes(country.is_part_of_id, 'es').name,
                 'fr': region_translation_service.get_by_codes(country.is_part_of_id, 'fr').name
             },
-            'values': [float(observation.value.value) if observation.value.value is not None
+            'values': [observation.value.number if observation.value.number is not None
                         and observation.ref_time.value == times[observations.index(observation)].value
                        else None for observation in observations] if len(observations) > 0 else [None]
         })
@@ -3002,15 +3385,17 @@ def get_visualization_map_json(request):
     indicator = indicator_service.get_by_code(request.args.get('indicator'))
     countries = request.args.get('countries').split(',') if request.args.get('countries') != 'global' else 'global'
     if countries != 'global':
-        countries = [country for country in country_service.get_all() if country.iso3 in countries]
+        countries = [country for country in dimension_registry.get_all(DimensionRegistry.COUNTRY)
+                     if country.iso3 in countries]
     else:
-        countries = country_service.get_all()
+        countries = dimension_registry.get_all(DimensionRegistry.COUNTRY)
     title = request.args.get('title') if request.args.get('title') is not None else ''
     description = request.args.get('description') if request.args.get('description') is not None else ''
     from_time = datetime.strptime(request.args.get('from'), "%Y%m%d").date() if request.args.get('from') is not None else None
     to_time = datetime.strptime(request.args.get('to'), "%Y%m%d").date() if request.args.get('to') is not None else None
     countries_values = []
     for country in countries:
+        country = dimension_registry.attach(country)
         observations = filter_observations_by_date_range([observation for observation in country.observations \
                                                       if observation.indicator_id == indicator.id], from_time, to_time)
 
@@ -3079,22 +3464,41 @@ def get_regions_of_region(id):
     :return: list of regions
     """
     regions = region_service.get_regions_of_region(id)
-    translate_region_list(regions)
+    regions = translate_region_list(regions)
     return regions
 
 
-def get_regions_with_data(id):
+@cache.memoize()
+def get_data_coverage(id):
     """
-    Return all the regions with data for a given indicator
+    Returns the regions with data for a given indicator and the regions of the global region without data.
+    The global region is added to the first ones if any region has data, and to the second ones if none of
+    its regions has data. Ids are returned, so they can be cached per indicator
 
     :param id: id of the given indicator
-    :return: list of regions with data
+    :return: tuple (ids of the regions with data, ids of the regions without data)
+    """
+    global_region = dimension_registry.get(DimensionRegistry.REGION, 1, 'un_code')
+    global_id = global_region.id if global_region is not None else None
+    coverage = region_service.get_data_coverage(id, global_id)
+    with_data = [region_id for region_id, has_data, belongs in coverage if has_data]
+    regions = [region_id for region_id, has_data, belongs in coverage if belongs]
+    without_data = sorted(set(regions) - set(with_data))
+    if global_id is not None and len(with_data) > 0:
+        with_data.append(global_id)
+    if global_id is not None and len(without_data) == len(regions):
+        without_data.append(global_id)
+    return with_data, without_data
+
+
+def regions_by_id(ids):
     """
-    regions_with_data = region_service.get_regions_with_data(id)
-    if len(regions_with_data) > 0:
-        regions_with_data.append(region_service.get_by_code(1))
-    translate_region_list(regions_with_data)
-    return regions_with_data
+    Returns the translated regions of the given ids
+
+    :param ids: ids of the regions
+    :return: list of regions
+    """
+    return translate_region_list([dimension_registry.get(DimensionRegistry.REGION, region_id) for region_id in ids])
 
 
 def get_limit_and_offset():
@@ -3108,12 +3512,64 @@ def get_limit_and_offset():
     return limit, offset
 
 
-def slice_by_limit_and_offset(list, limit, offset):
+def get_pagination():
     """
-    Returns the sliced list
+    Returns the pagination in the request, by offset or by cursor if the cursor argument is given
+    An empty cursor requests the first page
+
+    :return: limit; offset, None if paginated by cursor; and id of the last observation of the previous page
+    """
+    limit, offset = get_limit_and_offset()
+    if 'cursor' not in request.args:
+        return limit, offset, None
+    return limit, None, decode_cursor(request.args.get('cursor'))
+
+
+def encode_cursor(key):
+    """
+    Returns the opaque cursor of the page that follows a given key
+
+    :param key: last key of the page
+    :return: cursor string, safe to be used in URLs
+    """
+    return urlsafe_b64encode(json.dumps([key]))
+
+
+def decode_cursor(cursor):
+    """
+    Returns the key encoded in a cursor, aborts with 400 BAD REQUEST if it is not valid
+
+    :param cursor: cursor given by encode_cursor, or empty for the first page
+    :return: last key of the previous page, None for the first page
+    """
+    if not cursor:
+        return None
+    try:
+        return json.loads(urlsafe_b64decode(cursor.encode('ascii')))[0]
+    except (TypeError, ValueError, IndexError, UnicodeError):
+        abort(400)
+
+
+def paginated_response(request, observations, limit, offset):
+    """
+    Return response with a page of observations in the format requested
+    Pages by cursor have a link to the next page in the Link header, if the page is full.
+    The cursor is the id of the last observation as ordered by the database, the same collation
+    the database uses to compare it with the ids of the next page
+
+    :param request: the request object
+    :param observations: observations of the page, in the order of the query
+    :param limit: number of observations of a full page
+    :param offset: offset of the page, None if paginated by cursor
+    :return: response in the requested format
     """
-    limit = limit + offset if (limit + offset) < len(list) else len(list)
-    return list[offset:limit]
+    response = response_xml_or_json_list(request, observations, 'observations', 'observation')
+    if offset is None and len(observations) == limit:
+        args = request.args.to_dict()
+        args['cursor'] = encode_cursor(observations[-1].id)
+        args.update(request.view_args)
+        response.headers['Link'] = '<' + url_for(request.endpoint, _external=True, **args) + '>; rel="next"'
+    return response
 
 
 class EmptyObject():
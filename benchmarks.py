@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# landportal-data-access-api
+# Copyright (c)2014, WESO, Web Semantics Oviedo.
+# Written by Herminio García.
+
+# This file is part of landportal-data-access-api.
+#
+# landportal-data-access-api is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License.
+#
+# landportal-data-access-api is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with landportal-data-access-api.  If not, see <http://www.gnu.org/licenses/>.
+
+# landportal-data-access-api is licensed under the terms of the GPLv2
+# <http://www.gnu.org/licenses/old-licenses/gpl-2.0.html>
+
+"""
+Created on 18/10/2026
+Micro benchmarks of the hot paths of the API, against an in-memory sqlite database
+
+Usage: python benchmarks.py [benchmark ...], all benchmarks are run if none is given
+"""
+import sys
+import time
+import datetime
+from timeit import default_timer
+from sqlalchemy import event
+from app import app, db, cache, views, daos
+from app.services import GenericService, TransactionManager
+from app.utils import row2dict, get_user_attrs, is_primitive, Serializer, DateEncoder
+from model.models import Country, Indicator, Observation, Value, Interval, IndicatorTranslation
+
+COUNTRIES = 200
+INDICATORS = 50
+OBSERVATIONS = 10000
+REPETITIONS = 5
+
+
+def populate():
+    """
+    Creates the schema in an in-memory database and fills it with synthetic data
+    """
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.create_all()
+    for i in range(COUNTRIES):
+        country = Country('C' + str(i), 'C' + str(i).zfill(2), None)
+        country.un_code = i
+        db.session.add(country)
+    for i in range(INDICATORS):
+        indicator = Indicator('INDICATOR' + str(i), 'increase', None, None, None, i % 2 == 0)
+        indicator.last_update = datetime.datetime(2014, 1, 1) + datetime.timedelta(days=i)
+        db.session.add(indicator)
+        db.session.add(IndicatorTranslation('en', 'Indicator ' + str(i), None, 'INDICATOR' + str(i)))
+    db.session.flush()
+    countries = Country.query.all()
+    for i in range(OBSERVATIONS):
+        year = 1990 + i % 25
+        ref_time = Interval()
+        ref_time.start_time = datetime.date(year, 1, 1)
+        ref_time.end_time = datetime.date(year, 12, 31)
+        ref_time.value = str(year)
+        value = Value()
+        value.value = str(i * 0.5)
+        value.value_type = 'float'
+        observation = Observation('OBS' + str(i))
+        observation.ref_time = ref_time
+        observation.value = value
+        observation.indicator_id = 'INDICATOR' + str(i % INDICATORS)
+        observation.region_id = countries[i % COUNTRIES].id
+        db.session.add(observation)
+    db.session.commit()
+
+
+def per_row(function, rows):
+    """
+    Returns the best time per row, in microseconds, of applying a function to the given rows
+
+    :param function: function to apply to every row
+    :param rows: list of rows
+    :return: microseconds per row
+    """
+    best = None
+    for i in range(REPETITIONS):
+        start = default_timer()
+        for row in rows:
+            function(row)
+        elapsed = default_timer() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best * 1000000 / len(rows)
+
+
+def report(name, before, after):
+    """
+    Prints the result of a benchmark
+
+    :param name: name of the measured case
+    :param before: microseconds per row of the previous implementation
+    :param after: microseconds per row of the current implementation
+    """
+    print '%-45s before %8.2f us/row   after %8.2f us/row   %5.1fx' % (name, before, after, before / after)
+
+
+def legacy_check_if_date(field_name, object, row):
+    if type(getattr(row, field_name)) is datetime.date or type(getattr(row, field_name)) is datetime.datetime:
+        object[field_name] = time.mktime(getattr(row, field_name).timetuple())
+    else:
+        object[field_name] = getattr(row, field_name)
+
+
+def legacy_row2dict(row):
+    """
+    Reflective row2dict, as it was before serialization plans
+    """
+    if row is None:
+        return None
+    d = {}
+    if hasattr(row, '__table__'):
+        for column in row.__mapper__.columns:
+            legacy_check_if_date(column.name, d, row)
+        if hasattr(row, 'other_parseable_fields'):
+            for field in row.other_parseable_fields:
+                if isinstance(getattr(row, field), object) and not is_primitive(getattr(row, field)):
+                    d[field] = legacy_row2dict(getattr(row, field))
+                else:
+                    legacy_check_if_date(field, d, row)
+        return d
+    else:
+        for column in get_user_attrs(row):
+            legacy_check_if_date(column, d, row)
+        return d
+
+
+def benchmark_serializer():
+    """
+    Per row cost of row2dict on observations, indicators and countries
+    """
+    observations = Observation.query.all()
+    for observation in observations:
+        observation.ref_time, observation.value  # loaded before measuring
+    indicators = Indicator.query.all()
+    countries = Country.query.all()
+    report('row2dict Observation', per_row(legacy_row2dict, observations), per_row(row2dict, observations))
+    report('row2dict Indicator', per_row(legacy_row2dict, indicators), per_row(row2dict, indicators))
+    report('row2dict Country', per_row(legacy_row2dict, countries), per_row(row2dict, countries))
+    for observation in observations:
+        observation.other_parseable_fields = ['ref_time', 'value']
+    report('row2dict Observation with ref_time, value', per_row(legacy_row2dict, observations),
+           per_row(row2dict, observations))
+
+
+class LegacyDateEncoder(object):
+    """
+    Date encoder through time.mktime, as it was before DateEncoder
+    """
+    def encode(self, value):
+        return time.mktime(value.timetuple())
+
+
+def benchmark_dates():
+    """
+    Per row cost of encoding the dates of observations with a nested ref_time
+    """
+    observations = Observation.query.all()
+    for observation in observations:
+        observation.ref_time
+        observation.other_parseable_fields = ['ref_time']
+    legacy = Serializer(LegacyDateEncoder())
+    report('row2dict Observation with ref_time', per_row(legacy.serialize, observations),
+           per_row(Serializer(DateEncoder()).serialize, observations))
+    report('row2dict Observation with ref_time, ISO', per_row(legacy.serialize, observations),
+           per_row(Serializer(DateEncoder(iso=True)).serialize, observations))
+    dates = [observation.ref_time.start_time for observation in observations]
+    report('encode date', per_row(LegacyDateEncoder().encode, dates), per_row(DateEncoder().encode, dates))
+
+
+class LegacyTransactionManager(TransactionManager):
+    """
+    Transaction manager that commits after every call to the daos, as it was before units of work
+    """
+    def execute(self, dao, function, *args):
+        result = super(LegacyTransactionManager, self).execute(dao, function, *args)
+        db.session.commit()
+        return result
+
+
+def count_statements(method, path, data=None):
+    """
+    Returns the number of statements and commits run by a request, with a new session and without cache
+
+    :param method: name of the method of the test client, like 'get' or 'put'
+    :param path: path of the request
+    :param data: json body of the request
+    :return: tuple (statements, commits)
+    """
+    statements, commits = [], []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def commit(conn):
+        commits.append(conn)
+    db.session.remove()
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    event.listen(db.engine, 'commit', commit)
+    try:
+        getattr(app.test_client(), method)(path, data=data, content_type='application/json', buffered=True,
+                                           environ_overrides={'REMOTE_ADDR': '127.0.0.1'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_execute)
+        event.remove(db.engine, 'commit', commit)
+    return len(statements), len(commits)
+
+
+def benchmark_transactions():
+    """
+    Statements and commits per request, committing after every call to the daos and with units of work
+    """
+    cache.init_app(app, config={'CACHE_TYPE': 'null', 'CACHE_NO_NULL_WARNING': True})
+    requests = [('get', '/countries/C00', None), ('get', '/indicators/INDICATOR1', None),
+                ('get', '/countries/C00/indicators/INDICATOR0', None), ('get', '/observations/C00/INDICATOR0', None),
+                ('get', '/indicators/INDICATOR0/C00/last_update', None),
+                ('put', '/countries/C00', '{"iso2": "C0", "name": "C0"}')]
+    service_list = [value for value in vars(views).values() if isinstance(value, GenericService)]
+    for request in requests:
+        count_statements(*request)  # loads the dimensions before measuring
+    counts = []
+    for tm in (LegacyTransactionManager(), TransactionManager()):
+        for service in service_list:
+            service.tm = tm
+        counts.append([count_statements(*request) for request in requests])
+    for request, before, after in zip(requests, counts[0], counts[1]):
+        print '%-45s before %3d statements %3d commits   after %3d statements %3d commits' % \
+              (request[0].upper() + ' ' + request[1], before[0], before[1], after[0], after[1])
+
+
+def benchmark_lookups():
+    """
+    Per lookup cost of the lookups by code, building and compiling an ORM query on every call and with
+    compiled lookups
+    """
+    session = db.session
+    countries = ['C' + str(i).zfill(2) for i in range(COUNTRIES)]
+    indicators = ['INDICATOR' + str(i) for i in range(INDICATORS)]
+    dao = daos.CountryDAO()
+    dao.set_session(session)
+    report('CountryDAO.get_by_code',
+           per_row(lambda code: session.query(Country).filter_by(iso3=code).first(), countries),
+           per_row(dao.get_by_code, countries))
+    dao = daos.IndicatorDAO()
+    dao.set_session(session)
+    report('IndicatorDAO.get_by_code',
+           per_row(lambda code: session.query(Indicator).filter_by(id=code).first(), indicators),
+           per_row(dao.get_by_code, indicators))
+    dao = daos.IndicatorTranslationDAO()
+    dao.set_session(session)
+    report('IndicatorTranslationDAO.get_by_codes',
+           per_row(lambda code: session.query(IndicatorTranslation).filter(IndicatorTranslation.indicator_id == code)
+                   .filter(IndicatorTranslation.lang_code == 'en').first(), indicators),
+           per_row(lambda code: dao.get_by_codes(code, 'en'), indicators))
+
+
+BENCHMARKS = {
+    'serializer': benchmark_serializer,
+    'dates': benchmark_dates,
+    'lookups': benchmark_lookups,
+    'transactions': benchmark_transactions
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] if len(sys.argv) > 1 else sorted(BENCHMARKS.keys())
+    with app.test_request_context():
+        populate()
+        for name in names:
+            print '== ' + name
+            BENCHMARKS[name]()
@@ -28,7 +28,11 @@ Created on 10/02/2014
 :author: Herminio García
 """
 from app import db
+from app.services import ObservationService, RegionService, ValueService
 
 
 if __name__ == '__main__':
-    db.create_all()
\ No newline at end of file
+    db.create_all()
+    ObservationService().backfill_periods()  # periods of the observations stored before their table existed
+    RegionService().rebuild_closure()
+    ValueService().backfill_numbers()  # numbers of the values stored before their table existed
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# landportal-data-access-api
+# Copyright (c)2014, WESO, Web Semantics Oviedo.
+# Written by Herminio García.
+
+# This file is part of landportal-data-access-api.
+#
+# landportal-data-access-api is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License.
+#
+# landportal-data-access-api is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with landportal-data-access-api.  If not, see <http://www.gnu.org/licenses/>.
+
+# landportal-data-access-api is licensed under the terms of the GPLv2
+# <http://www.gnu.org/licenses/old-licenses/gpl-2.0.html>
+
+"""
+Created on 18/10/2026
+Creates the indexes the most frequent queries of the daos need, if they are missing, and reports
+the tables those queries read fully according to the EXPLAIN of the database
+
+Usage: python create_indexes.py [--check], indexes are only verified, not created, if --check is given
+"""
+import sys
+from datetime import date
+from sqlalchemy import event
+from app import db
+from app.daos import ObservationDAO, IndicatorDAO, CountryDAO, RegionDAO, RegionTranslationDAO, \
+    IndicatorTranslationDAO, full_scans
+from app.models import QUERY_INDEXES, missing_indexes, create_missing_indexes
+from model.models import Observation, Country, Region
+
+HOT_QUERIES = (  # name and call of the most frequent queries of the daos, given some sample codes
+    ('ObservationDAO.get_by_country_and_indicator',
+     lambda daos, sample: daos['observation'].get_by_country_and_indicator(sample['indicator_id'], sample['iso3'])),
+    ('ObservationDAO.get_by_region_and_indicator',
+     lambda daos, sample: daos['observation'].get_by_region_and_indicator(sample['region_id'], sample['indicator_id'],
+                                                                          100, None)),
+    ('ObservationDAO.get_by_country',
+     lambda daos, sample: daos['observation'].get_by_country(sample['iso3'], 100, None)),
+    ('ObservationDAO.get_by_region',
+     lambda daos, sample: daos['observation'].get_by_region(sample['region_id'], 100, None)),
+    ('ObservationDAO.get_page_by_indicator',
+     lambda daos, sample: daos['observation'].get_page_by_indicator(sample['indicator_id'], 100, None)),
+    ('ObservationDAO.get_top_by_region',
+     lambda daos, sample: daos['observation'].get_top_by_region(sample['indicator_id'], sample['region_id'], 10)),
+    ('ObservationDAO.get_by_indicator',
+     lambda daos, sample: daos['observation'].get_by_indicator(sample['indicator_id'], date(2000, 1, 1),
+                                                               date(2010, 12, 31))),
+    ('ObservationDAO.get_averages_by_country_and_indicator',
+     lambda daos, sample: daos['observation'].get_averages_by_country_and_indicator(sample['indicator_id'],
+                                                                                    sample['iso3'])),
+    ('IndicatorDAO.get_indicators_by_country',
+     lambda daos, sample: daos['indicator'].get_indicators_by_country(sample['iso3'])),
+    ('CountryDAO.get_countries_by_region',
+     lambda daos, sample: daos['country'].get_countries_by_region(sample['region_id'])),
+    ('CountryDAO.get_countries_with_data_by_region',
+     lambda daos, sample: daos['country'].get_countries_with_data_by_region(sample['region_id'])),
+    ('RegionDAO.get_data_coverage',
+     lambda daos, sample: daos['region'].get_data_coverage(sample['indicator_id'], sample['region_id'])),
+    ('RegionTranslationDAO.get_by_codes',
+     lambda daos, sample: daos['region_translation'].get_by_codes(sample['region_id'], 'en')),
+    ('IndicatorTranslationDAO.get_by_codes',
+     lambda daos, sample: daos['indicator_translation'].get_by_codes(sample['indicator_id'], 'en'))
+)
+
+
+def get_sample(session):
+    """
+    Returns the codes the hot queries are run with, taken from an observation of a country and its region
+
+    :param session: session of the database
+    :return: dict with indicator_id, iso3 and region_id, made up if there are no observations
+    """
+    row = session.query(Observation.indicator_id, Country.iso3, Region.is_part_of_id)\
+        .join(Country, Observation.region_id == Country.id).first()
+    if row is None or row[2] is None:
+        return dict(indicator_id='', iso3='', region_id=0)
+    return dict(indicator_id=row[0], iso3=row[1], region_id=row[2])
+
+
+def explain_hot_queries(session):
+    """
+    Runs every hot query and the EXPLAIN of every statement it sends
+
+    :param session: session of the database, rolled back at the end
+    :return: list of tuples (name of the query, statement, list of fully read tables)
+    """
+    daos = dict(observation=ObservationDAO(), indicator=IndicatorDAO(), country=CountryDAO(), region=RegionDAO(),
+                region_translation=RegionTranslationDAO(), indicator_translation=IndicatorTranslationDAO())
+    for dao in daos.values():
+        dao.set_session(session)
+    sample = get_sample(session)
+    connection = session.connection()
+    results = []
+    try:
+        for name, call in HOT_QUERIES:
+            statements = []
+
+            def before_execute(conn, cursor, statement, parameters, context, executemany):
+                statements.append((statement, parameters))
+            event.listen(connection, 'before_cursor_execute', before_execute)
+            try:
+                call(daos, sample)
+            finally:
+                event.remove(connection, 'before_cursor_execute', before_execute)
+            for statement, parameters in statements:
+                results.append((name, statement, full_scans(connection, statement, parameters)))
+    finally:
+        session.rollback()
+    return results
+
+
+if __name__ == '__main__':
+    check_only = '--check' in sys.argv[1:]
+    with db.engine.begin() as connection:
+        indexes = missing_indexes(connection) if check_only else create_missing_indexes(connection)
+    for index in QUERY_INDEXES:
+        state = 'MISSING' if check_only and index in indexes else 'CREATED' if index in indexes else 'OK'
+        print '%-8s %s on %s (%s)' % (state, index.name, index.table.name,
+                                      ', '.join(column.name for column in index.columns))
+    for name, statement, tables in explain_hot_queries(db.session()):
+        print '%-10s %s' % ('FULL SCAN' if tables else 'OK', name + (': ' + ', '.join(tables) if tables else ''))
+    sys.exit(1 if check_only and indexes else 0)
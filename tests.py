@@ -25,15 +25,33 @@
 __author__ = 'Weso'
 
 import unittest
+import os
+import tempfile
+import shutil
 import app
+import create_indexes
+import csv
 import json
+import zlib
+from StringIO import StringIO
+from xml.etree import ElementTree
 from flask_testing import TestCase
-from app.utils import JSONConverter
+from flask.testing import FlaskClient
+from app import utils, daos, services, views
+from app import models as app_models
+from app.utils import JSONConverter, XMLConverter, CSVConverter, DictionaryList2ObjectList, row2dict
 from time import time
-from datetime import datetime
+from datetime import datetime, date
 from model import models
+from sqlalchemy import event, create_engine
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import Session
 
 json_converter = JSONConverter()
+xml_converter = XMLConverter()
+csv_converter = CSVConverter()
+list_converter = DictionaryList2ObjectList()
 
 
 class MyProxyHack(object):
@@ -51,6 +69,17 @@ class MyProxyHack(object):
         return self.app(environ, start_response)
 
 
+class BufferedClient(FlaskClient):
+    """
+    Test client that consumes the whole body of every response, as a server does.
+    If not, streamed responses will keep their request context pushed
+    """
+
+    def open(self, *args, **kwargs):
+        kwargs['buffered'] = True
+        return super(BufferedClient, self).open(*args, **kwargs)
+
+
 class ApiTest(TestCase):
     """
     Generic class for all test concerning Flask on this API
@@ -60,6 +89,7 @@ class ApiTest(TestCase):
         app.app.config['TESTING'] = True
         app.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///foo.db'
         app.app.wsgi_app = MyProxyHack(app.app.wsgi_app)
+        app.app.test_client_class = BufferedClient
         return app.app
 
     def setUp(self):
@@ -427,17 +457,17 @@ class TestIndicator(ApiTest):
         response = self.client.delete("/cache")
         self.assertStatus(response, 204)
         response = self.client.get("/indicators/1/top?region=1&top=10")
-        spain = response.json[0]
-        france = response.json[1]
+        france = response.json[0]
+        spain = response.json[1]
         self.assertEquals(spain['iso3'], "ESP")
         self.assertEquals(spain['value_id'], "1")
         self.assertEquals(france['value_id'], "2")
         self.assertEquals(france['iso3'], "FRA")
         response = self.client.get("/indicators/1/top?region=3&top=1")
         self.assertEquals(len(response.json), 1)
-        spain = response.json[0]
-        self.assertEquals(spain['iso3'], "ESP")
-        self.assertEquals(spain['value_id'], "1")
+        france = response.json[0]
+        self.assertEquals(france['iso3'], "FRA")
+        self.assertEquals(france['value_id'], "2")
         response = self.client.delete("/countries")
         self.assertStatus(response, 204)
         response = self.client.delete("/cache")
@@ -3047,6 +3077,40 @@ class TestCSV(ApiTest):
         self.assertEquals(response.data, "is_part_of_id;type;faoURI;iso3;iso2;taxonomy_id;region;un_code;id\nNone;countries;None;ESP;ES;None;None;None;1;\n")
 
 
+class TestColumnar(ApiTest):
+    @unittest.skipIf(utils.pyarrow is None, 'pyarrow is not installed')
+    def test_arrow_and_parquet(self):
+        value = models.Value()
+        value.id = 1
+        value.value = '2.5'
+        time_object = models.Interval()
+        time_object.id = 1
+        time_object.value = '2012'
+        app.db.session.add(value)
+        app.db.session.add(time_object)
+        app.db.session.commit()
+        for i in range(3):
+            observation_json = json.dumps(dict(id=i, ref_time_id=1, value_id=1, indicator_id='HDI', region_id=i))
+            response = self.client.post("/observations", data=observation_json, content_type='application/json')
+            self.assertStatus(response, 201)
+        response = self.client.get("/observations?format=arrow")
+        self.assert200(response)
+        self.assertEquals(response.mimetype, 'application/vnd.apache.arrow.stream')
+        table = utils.pyarrow.ipc.open_stream(utils.pyarrow.py_buffer(response.data)).read_all()
+        self.assertEquals(table.num_rows, 3)
+        columns = table.to_pydict()
+        self.assertEquals(sorted(columns['id']), ['0', '1', '2'])
+        self.assertEquals(columns['value'], [2.5, 2.5, 2.5])
+        self.assertEquals(columns['ref_time'], ['2012', '2012', '2012'])
+        response = self.client.get("/observations", headers={'Accept': 'application/vnd.apache.parquet'})
+        self.assert200(response)
+        table = utils.pyarrow.parquet.read_table(utils.pyarrow.BufferReader(response.data))
+        self.assertEquals(table.num_rows, 3)
+        self.assertEquals(table.to_pydict()['region_id'], columns['region_id'])
+        response = self.client.get("/countries?format=arrow")
+        self.assertStatus(response, 406)
+
+
 class TestJSONP(ApiTest):
     def test_jsonp(self):
         topic_json = json.dumps(dict(
@@ -3062,11 +3126,925 @@ class TestJSONP(ApiTest):
         self.assertEquals(response.data, "callback(" + topic_json + ");")
 
 
+class TestJSONStream(unittest.TestCase):
+    def test_stream(self):
+        elements = [dict(id=i, name='element') for i in range(100)]
+        chunks = list(json_converter.list_to_json_stream(list_converter.convert(elements), chunk_size=256))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEquals(json.loads(''.join(chunks)), elements)
+        self.assertEquals(json_converter.list_to_json(iter(list_converter.convert(elements))), ''.join(chunks))
+        self.assertEquals(json_converter.list_to_json([]), "[\n]")
+
+
+class TestXMLStream(unittest.TestCase):
+    def test_stream(self):
+        elements = [dict(id=str(i), name='A & <B>', value=i * 0.5, starred=i % 2 == 0, unit=None) for i in range(100)]
+        chunks = list(xml_converter.list_to_xml_stream(list_converter.convert(elements), 'indicators', 'indicator',
+                                                       chunk_size=256))
+        self.assertTrue(len(chunks) > 1)
+        root = ElementTree.fromstring(''.join(chunks))
+        self.assertEquals(root.tag, 'indicators')
+        self.assertEquals(len(root), 100)
+        indicator = root[3]
+        self.assertEquals(indicator.tag, 'indicator')
+        self.assertEquals(indicator.find('id').text, '3')
+        self.assertEquals(indicator.find('name').text, 'A & <B>')
+        self.assertEquals(indicator.find('value').get('type'), 'float')
+        self.assertEquals(indicator.find('value').text, '1.5')
+        self.assertEquals(indicator.find('starred').text, 'false')
+        self.assertEquals(indicator.find('unit').get('type'), 'null')
+        self.assertEquals(xml_converter.list_to_xml([]), '<elements></elements>')
+
+
+class TestCSVStream(unittest.TestCase):
+    def test_stream(self):
+        elements = list_converter.convert([dict(id=str(i), name=u'Côte d\'Ivoire; "CIV"') for i in range(100)])
+        chunks = list(csv_converter.list_to_csv_stream(elements, chunk_size=256))
+        self.assertTrue(len(chunks) > 1)
+        rows = list(csv.reader(StringIO(''.join(chunks)), delimiter=';'))
+        self.assertEquals(rows[0], ['id', 'name'])
+        self.assertEquals(len(rows), 101)
+        self.assertEquals(rows[4], ['3', u'Côte d\'Ivoire; "CIV"'.encode('utf-8'), ''])
+        self.assertEquals(csv_converter.list_to_csv([]), '')
+
+
+class TestSerializer(unittest.TestCase):
+    def test_plans(self):
+        indicator = models.Indicator('HDI', 'increase', None, None, None, True)
+        indicator.last_update = datetime(2014, 3, 1)
+        translated = models.Indicator('DHI', 'decrease', None, None, None, False)
+        translated.name = 'Human development'
+        translated.measurement_unit = models.MeasurementUnit(1, 'units')
+        translated.other_parseable_fields = ['name', 'measurement_unit']
+        serialized = row2dict(indicator)
+        self.assertEquals(serialized['id'], 'HDI')
+        self.assertEquals(serialized['last_update'], (indicator.last_update - datetime(1970, 1, 1)).total_seconds()
+                          + utils.serializer.date_encoder.utc_offset)
+        self.assertFalse('name' in serialized)
+        serialized = row2dict(translated)
+        self.assertEquals(serialized['id'], 'DHI')
+        self.assertEquals(serialized['name'], 'Human development')
+        self.assertEquals(serialized['measurement_unit']['name'], 'units')
+        self.assertEquals(row2dict(indicator)['preferable_tendency'], 'increase')
+        self.assertEquals(row2dict(list_converter.convert([dict(iso3='ESP')])[0]), dict(iso3='ESP'))
+
+    def test_fields(self):
+        serializer = utils.Serializer()
+        indicator = models.Indicator('HDI', 'increase', None, None, None, True)
+        self.assertEquals(serializer.serialize(indicator, frozenset(['id', 'unknown'])), dict(id='HDI'))
+        for i in range(10):
+            serializer.serialize(indicator, frozenset(['id', 'unknown' + str(i)]))
+        self.assertEquals(len(serializer.plans), 2)
+
+    def test_dates(self):
+        encoder = utils.DateEncoder(utc_offset=0)
+        self.assertEquals(encoder.encode(datetime(2014, 3, 1, 12, 30)), 1393677000.0)
+        self.assertEquals(encoder.encode(datetime(2014, 3, 1).date()), 1393632000.0)
+        self.assertEquals(utils.DateEncoder(utc_offset=-3600).encode(datetime(2014, 7, 1).date()), 1404169200.0)
+        self.assertEquals(utils.DateEncoder(iso=True).encode(datetime(2014, 3, 1, 12, 30)), '2014-03-01T12:30:00')
+        encoder = utils.DateEncoder(utc_offset=-3600)
+        self.assertEquals(encoder.decode(1404169200), datetime(2014, 7, 1))
+        self.assertEquals(encoder.encode(encoder.decode(1404172800)), 1404172800.0)
+        serializer = utils.Serializer(utils.DateEncoder(iso=True))
+        indicator = models.Indicator('HDI', 'increase', None, None, None, True)
+        indicator.last_update = datetime(2014, 3, 1)
+        self.assertEquals(serializer.serialize(indicator)['last_update'], '2014-03-01T00:00:00')
+
+
+class TestViewModel(ApiTest):
+    def test_view(self):
+        indicator = models.Indicator('HDI', 'increase', None, None, None, True)
+        view = utils.ViewModel(indicator, name='Human development')
+        view.tendency = 1
+        self.assertEquals(view.id, 'HDI')
+        self.assertEquals(view.name, 'Human development')
+        self.assertFalse(hasattr(indicator, 'name'))
+        self.assertFalse(hasattr(indicator, 'tendency'))
+        self.assertEquals(view, indicator)
+        self.assertTrue(view in [utils.ViewModel(indicator)])
+        serialized = row2dict(view)
+        self.assertEquals(serialized['id'], 'HDI')
+        self.assertEquals(serialized['name'], 'Human development')
+        self.assertEquals(serialized['tendency'], 1)
+        self.assertEquals(row2dict(view, frozenset(['name'])), {'name': 'Human development'})
+
+    def test_get_does_not_dirty_session(self):
+        country_json = json.dumps(dict(name='Spain', iso2='ES', iso3='ESP'))
+        indicator_json = json.dumps(dict(id='1'))
+        translation_json = json.dumps(dict(name='Rural Population', description='Something', lang_code='en',
+                                           indicator_id='1'))
+        response = self.client.post("/countries", data=country_json, content_type='application/json')
+        self.assertStatus(response, 201)
+        response = self.client.post("/indicators", data=indicator_json, content_type='application/json')
+        self.assertStatus(response, 201)
+        response = self.client.post("/indicators/translations", data=translation_json, content_type='application/json')
+        self.assertStatus(response, 201)
+        country_id = self.client.get("/countries/ESP").json['id']
+        observation_json = json.dumps(dict(id='1', indicator_id='1', region_id=country_id))
+        response = self.client.post("/observations", data=observation_json, content_type='application/json')
+        self.assertStatus(response, 201)
+        dirty = []
+
+        def before_commit(session):
+            dirty.extend(session.dirty)
+        event.listen(Session, 'before_commit', before_commit)
+        try:
+            response = self.client.get("/observations/ESP/1")
+            self.assert200(response)
+            self.assertEquals(response.json[0]['indicator']['name'], "Rural Population")
+            self.assertEquals(response.json[0]['country']['iso3'], "ESP")
+            response = self.client.get("/indicators")
+            self.assertEquals(response.json[0].get('name'), "Rural Population")
+        finally:
+            event.remove(Session, 'before_commit', before_commit)
+        self.assertEquals(dirty, [])
+
+
+class TestLoadingProfiles(ApiTest):
+    def test_detail(self):
+        indicator = models.Indicator('1', 'increase', None, None, None, True)
+        indicator.measurement_unit = models.MeasurementUnit(1, 'units')
+        app.db.session.add(indicator)
+        for i in range(5):
+            observation = models.Observation(str(i))
+            observation.indicator = indicator
+            observation.ref_time = models.YearInterval(2000 + i)
+            observation.value = models.Value()
+            observation.value.value = str(i)
+            app.db.session.add(observation)
+        app.db.session.commit()
+        app.db.session.expunge_all()
+        dao = daos.ObservationDAO()
+        dao.set_session(app.db.session)
+        statements = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(app.db.engine, 'before_cursor_execute', before_execute)
+        try:
+            observations = dao.query('detail').all()
+            for observation in observations:
+                self.assertEquals(observation.ref_time.year, 2000 + int(observation.id))
+                self.assertEquals(observation.value.value, observation.id)
+                self.assertEquals(observation.indicator.measurement_unit.name, 'units')
+        finally:
+            event.remove(app.db.engine, 'before_cursor_execute', before_execute)
+        self.assertEquals(len(observations), 5)
+        self.assertEquals(len(statements), 1)
+
+
+class TestCursorPagination(ApiTest):
+    def test_cursor(self):
+        country_json = json.dumps(dict(name='Spain', iso2='ES', iso3='ESP'))
+        response = self.client.post("/countries", data=country_json, content_type='application/json')
+        self.assertStatus(response, 201)
+        country_id = self.client.get("/countries/ESP").json['id']
+        for i in range(5):
+            observation_json = json.dumps(dict(id='OBS' + str(i), indicator_id='1', region_id=country_id))
+            response = self.client.post("/observations", data=observation_json, content_type='application/json')
+            self.assertStatus(response, 201)
+        ids = []
+        url = "/observations/ESP?limit=2&cursor="
+        while url is not None:
+            response = self.client.get(url)
+            self.assert200(response)
+            ids.extend(observation['id'] for observation in response.json)
+            link = response.headers.get('Link')
+            url = link[link.index('/observations'):link.index('>')] if link is not None else None
+        self.assertEquals(ids, ['OBS0', 'OBS1', 'OBS2', 'OBS3', 'OBS4'])
+        response = self.client.get("/observations/ESP?limit=2&offset=2")
+        self.assertEquals([observation['id'] for observation in response.json], ['OBS2', 'OBS3'])
+        self.assertTrue('Link' not in response.headers)
+        response = self.client.get("/observations/ESP?cursor=invalid")
+        self.assert400(response)
+
+
+class TestDimensionRegistry(ApiTest):
+    def test_resolve(self):
+        index = views.dimension_registry
+        country_json = json.dumps(dict(name='Spain', iso2='ES', iso3='ESP'))
+        response = self.client.post("/countries", data=country_json, content_type='application/json')
+        self.assertStatus(response, 201)
+        region_json = json.dumps(dict(un_code=150))
+        response = self.client.post("/regions", data=region_json, content_type='application/json')
+        self.assertStatus(response, 201)
+        indicator_json = json.dumps(dict(id='INDICATOR'))
+        response = self.client.post("/indicators", data=indicator_json, content_type='application/json')
+        self.assertStatus(response, 201)
+        country_id = self.client.get("/countries/ESP").json['id']
+        self.assertEquals(index.resolve('ESP'), (services.DimensionRegistry.COUNTRY, country_id))
+        self.assertEquals(index.resolve('INDICATOR'), (services.DimensionRegistry.INDICATOR, 'INDICATOR'))
+        self.assertEquals(index.resolve('150')[0], services.DimensionRegistry.REGION)
+        self.assertEquals(index.resolve('MISSING'), (None, None))
+        statements = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(app.db.engine, 'before_cursor_execute', before_execute)
+        try:
+            self.assert200(self.client.get("/observations/ESP"))
+        finally:
+            event.remove(app.db.engine, 'before_cursor_execute', before_execute)
+        self.assertEquals(len(statements), 1)
+        response = self.client.delete("/countries/ESP")
+        self.assertStatus(response, 204)
+        self.assertEquals(index.resolve('ESP'), (None, None))
+
+    def test_lookups(self):
+        registry = views.dimension_registry
+        country_json = json.dumps(dict(name='Spain', iso2='ES', iso3='ESP'))
+        response = self.client.post("/countries", data=country_json, content_type='application/json')
+        self.assertStatus(response, 201)
+        for i in range(3):
+            indicator_json = json.dumps(dict(id=str(i), measurement_unit_id=1 if i < 2 else 2))
+            response = self.client.post("/indicators", data=indicator_json, content_type='application/json')
+            self.assertStatus(response, 201)
+        country = registry.get(services.DimensionRegistry.COUNTRY, 'ESP', 'iso3')
+        self.assertEquals(registry.get(services.DimensionRegistry.COUNTRY, 'ES', 'iso2'), country)
+        self.assertEquals(registry.get(services.DimensionRegistry.COUNTRY, country.id), country)
+        self.assertEquals(registry.get(services.DimensionRegistry.REGION, str(country.id)), country)
+        self.assertEquals(len(registry.get_all(services.DimensionRegistry.INDICATOR)), 3)
+        self.assertEquals(registry.attach(country).observations, [])
+        statements = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(app.db.engine, 'before_cursor_execute', before_execute)
+        try:
+            response = self.client.get("/indicators/0/compatible")
+        finally:
+            event.remove(app.db.engine, 'before_cursor_execute', before_execute)
+        self.assert200(response)
+        self.assertEquals([indicator['id'] for indicator in response.json], ['1'])
+        self.assertFalse([statement for statement in statements if 'FROM indicators' in statement])
+        self.assert404(self.client.get("/indicators/missing/compatible"))
+
+    def test_invalidate_after_commit(self):
+        registry = views.dimension_registry
+        tm = services.TransactionManager()
+        self.assertEquals(registry.get_all(services.DimensionRegistry.INDICATOR), [])
+        version = registry.version
+        with tm.unit_of_work() as session:
+            session.add(models.Indicator('INDICATOR', 'increase', None, None, None, True))
+            session.flush()
+            self.assertEquals(registry.version, version)
+            registry.invalidate_after_commit()
+            self.assertEquals(registry.version, version)
+        self.assertEquals(registry.version, version + 1)
+        self.assertEquals(len(registry.get_all(services.DimensionRegistry.INDICATOR)), 1)
+        try:
+            with tm.unit_of_work() as session:
+                session.add(models.Indicator('OTHER', 'increase', None, None, None, True))
+                session.flush()
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEquals(registry.version, version + 1)
+        self.assertEquals(len(registry.get_all(services.DimensionRegistry.INDICATOR)), 1)
+
+
+class TestAveragesByPeriod(ApiTest):
+    def test_averages(self):
+        world = models.Region()
+        world.un_code = 1
+        region = models.Region()
+        region.un_code = 150
+        app.db.session.add(world)
+        app.db.session.add(region)
+        app.db.session.flush()
+        country = models.Country('ES', 'ESP')
+        country.is_part_of_id = region.id
+        indicator = models.Indicator('INDICATOR', 'increase', None, None, None, True)
+        app.db.session.add(country)
+        app.db.session.add(indicator)
+        values = [('2000', '1'), ('2000', '2'), ('2001', '6'), ('2001', None)]
+        for i in range(len(values)):
+            observation = models.Observation(str(i))
+            observation.indicator = indicator
+            observation.region = country
+            observation.ref_time = models.YearInterval(int(values[i][0]))
+            observation.ref_time.value = values[i][0]
+            observation.value = models.Value()
+            observation.value.value = values[i][1]
+            app.db.session.add(observation)
+        observation = models.Observation('INSTANT')  # no period, only in the overall average
+        observation.indicator = indicator
+        observation.region = country
+        observation.ref_time = models.Instant()
+        observation.value = models.Value()
+        observation.value.value = '9'
+        app.db.session.add(observation)
+        app.db.session.commit()
+        expected = [dict(time='all', average=4.5), dict(time='2000', average=1.5), dict(time='2001', average=6.0)]
+        response = self.client.get("/observations/ESP/INDICATOR/average")
+        self.assert200(response)
+        self.assertEquals(response.json, expected)
+        response = self.client.get("/observations/INDICATOR/ESP/average")
+        self.assertEquals(response.json, expected)
+        response = self.client.get("/observations/150/INDICATOR/average")
+        self.assertEquals(response.json, expected)
+        response = self.client.get("/observations/MISSING/INDICATOR/average")
+        self.assert400(response)
+
+
+class TestObservationPeriods(ApiTest):
+    def periods(self):
+        return dict((period.observation_id, (period.start_date, period.end_date))
+                    for period in app.db.session.query(app_models.ObservationPeriod))
+
+    def test_periods(self):
+        indicator = models.Indicator('INDICATOR', 'increase', None, None, None, True)
+        app.db.session.add(indicator)
+        interval = models.Interval()
+        interval.start_time = datetime(2012, 6, 12)
+        interval.end_time = datetime(2014, 4, 1)
+        year = models.YearInterval(2010)
+        instant = models.Instant()
+        instant.timestamp = datetime(2013, 1, 1, 12)
+        for id, ref_time in (('INTERVAL', interval), ('YEAR', year), ('INSTANT', instant), ('NONE', None)):
+            observation = models.Observation(id)
+            observation.indicator = indicator
+            observation.ref_time = ref_time
+            app.db.session.add(observation)
+        app.db.session.commit()
+        self.assertEquals(self.periods(), {
+            'INTERVAL': (date(2012, 6, 12), date(2014, 4, 1)),
+            'YEAR': (date(2010, 1, 1), date(2010, 12, 31)),
+            'INSTANT': (date(2013, 1, 1), date(2013, 1, 1))
+        })
+        response = self.client.get("/indicators/INDICATOR/range?from=20100601&to=20121231")
+        self.assert200(response)
+        self.assertEquals(sorted(observation['id'] for observation in response.json), ['INTERVAL', 'YEAR'])
+        response = self.client.put("/observations/YEAR", data=json.dumps(dict(ref_time_id=instant.id)),
+                                   content_type='application/json')
+        self.assertStatus(response, 204)
+        app.db.session.commit()
+        self.assertEquals(self.periods()['YEAR'], (date(2013, 1, 1), date(2013, 1, 1)))
+        app.db.session.delete(app.db.session.query(models.Observation).get('INSTANT'))
+        app.db.session.commit()
+        self.assertTrue('INSTANT' not in self.periods())
+
+    def test_batches(self):
+        years = [models.YearInterval(year) for year in (2010, 2011, 2012)]
+        app.db.session.add_all(years)
+        app.db.session.commit()
+        batch_size = app_models.BULK_BATCH_SIZE
+        app_models.BULK_BATCH_SIZE = 2
+        try:
+            app_models.store_periods(app.db.session, {'A': years[0].id, 'B': years[1].id, 'C': years[2].id})
+            self.assertEquals(self.periods(), {
+                'A': (date(2010, 1, 1), date(2010, 12, 31)),
+                'B': (date(2011, 1, 1), date(2011, 12, 31)),
+                'C': (date(2012, 1, 1), date(2012, 12, 31))
+            })
+        finally:
+            app_models.BULK_BATCH_SIZE = batch_size
+
+    def test_backfill(self):
+        observation = models.Observation('YEAR')
+        observation.ref_time = models.YearInterval(2010)
+        app.db.session.add(observation)
+        app.db.session.commit()
+        app.db.session.execute(app_models.ObservationPeriod.__table__.delete())
+        app.db.session.commit()
+        self.assertEquals(services.ObservationService().backfill_periods(), 1)
+        self.assertEquals(self.periods(), {'YEAR': (date(2010, 1, 1), date(2010, 12, 31))})
+
+
+class TestNumericValues(ApiTest):
+    def numbers(self):
+        return dict((number.value_id, number.number) for number in app.db.session.query(app_models.NumericValue))
+
+    def test_numbers(self):
+        service = services.ValueService()
+        values = []
+        for i, text in enumerate(('10', '20', 'null', None, 'nan')):
+            value = models.Value()
+            value.id = i + 1
+            value.value = text
+            values.append(value)
+        service.insert_many(values)
+        self.assertEquals(self.numbers(), {1: 10.0, 2: 20.0})
+        self.assertEquals(service.get_by_code(1).number, 10.0)
+        self.assertEquals(service.get_by_code(3).number, None)
+        service.update_many([utils.Struct(id=3, value='5')])
+        self.assertEquals(self.numbers(), {1: 10.0, 2: 20.0, 3: 5.0})
+        response = self.client.put("/values/1", data=json.dumps(dict(id=1, value='7.5')),
+                                   content_type='application/json')
+        self.assertStatus(response, 204)
+        self.assertEquals(self.numbers()[1], 7.5)
+        for i in range(1, 5):
+            observation = models.Observation('OBS' + str(i))
+            observation.indicator_id = 'INDICATOR'
+            observation.value_id = i
+            app.db.session.add(observation)
+        app.db.session.commit()
+        dao = daos.IndicatorDAO()
+        dao.set_session(app.db.session)
+        self.assertAlmostEquals(dao.get_average('INDICATOR')[0], 32.5 / 3)
+        observations = services.ObservationService().get_by_indicator('INDICATOR')
+        self.assertEquals(sorted(observation.id for observation in observations), ['OBS1', 'OBS2', 'OBS3'])
+        self.assertAlmostEquals(views.observations_average(observations), 32.5 / 3)
+        self.assertEquals(service.delete_where(models.Value.id == 2), 1)
+        self.assertEquals(self.numbers(), {1: 7.5, 3: 5.0})
+
+    def test_batches(self):
+        batch_size = app_models.BULK_BATCH_SIZE
+        app_models.BULK_BATCH_SIZE = 2
+        try:
+            app_models.store_numbers(app.db.session, {1: '1', 2: 'null', 3: '3', 4: '4', 5: '5'})
+            self.assertEquals(self.numbers(), {1: 1.0, 3: 3.0, 4: 4.0, 5: 5.0})
+            app_models.store_numbers(app.db.session, {1: None, 3: '6', 5: None})
+            self.assertEquals(self.numbers(), {3: 6.0, 4: 4.0})
+        finally:
+            app_models.BULK_BATCH_SIZE = batch_size
+
+    def test_backfill(self):
+        value = models.Value()
+        value.value = '1.5'
+        app.db.session.add(value)
+        app.db.session.commit()
+        app.db.session.execute(app_models.NumericValue.__table__.delete())
+        app.db.session.commit()
+        self.assertEquals(services.ValueService().backfill_numbers(), 1)
+        self.assertEquals(self.numbers(), {value.id: 1.5})
+
+
+class TestRegionClosure(ApiTest):
+    def test_closure(self):
+        regions = []
+        for un_code in (1, 150, 39):
+            region = models.Region()
+            region.un_code = un_code
+            region.is_part_of_id = regions[-1].id if len(regions) > 0 else None
+            app.db.session.add(region)
+            app.db.session.flush()
+            regions.append(region)
+        spain = models.Country('ES', 'ESP')
+        spain.is_part_of_id = regions[-1].id
+        app.db.session.add(spain)
+        app.db.session.commit()
+        depths = dict(((row.ancestor_id, row.descendant_id), row.depth)
+                      for row in app.db.session.query(app_models.RegionClosure))
+        self.assertEquals(depths[(regions[0].id, spain.id)], 3)
+        self.assertEquals(depths[(regions[1].id, spain.id)], 2)
+        self.assertEquals(depths[(spain.id, spain.id)], 0)
+        response = self.client.get("/regions/150/countries")
+        self.assert200(response)
+        self.assertEquals([country['iso3'] for country in response.json], ['ESP'])
+        spain.is_part_of_id = None
+        app.db.session.commit()
+        response = self.client.delete("/cache")
+        self.assertStatus(response, 204)
+        response = self.client.get("/regions/150/countries")
+        self.assertEquals(response.json, [])
+
+    def test_global(self):
+        world = models.Region()
+        world.un_code = 1
+        app.db.session.add(world)
+        app.db.session.flush()
+        europe = models.Region()
+        europe.un_code = 150
+        europe.is_part_of_id = world.id
+        app.db.session.add(europe)
+        app.db.session.flush()
+        spain = models.Country('ES', 'ESP')
+        spain.is_part_of_id = europe.id
+        app.db.session.add(spain)
+        for id, region in (('WORLD', world), ('EUROPE', europe), ('SPAIN', spain)):
+            observation = models.Observation(id)
+            observation.indicator_id = 'INDICATOR'
+            observation.region = region
+            app.db.session.add(observation)
+        app.db.session.commit()
+        dao = daos.ObservationDAO()
+        dao.set_session(app.db.session)
+        observations = dao.get_by_region_and_indicator(world.id, 'INDICATOR', None, None)
+        self.assertEquals([element.id for element in observations], ['SPAIN'])
+
+
+class TestRegionsWithData(ApiTest):
+    def test_coverage(self):
+        world = models.Region()
+        world.un_code = 1
+        app.db.session.add(world)
+        app.db.session.flush()
+        regions = {}
+        for un_code in (150, 2):
+            region = models.Region()
+            region.un_code = un_code
+            region.is_part_of_id = world.id
+            app.db.session.add(region)
+            regions[un_code] = region
+        app.db.session.flush()
+        spain = models.Country('ES', 'ESP')
+        spain.is_part_of_id = regions[150].id
+        app.db.session.add(spain)
+        app.db.session.add(models.Indicator('EMPTY', 'increase', None, None, None, True))
+        observation = models.Observation('1')
+        observation.indicator = models.Indicator('INDICATOR', 'increase', None, None, None, True)
+        observation.region = spain
+        app.db.session.add(observation)
+        app.db.session.commit()
+        response = self.client.get("/indicators/INDICATOR/regions_with_data")
+        self.assert200(response)
+        self.assertEquals([element['un_code'] for element in response.json], [150, 1])
+        response = self.client.get("/indicators/INDICATOR/regions_without_data")
+        self.assertEquals([element['un_code'] for element in response.json], [2])
+        response = self.client.get("/indicators/EMPTY/regions_with_data")
+        self.assertEquals(response.json, [])
+        response = self.client.get("/indicators/EMPTY/regions_without_data")
+        self.assertEquals([element['un_code'] for element in response.json], [150, 2, 1])
+        self.assert404(self.client.get("/indicators/MISSING/regions_without_data"))
+
+
+class TestBulkOperations(ApiTest):
+    def test_observations(self):
+        service = services.ObservationService()
+        years = [models.YearInterval(year) for year in (2010, 2011)]
+        app.db.session.add_all(years)
+        app.db.session.commit()
+        observations = []
+        for i in range(3):
+            observation = models.Observation('OBS' + str(i))
+            observation.ref_time_id = years[0].id
+            observations.append(observation)
+        service.insert_many(observations)
+        periods = dict((period.observation_id, period.start_date)
+                       for period in app.db.session.query(app_models.ObservationPeriod))
+        self.assertEquals(periods, {'OBS0': date(2010, 1, 1), 'OBS1': date(2010, 1, 1), 'OBS2': date(2010, 1, 1)})
+        service.update_many([utils.Struct(id='OBS1', ref_time_id=years[1].id, dataset_id='D'),
+                             utils.Struct(id='MISSING', ref_time_id=years[1].id, dataset_id='D')])
+        self.assertEquals(service.get_by_code('OBS1').dataset_id, 'D')
+        self.assertEquals(app.db.session.query(app_models.ObservationPeriod).get('OBS1').start_date, date(2011, 1, 1))
+        self.assertEquals(app.db.session.query(app_models.ObservationPeriod).get('MISSING'), None)
+        service.update_many([utils.Struct(id='OBS1', ref_time_id=None), utils.Struct(id='OBS2', dataset_id='E')])
+        self.assertEquals(service.get_by_code('OBS1').ref_time_id, None)
+        self.assertEquals(service.get_by_code('OBS1').dataset_id, 'D')
+        self.assertEquals(app.db.session.query(app_models.ObservationPeriod).get('OBS1'), None)
+        service.update_many([utils.Struct(id='OBS1', ref_time_id=years[1].id)])
+        self.assertEquals(service.delete_where(models.Observation.ref_time_id == years[0].id), 2)
+        self.assertEquals([element.id for element in service.get_all()], ['OBS1'])
+        self.assertEquals([period.observation_id for period in app.db.session.query(app_models.ObservationPeriod)],
+                          ['OBS1'])
+
+    def test_countries(self):
+        for iso2, iso3 in (('ES', 'ESP'), ('FR', 'FRA')):
+            app.db.session.add(models.Country(iso2, iso3))
+        region = models.Region()  # not the first one, that is the global region
+        region.un_code = 150
+        app.db.session.add(region)
+        app.db.session.commit()
+        service = services.CountryService()
+        service.update_many([utils.Struct(iso3='ESP', iso2='SP', is_part_of_id=region.id)])
+        self.assertEquals(service.get_by_code('ESP').iso2, 'SP')
+        self.assertEquals(service.get_by_code('FRA').iso2, 'FR')
+        response = self.client.get("/regions/150/countries")
+        self.assertEquals([country['iso3'] for country in response.json], ['ESP'])
+        self.assertEquals(service.delete_where(models.Country.iso3 == 'FRA'), 1)
+        self.assertEquals([country.iso3 for country in service.get_all()], ['ESP'])
+        self.assertEquals(len(services.RegionService().get_all()), 2)
+        statements = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(app.db.engine, 'before_cursor_execute', before_execute)
+        try:
+            services.RegionService().delete_all()
+        finally:
+            event.remove(app.db.engine, 'before_cursor_execute', before_execute)
+        cleared = [i for i, statement in enumerate(statements) if statement.startswith('UPDATE regions SET is_part_of_id')]
+        deleted = [i for i, statement in enumerate(statements) if statement.startswith('DELETE FROM')]
+        self.assertTrue(len(cleared) > 0 and cleared[-1] < deleted[0])
+        self.assertEquals(app.db.session.query(models.Dimension).count(), 0)
+        self.assertEquals(app.db.session.query(app_models.RegionClosure).count(), 0)
+
+    def test_dependents(self):
+        country = models.Country('ES', 'ESP')
+        country.translations.append(models.RegionTranslation('en', 'Spain'))
+        indicator = models.Indicator('I1')
+        indicator.translations.append(models.IndicatorTranslation('en', 'Indicator'))
+        dataset = models.Dataset('D1')
+        dataset.indicators.append(indicator)
+        observation = models.Observation('OBS1')
+        observation.region = country
+        observation.indicator = indicator
+        app.db.session.add_all([country, dataset, observation])
+        app.db.session.commit()
+        self.assertEquals(services.CountryService().delete_where(models.Country.iso3 == 'ESP'), 1)
+        self.assertEquals(services.IndicatorService().delete_where(models.Indicator.id == 'I1'), 1)
+        app.db.session.expire_all()
+        self.assertEquals(app.db.session.query(models.RegionTranslation).count(), 0)
+        self.assertEquals(app.db.session.query(models.IndicatorTranslation).count(), 0)
+        self.assertEquals(app.db.session.query(models.Dataset).get('D1').indicators, [])
+        observation = services.ObservationService().get_by_code('OBS1')
+        self.assertEquals((observation.region_id, observation.indicator_id), (None, None))
+
+
+class TestUnitOfWork(ApiTest):
+    def test_reads(self):
+        app.db.session.add(models.Country('ES', 'ESP'))
+        app.db.session.commit()
+        service = services.CountryService()
+        spain = service.get_by_code('ESP')
+        commits = []
+        statements = []
+
+        def before_commit(session):
+            commits.append(session)
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(Session, 'before_commit', before_commit)
+        event.listen(app.db.engine, 'before_cursor_execute', before_execute)
+        try:
+            self.assertEquals(len(service.get_all()), 1)
+            self.assertEquals(spain.iso2, 'ES')
+        finally:
+            event.remove(Session, 'before_commit', before_commit)
+            event.remove(app.db.engine, 'before_cursor_execute', before_execute)
+        self.assertEquals(commits, [])
+        self.assertEquals(len(statements), 1)
+
+    def test_writes(self):
+        service = services.CountryService()
+        tm = services.TransactionManager()
+        with tm.unit_of_work():
+            service.insert(models.Country('ES', 'ESP'))
+            with tm.unit_of_work():
+                service.insert(models.Country('FR', 'FRA'))
+            app.db.session.rollback()
+        self.assertEquals(service.get_all(), [])
+        try:
+            with tm.unit_of_work():
+                service.insert(models.Country('ES', 'ESP'))
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEquals(service.get_all(), [])
+        with tm.unit_of_work():
+            service.insert(models.Country('ES', 'ESP'))
+            service.insert(models.Country('FR', 'FRA'))
+        app.db.session.rollback()
+        self.assertEquals(len(service.get_all()), 2)
+        service.delete('FRA')
+        app.db.session.rollback()
+        self.assertEquals([country.iso3 for country in service.get_all()], ['ESP'])
+
+
+class TestReadReplicas(ApiTest):
+    def setUp(self):
+        super(TestReadReplicas, self).setUp()
+        descriptor, self.replica_path = tempfile.mkstemp(suffix='.db')
+        os.close(descriptor)
+        app.app.config['SQLALCHEMY_REPLICA_URIS'] = ['sqlite:///' + self.replica_path]
+        services.read_replicas.dispose()
+        self.replica = services.read_replicas.get_engines()[0]
+        app.db.Model.metadata.create_all(self.replica)
+
+    def tearDown(self):
+        app.app.config['SQLALCHEMY_REPLICA_URIS'] = []
+        app.app.config['READ_YOUR_WRITES_SECONDS'] = 0
+        services.read_replicas.dispose()
+        os.remove(self.replica_path)
+        super(TestReadReplicas, self).tearDown()
+
+    def test_routing(self):
+        app.db.session.add(models.Country('ES', 'ESP'))
+        app.db.session.commit()
+        self.replica.execute(models.Dimension.__table__.insert(), id=1, type='countries')
+        self.replica.execute(models.Region.__table__.insert(), id=1)
+        self.replica.execute(models.Country.__table__.insert(), id=1, iso2='XX', iso3='ESP')
+        services.read_replicas.remove()
+        response = self.client.get("/countries")
+        self.assertEquals([country['iso2'] for country in response.json], ['XX'])
+        response = self.client.put("/countries/ESP", data=json.dumps(dict(iso2='SP')), content_type='application/json')
+        self.assertStatus(response, 204)
+        self.assertEquals(app.db.session.query(models.Country).one().iso2, 'SP')
+        services.read_replicas.remove()
+        app.db.session.remove()
+        response = self.client.get("/countries")
+        self.assertEquals([country['iso2'] for country in response.json], ['XX'])
+
+    def test_read_your_writes(self):
+        app.app.config['READ_YOUR_WRITES_SECONDS'] = 60
+        app.db.session.add(models.Country('ES', 'ESP'))
+        app.db.session.commit()
+        response = self.client.put("/countries/ESP", data=json.dumps(dict(iso2='SP')), content_type='application/json')
+        self.assertStatus(response, 204)
+        self.assertTrue(views.PRIMARY_READS_COOKIE in response.headers.get('Set-Cookie'))
+        services.read_replicas.remove()
+        app.db.session.remove()
+        response = self.client.get("/countries")
+        self.assertEquals([country['iso2'] for country in response.json], ['SP'])
+
+    def test_registry(self):
+        response = self.client.post("/indicators", data=json.dumps(dict(id='INDICATOR')),
+                                    content_type='application/json')
+        self.assertStatus(response, 201)
+        self.assertEquals(views.dimension_registry.get_id(services.DimensionRegistry.INDICATOR, 'INDICATOR'),
+                          'INDICATOR')
+
+
+class TestPoolMonitor(ApiTest):
+    class Logger(object):
+        def __init__(self):
+            self.messages = []
+
+        def warning(self, message, *args):
+            self.messages.append(('warning', message % args))
+
+        def info(self, message, *args):
+            self.messages.append(('info', message % args))
+
+    def test_endpoint(self):
+        response = self.client.get("/countries")
+        self.assert200(response)
+        response = self.client.get("/pool")
+        self.assert200(response)
+        self.assertEquals(response.json['pid'], os.getpid())
+        pool = [pool for pool in response.json['pools'] if pool['name'].endswith('foo.db')][0]
+        self.assertTrue(pool['checkouts'] > 0)
+        self.assertTrue(pool['connects'] > 0)
+
+    def test_saturation(self):
+        logger = self.Logger()
+        monitor = utils.PoolMonitor(logger, 0.5)
+        engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1)
+        monitor.watch(engine.pool, 'memory', True)
+        monitor.watch(engine.pool, 'memory', True)
+        connection = engine.connect()
+        self.assertRaises(TimeoutError, engine.connect)
+        connection.invalidate()
+        connection.close()
+        engine.connect().close()
+        stats = monitor.stats()['pools'][0]
+        self.assertEquals(len(monitor.stats()['pools']), 1)
+        self.assertEquals((stats['checkouts'], stats['checkins'], stats['checked_out']), (2, 2, 0))
+        self.assertEquals((stats['failed_checkouts'], stats['connects'], stats['invalidations']), (1, 2, 1))
+        self.assertEquals(stats['peak_checked_out'], 1)
+        self.assertEquals([level for level, message in logger.messages], ['warning', 'info'])
+
+
+class TestQueryIndexes(ApiTest):
+    def test_create(self):
+        with app.db.engine.begin() as connection:
+            self.assertEquals(app_models.missing_indexes(connection), [])
+            connection.execute('DROP INDEX ix_observations_indicator_region')
+            connection.execute('CREATE INDEX ix_other_name ON observations (region_id, indicator_id, dataset_id)')
+            connection.execute('DROP INDEX ix_observations_region_indicator')
+            missing = app_models.create_missing_indexes(connection)
+            self.assertEquals([index.name for index in missing], ['ix_observations_indicator_region'])
+            self.assertEquals(app_models.missing_indexes(connection), [])
+
+    def test_explain(self):
+        connection = app.db.session.connection()
+        self.assertEquals(daos.full_scans(connection, 'SELECT * FROM observations WHERE indicator_id = ?', ('1',)),
+                          [])
+        self.assertEquals(daos.full_scans(connection, 'SELECT * FROM observations WHERE slice_id = ?', ('1',)),
+                          ['observations'])
+        results = create_indexes.explain_hot_queries(app.db.session())
+        self.assertEquals(sorted(set(name for name, statement, tables in results)),
+                          sorted(name for name, call in create_indexes.HOT_QUERIES))
+        for name, statement, tables in results:
+            self.assertTrue('observations' not in tables, name)
+
+
+class TestCompiledLookups(ApiTest):
+    def test_lookups(self):
+        for iso2, iso3 in (('ES', 'ESP'), ('FR', 'FRA')):
+            app.db.session.add(models.Country(iso2, iso3))
+        app.db.session.commit()
+        spain = app.db.session.query(models.Country).filter_by(iso3='ESP').one()
+        app.db.session.add(models.RegionTranslation('es', u'Espa\xf1a', spain.id))
+        app.db.session.commit()
+        dao = daos.CountryDAO()
+        dao.set_session(app.db.session)
+        self.assertEquals(dao.get_by_code('ESP').id, spain.id)
+        self.assertEquals(dao.get_by_code('FRA').iso2, 'FR')
+        self.assertEquals(dao.get_by_code('ITA'), None)
+        self.assertEquals(dao.get_by_id(spain.id).iso3, 'ESP')
+        region_dao = daos.RegionDAO()
+        region_dao.set_session(app.db.session)
+        self.assertTrue(isinstance(region_dao.get_by_artificial_code(spain.id), models.Country))
+        translation_dao = daos.RegionTranslationDAO()
+        translation_dao.set_session(app.db.session)
+        self.assertEquals(translation_dao.get_by_codes(spain.id, 'es').name, u'Espa\xf1a')
+        self.assertEquals(translation_dao.get_by_codes(spain.id, 'en'), None)
+        statement, compiled_cache = daos.COMPILED_LOOKUPS[(models.Country, ('iso3',))]
+        self.assertEquals(len(compiled_cache), 1)
+        self.assertEquals(daos.first_by(app.db.session, models.Country, iso2=None), None)
+
+
+class TestNDJSON(ApiTest):
+    def test_ndjson(self):
+        for i in range(3):
+            observation_json = json.dumps(dict(id=i, dataset_id=i))
+            response = self.client.post("/observations", data=observation_json, content_type='application/json')
+            self.assertStatus(response, 201)
+        response = self.client.get("/observations?format=ndjson")
+        self.assert200(response)
+        self.assertEquals(response.mimetype, 'application/x-ndjson')
+        lines = response.data.splitlines()
+        self.assertEquals(len(lines), 3)
+        self.assertEquals(sorted(json.loads(line)['id'] for line in lines), ['0', '1', '2'])
+        response = self.client.get("/countries", headers={'Accept': 'application/x-ndjson'})
+        self.assert200(response)
+        self.assertEquals(response.data, '')
+
+
+class TestSparseFieldsets(ApiTest):
+    def test_fields(self):
+        for i in range(3):
+            observation_json = json.dumps(dict(id=i, dataset_id=i))
+            response = self.client.post("/observations", data=observation_json, content_type='application/json')
+            self.assertStatus(response, 201)
+        response = self.client.get("/observations?fields=id,dataset_id")
+        self.assert200(response)
+        observations = json.loads(response.data)
+        self.assertEquals(len(observations), 3)
+        for observation in observations:
+            self.assertEquals(sorted(observation.keys()), ['dataset_id', 'id'])
+        response = self.client.get("/observations?format=csv&fields=id")
+        self.assert200(response)
+        self.assertEquals(response.data.splitlines()[0], 'id')
+        response = self.client.get("/observations?format=xml&fields=id")
+        self.assert200(response)
+        self.assertEquals(len(ElementTree.fromstring(response.data).findall('observation/id')), 3)
+        self.assertEquals(len(ElementTree.fromstring(response.data).findall('observation/dataset_id')), 0)
+
+    def test_row2dict(self):
+        observation = models.Observation('OBS')
+        observation.dataset_id = 'DATASET'
+        self.assertEquals(row2dict(observation, frozenset(['id'])), {'id': 'OBS'})
+        self.assertTrue('dataset_id' in row2dict(observation))
+
+
+class TestCompression(ApiTest):
+    def test_gzip(self):
+        for i in range(3):
+            observation_json = json.dumps(dict(id=i, dataset_id=i))
+            response = self.client.post("/observations", data=observation_json, content_type='application/json')
+            self.assertStatus(response, 201)
+        raw = self.client.get("/observations")
+        self.assertTrue('Content-Encoding' not in raw.headers)
+        self.assertEquals(raw.headers['Vary'], 'Accept-Encoding')
+        response = self.client.get("/observations", headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assert200(response)
+        self.assertEquals(response.headers['Content-Encoding'], 'gzip')
+        self.assertEquals(zlib.decompress(response.data, 16 + zlib.MAX_WBITS), raw.data)
+
+    def test_compress_stream(self):
+        chunks = ['[\n', '{"id": 1}', ',\n', '{"id": 2}', '\n]']
+        compressed = ''.join(utils.compress_stream(chunks, 'gzip'))
+        self.assertEquals(zlib.decompress(compressed, 16 + zlib.MAX_WBITS), ''.join(chunks))
+        if utils.brotli is not None:
+            compressed = ''.join(utils.compress_stream(chunks, 'br'))
+            self.assertEquals(utils.brotli.decompress(compressed), ''.join(chunks))
+
+    def test_static(self):
+        raw = self.client.get("/static/wesCountry.min.css")
+        self.assert200(raw)
+        response = self.client.get("/static/wesCountry.min.css", headers={'Accept-Encoding': 'gzip'})
+        self.assert200(response)
+        self.assertEquals(response.headers['Content-Encoding'], 'gzip')
+        self.assertEquals(response.mimetype, 'text/css')
+        self.assertEquals(zlib.decompress(response.data, 16 + zlib.MAX_WBITS), raw.data)
+        response = self.client.get("/static/missing.js", headers={'Accept-Encoding': 'gzip'})
+        self.assert404(response)
+
+    def test_static_variants(self):
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, 'script.js')
+            with open(path, 'wb') as static_file:
+                static_file.write('var a = 1;' * 100)
+            with open(os.path.join(folder, 'notes.txt'), 'wb') as static_file:
+                static_file.write('notes')
+            written = utils.build_static_variants(folder, views.COMPRESSIBLE_STATIC_EXTENSIONS)
+            self.assertEquals(sorted(written), sorted(path + utils.STATIC_VARIANT_SUFFIXES[encoding]
+                                                      for encoding in utils.available_encodings()))
+            with open(path + '.gz', 'rb') as variant_file:
+                self.assertEquals(zlib.decompress(variant_file.read(), 16 + zlib.MAX_WBITS), 'var a = 1;' * 100)
+            with open(path + '.gz', 'wb') as variant_file:
+                variant_file.write('built')
+            os.utime(path, (0, 0))
+            self.assertEquals(views.static_variant(path, 'gzip'), (0, 'built'))
+            os.remove(path + '.gz')
+            os.utime(path, (1, 1))
+            modified, data = views.static_variant(path, 'gzip')
+            self.assertEquals(zlib.decompress(data, 16 + zlib.MAX_WBITS), 'var a = 1;' * 100)
+        finally:
+            shutil.rmtree(folder)
+
+
 class LocalhostTest(ApiTest):
     def create_app(self):
         app.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///foo.db'
         app.app.config['TESTING'] = True
         app.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///foo.db'
+        app.app.test_client_class = BufferedClient
         return app.app
 
     def test(self):